@@ -6,16 +6,48 @@ Module for building state file
 .. versionadded:: 3006
 
 """
+import concurrent.futures
+import contextvars
+import itertools
 import logging
 import pathlib
+import re
+import sys
+import textwrap
+import time
 from inspect import getargspec
 from inspect import Parameter
 from inspect import signature
+from inspect import unwrap
 
 import salt.daemons.masterapi  # pylint: disable=import-error
 import salt.utils.files  # pylint: disable=import-error
-import yaml
+from saltext.salt_describe.utils.backends import abort_output
+from saltext.salt_describe.utils.backends import BACKENDS
+from saltext.salt_describe.utils.backends import close_output
+from saltext.salt_describe.utils.backends import open_output
+from saltext.salt_describe.utils.backends import READ_ERRORS
+from saltext.salt_describe.utils.backends import read_output
+from saltext.salt_describe.utils.backends.index import member_name
+from saltext.salt_describe.utils.baseline import factor_states
+from saltext.salt_describe.utils.baseline import group_similar
+from saltext.salt_describe.utils.baseline import merge_baseline
+from saltext.salt_describe.utils.file import file_info_kwarg
+from saltext.salt_describe.utils.init import collect
+from saltext.salt_describe.utils.init import dump_yaml
+from saltext.salt_describe.utils.init import get_grains
+from saltext.salt_describe.utils.init import get_minion_state_file_root
+from saltext.salt_describe.utils.init import load_yaml
 from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.output import flush_writer
+from saltext.salt_describe.utils.output import make_dirs
+from saltext.salt_describe.utils.output import start_writer
+from saltext.salt_describe.utils.output import write_file
+from saltext.salt_describe.utils.salt_describe import get_baseline_state_file
+from saltext.salt_describe.utils.salt_describe import get_sls_file
+from saltext.salt_describe.utils.salt_describe import get_state_file_root
+from saltext.salt_describe.utils.session import describe_session
+from saltext.salt_describe.utils.user import USER_INFO_KWARG
 
 
 __virtualname__ = "describe"
@@ -55,8 +87,90 @@ def _get_all_single_describe_methods():
     return names
 
 
+def _collection_jobs(name, arguments):
+    """
+    Return the ``(fun, arg, kwarg)`` jobs the describe function runs
+    against its whole target, so they can be collected up front
+    """
+    if name == "service" and sys.platform.startswith("darwin"):
+        service_jobs = [
+            ("service.get_enabled", None, None),
+            ("service.get_disabled", None, None),
+            ("service.list", None, None),
+        ]
+    else:
+        service_jobs = [
+            ("service.get_enabled", None, None),
+            ("service.get_disabled", None, None),
+            ("service.status", ["*"], None),
+        ]
+    file_jobs = []
+    if arguments.get("bulk") and arguments.get("paths"):
+        paths = arguments["paths"]
+        if isinstance(paths, str):
+            paths = [paths]
+        file_jobs.append(
+            (
+                "slsutil.renderer",
+                None,
+                file_info_kwarg(paths, contents=not arguments.get("stream")),
+            )
+        )
+    bin_env = arguments.get("bin_env")
+    jobs = {
+        "cron": [("cron.ls", [arguments.get("user")], None)],
+        "file": file_jobs,
+        "firewalld": [("firewalld.list_all", None, None)],
+        "group": [("group.getent", None, None)],
+        "host": [("hosts.list_hosts", None, None)],
+        "iptables": [("iptables.get_rules", None, None)],
+        "pip": [("pip.freeze", None, {"bin_env": bin_env} if bin_env else None)],
+        "pkg": [("pkg.list_pkgs", None, None)],
+        "pkgrepo": [("pkg.list_repos", None, None)],
+        "service": service_jobs,
+        "ssh_known_hosts": [("ssh.auth_keys", None, None)],
+        "sysctl": [("sysctl.show", None, None)],
+        "timezone": [("timezone.get_zone", None, None)],
+        "user": [("slsutil.renderer", None, USER_INFO_KWARG)],
+    }
+    return jobs.get(name, [])
+
+
+def _collect_returns(calls, **job_options):
+    """
+    Collect the returns for all of the describe calls with one
+    compound job per target
+    """
+    jobs_by_tgt = {}
+    for name, bound_sig in calls:
+        bound = bound_sig.signature.bind(*bound_sig.args, **bound_sig.kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        _tgt = (arguments.get("tgt"), arguments.get("tgt_type", "glob"))
+        jobs_by_tgt.setdefault(_tgt, []).extend(_collection_jobs(name, arguments))
+
+    for (tgt, tgt_type), jobs in jobs_by_tgt.items():
+        if tgt is None or not jobs:
+            continue
+        collect(__salt__, tgt, jobs, tgt_type=tgt_type, opts=__opts__, **job_options)
+
+
 @_exclude_from_all
-def all_(tgt, top=True, include=None, exclude=None, config_system="salt", **kwargs):
+def all_(
+    tgt,
+    top=True,
+    include=None,
+    exclude=None,
+    config_system="salt",
+    parallel=None,
+    collect=False,
+    writers=None,
+    archive=None,
+    output=None,
+    output_path=None,
+    output_branch=None,
+    **kwargs,
+):
     """
     Run all describe methods against target.
 
@@ -86,11 +200,153 @@ def all_(tgt, top=True, include=None, exclude=None, config_system="salt", **kwar
     .. code-block:: bash
 
         salt-run describe.all minion-tgt include='["file", "pip"]' file_paths='["/tmp/testfile", "/tmp/testfile2"]'
+
+    The describe functions run one after another by default. Pass ``parallel``
+    to run them on a pool of that many threads instead, or ``parallel=True`` to
+    run all of them at once. The results are still returned in the same order
+    along with the run time of each function.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all minion-tgt parallel=4
+
+    Pass ``collect=True`` to gather the data for all of the describe functions
+    from the target in a single compound job before generating any files,
+    instead of publishing a separate job for every execution function.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all minion-tgt collect=True parallel=True
+
+    Pass ``incremental=True`` to only generate the SLS files of the minions
+    whose returns changed since the last incremental run. A fingerprint of
+    the return each SLS file was generated from is kept in
+    ``salt-describe/fingerprints.db`` under the master's cachedir.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all minion-tgt incremental=True
+
+    Pass ``stream_returns=True`` to write each minion's SLS file as soon as
+    its return arrives, instead of waiting for every minion to return first.
+    Only one minion's return is held in memory at a time, which keeps the
+    memory use flat when targeting a large number of minions.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all minion-tgt stream_returns=True
+
+    Pass ``batch`` to only run each job on that many minions at a time,
+    either a count or a percentage of the target like ``10%``, so describing
+    a large fleet does not publish to every minion at once. ``timeout`` and
+    ``gather_job_timeout`` are the same as the options of the salt command.
+    All three are passed on to every describe function.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all '*' batch=10% timeout=30 gather_job_timeout=15
+
+    Pass ``profile=True`` to add a profile to the output of every describe
+    function. It has the wall time spent collecting the returns, parsing them,
+    serializing the states and writing the files, the number of jobs run and
+    the bytes written, in total and by minion. With ``profile=event`` each
+    profile is also fired on the event bus under ``salt/describe/<function>/profile``.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all '*' profile=event
+
+    Pass ``dedup=True`` to store every distinct state generated by
+    ``describe.file``, ``describe.pkg``, ``describe.pkgrepo``, ``describe.sysctl``
+    and ``describe.timezone`` only once, as ``describe_shared/<sha256>.sls`` in
+    the file root. The SLS file of each minion then only includes the shared
+    state, so a fleet of identical minions writes each configuration once.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all '*' include='["pkg", "sysctl", "timezone"]' dedup=True
+
+    Pass ``writers`` to write the generated files on a pool of that many
+    background threads, so parsing the returns does not wait for slow
+    storage like NFS. Every directory is only created once. All of the
+    files are written before ``describe.all`` returns, and the ones that
+    could not be written are listed under ``Write errors``.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all '*' writers=8
+
+    Pass ``archive`` to write all of the generated files into that single
+    archive file instead of the file roots, a zip file when the path ends in
+    ``.zip`` and otherwise a tar file, compressed for a ``.tar.gz``, ``.tgz``,
+    ``.bz2`` or ``.xz`` path. Its last member, ``manifest.json``, lists the
+    original path and sha256 hash of every file. The top file is updated
+    when the archive is extracted with ``describe.extract``.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all '*' archive=/var/cache/salt/describe/fleet.tar.gz
+
+    Pass ``output`` and ``output_path`` to write the generated files with
+    another output backend instead. ``output=git`` commits all of them to
+    the bare git repository at ``output_path`` in a single commit, and
+    ``output=sqlite`` stores them in the SQLite database at ``output_path``
+    as one run, next to the earlier runs. ``archive=<path>`` is the same as
+    ``output=archive output_path=<path>``. Use ``describe.extract`` with the
+    same ``output`` to write the files out.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all '*' output=git output_path=/var/cache/salt/describe/fleet.git
+
+        salt-run describe.all '*' output=sqlite output_path=/var/cache/salt/describe/fleet.db
+
+    Pass ``output=gitfs`` to publish the generated states to the bare git
+    repository at ``output_path`` that gitfs serves, with the state file
+    root as the root of the repository. It is ``output=git`` with only the
+    states committed, and the pillars are still written to the pillar
+    roots. Both commit to ``output_branch``, or the branch HEAD points to,
+    on top of its last commit, and no commit is made when nothing changed.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.all '*' output=gitfs output_path=/srv/git/states.git output_branch=describe
     """
     if exclude and include:
         log.error("Only one of exclude and include can be provided")
         return False
 
+    if archive:
+        output, output_path = "archive", archive
+    if output and output not in BACKENDS:
+        log.error(f"Unknown output {output}, use one of {', '.join(BACKENDS)}")
+        return False
+    if output and not output_path:
+        log.error(f"output_path is required to write the files to the {output} output")
+        return False
+
     all_methods = _get_all_single_describe_methods()
 
     # Sanitize the include and exclude to the extremes if none are given
@@ -130,12 +386,13 @@ def all_(tgt, top=True, include=None, exclude=None, config_system="salt", **kwar
     kwargs["tgt"] = tgt
     kwargs["config_system"] = config_system
 
-    sls_files = []
+    calls = []
     for name, func in allowed_methods.items():
         sig = signature(func)
         call_args = []
         call_kwargs = {}
-        args, _, _, defaults = getargspec(func)
+        # The describe functions are wrapped, like by the profile decorator
+        args, _, _, defaults = getargspec(unwrap(func))
         args = args[: -len(defaults)]
         misg_req_arg = False
         for p_name, p_obj in sig.parameters.items():
@@ -187,6 +444,12 @@ def all_(tgt, top=True, include=None, exclude=None, config_system="salt", **kwar
             log.error(f"Invalid args, kwargs for signature of {name}: {call_args}, {call_kwargs}")
             return False
 
+        calls.append((name, bound_sig))
+
+    def _run_describe(name, bound_sig):
+        """
+        Run a single describe function and return its result and run time
+        """
         log.debug(
             "Running describe.%s in all --  tgt: %s\targs: %s\tkwargs: %s",
             name,
@@ -194,88 +457,216 @@ def all_(tgt, top=True, include=None, exclude=None, config_system="salt", **kwar
             bound_sig.args,
             bound_sig.kwargs,
         )
-
+        start = time.perf_counter()
+        ret = None
         try:
             # This follows the unwritten standard that the minion target must be the first argument
             log.debug(f"Generating SLS for {name} module")
             ret = __salt__[f"describe.{name}"](*bound_sig.args, **bound_sig.kwargs)
-            if isinstance(ret, dict):
-                sls_files = sls_files + list(ret.values())[0]
-            else:
-                log.error(f"Could not generate the SLS file for {name}")
         except TypeError as err:
             log.error(err.args[0])
+        run_time = time.perf_counter() - start
+        log.info("describe.%s finished in %.2f seconds", name, run_time)
+        return ret, run_time
+
+    session = None
+    try:
+        with describe_session() as session:
+            if output:
+                options = {}
+                if output in ("git", "gitfs"):
+                    options["branch"] = output_branch
+                if output == "gitfs":
+                    options["root"] = get_state_file_root(__opts__)
+                open_output(session, output, output_path, **options)
+            if writers:
+                start_writer(session, workers=writers)
+            try:
+                if collect:
+                    _collect_returns(
+                        calls,
+                        batch=kwargs.get("batch"),
+                        timeout=kwargs.get("timeout"),
+                        gather_job_timeout=kwargs.get("gather_job_timeout"),
+                    )
+
+                if parallel and calls:
+                    workers = len(calls) if parallel is True else int(parallel)
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                        # Each describe function runs in a copy of this context, where
+                        # the loader's __salt__ and __opts__ resolve
+                        futures = [
+                            executor.submit(
+                                contextvars.copy_context().run, _run_describe, name, bound_sig
+                            )
+                            for name, bound_sig in calls
+                        ]
+                        # Gather in submission order so the output does not depend on which
+                        # describe function finishes first
+                        results = [future.result() for future in futures]
+                else:
+                    results = [_run_describe(name, bound_sig) for name, bound_sig in calls]
+            finally:
+                # The files must be written before the init.sls files deferred to
+                # the end of the session list them
+                write_summary = flush_writer(session)
+    except BaseException:
+        # Do not leave a failed run half written to the output backend
+        if session is not None:
+            abort_output(session)
+        raise
+    # Only closed now, so it has the init.sls files deferred to the end of the session
+    output_info = close_output(session)
+
+    sls_files = []
+    run_times = {}
+    for (name, _), (ret, run_time) in zip(calls, results):
+        run_times[name] = round(run_time, 3)
+        if isinstance(ret, dict):
+            sls_files = sls_files + list(ret.values())[0]
+        else:
+            log.error(f"Could not generate the SLS file for {name}")
 
     # generate the top file
-    if top:
+    if top and output_info:
+        log.info("The top file is updated when %s is extracted", output_info["path"])
+    elif top:
         __salt__["describe.top"](tgt)
-    return ret_info(sls_files)
 
+    ret = ret_info(sls_files)
+    if ret:
+        ret["Run times (seconds)"] = run_times
+        if write_summary and write_summary["failed"]:
+            ret["Write errors"] = write_summary["failed"]
+        if output_info:
+            ret["Output"] = output_info
+    return ret
 
-@_exclude_from_all
-def top_(tgt, tgt_type="glob", env="base"):
-    """
-    Add the generated states to top.sls
 
-    CLI Example:
+def _update_top(file_root, minions, env="base", layout="sls"):
+    """
+    Add the SLS files generated for the minions to the top.sls in file_root.
 
-    .. code-block:: bash
+    With the ``sls`` layout every generated SLS file is listed for its minion.
+    With the ``include`` layout each minion only lists its own init.sls, which
+    includes all of its generated SLS files, so the top file only changes when
+    a minion is added. New minions are then appended to the end of the top
+    file when the env is its last section instead of rewriting all of it.
 
-        salt-run describe.top minion-tgt
+    Returns whether the top file was changed, or None when a minion
+    has no generated files.
     """
-    # Gather minions based on tgt and tgt_type arguments
-    masterapi = salt.daemons.masterapi.RemoteFuncs(__opts__)
-    minions = masterapi.local.gather_minions(tgt, tgt_type)
-
-    state_file_root = pathlib.Path(__salt__["config.get"]("file_roots:base")[0])
-    top_file = state_file_root / "top.sls"
+    if layout not in ("sls", "include"):
+        log.error(f"Unknown top file layout {layout}, use sls or include")
+        return None
 
+    top_file = file_root / "top.sls"
     if not top_file.is_file():
         top_file.touch()
 
-    top_file_dict = {}
-
     with salt.utils.files.fopen(top_file, "r") as fp_:
-        top_data = yaml.safe_load(fp_.read())
-        if top_data:
-            top_file_dict = top_data
+        top_data = fp_.read()
+    top_file_dict = load_yaml(top_data) or {}
 
-    if env not in top_file_dict:
+    # New minions can only be appended to a block style env at the end of the file
+    content_lines = [
+        line for line in top_data.splitlines() if line.strip() and not line.lstrip().startswith("#")
+    ]
+    can_append = (
+        bool(top_file_dict.get(env))
+        and list(top_file_dict)[-1] == env
+        and content_lines[-1].startswith(" ")
+        and top_data.endswith("\n")
+    )
+    if not top_file_dict.get(env):
         top_file_dict[env] = {}
+    env_top = top_file_dict[env]
 
+    changed = False
+    new_minions = {}
     for minion in minions:
-        sls_files = []
-        add_top = []
-        minion_file_root = state_file_root / minion
+        minion_file_root = file_root / minion
         if not minion_file_root.exists():
             log.error(f"The file root path {minion_file_root} does not exist")
-            return False
-        for file in minion_file_root.iterdir():
-            if file.suffix == ".sls" and file.stem != "init":
-                sls_files.append(minion + "." + file.stem)
+            return None
+
+        if layout == "include":
+            sls_files = [minion]
+        else:
+            sls_files = sorted(
+                f"{minion}.{file.stem}"
+                for file in minion_file_root.iterdir()
+                if file.suffix == ".sls" and file.stem != "init"
+            )
+
+        if minion not in env_top:
+            env_top[minion] = new_minions[minion] = sls_files
+            continue
 
         # Check to see if the SLS file already exists in top file
+        minion_top = env_top[minion]
+        in_top = set(minion_top)
         for sls in sls_files:
-            if sls not in top_file_dict[env].get(minion, []):
-                add_top.append(sls)
+            if sls not in in_top:
+                minion_top.append(sls)
+                in_top.add(sls)
+                changed = True
 
-        if minion not in top_file_dict[env]:
-            top_file_dict[env][minion] = add_top
-        else:
-            for _top_file in add_top:
-                top_file_dict[env][minion].append(_top_file)
+    if not changed and not new_minions:
+        return False
 
-    if add_top:
-        with salt.utils.files.fopen(top_file, "w") as fp_:
-            fp_.write(yaml.dump(top_file_dict))
-    else:
+    if not changed and can_append:
+        # Indent the new minions like the minions already in the env. Its
+        # lines at the end of the file are indented at least as far as its
+        # minions, so the top file is not parsed again to check the result.
+        env_lines = itertools.takewhile(lambda line: line.startswith(" "), content_lines[::-1])
+        indent = min(len(line) - len(line.lstrip(" ")) for line in env_lines)
+        with salt.utils.files.fopen(top_file, "a") as fp_:
+            fp_.write(textwrap.indent(dump_yaml(new_minions), " " * indent))
+        return True
+    write_file(top_file, dump_yaml(top_file_dict))
+    return True
+
+
+@_exclude_from_all
+def top_(tgt, tgt_type="glob", env="base", layout="sls"):
+    """
+    Add the generated states to top.sls
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.top minion-tgt
+
+    Pass ``layout=include`` to only add each minion's own init.sls, which
+    includes all of the states generated for it, to the top file. The top
+    file is then only changed when a minion is added to it.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.top minion-tgt layout=include
+    """
+    # Gather minions based on tgt and tgt_type arguments
+    masterapi = salt.daemons.masterapi.RemoteFuncs(__opts__)
+    minions = masterapi.local.gather_minions(tgt, tgt_type)
+
+    state_file_root = pathlib.Path(__salt__["config.get"]("file_roots:base")[0])
+    top_file = state_file_root / "top.sls"
+
+    changed = _update_top(state_file_root, minions, env=env, layout=layout)
+    if changed is None:
+        return False
+    if not changed:
         return {"Top file was not changed, alread contains correct SLS files": str(top_file)}
 
     return ret_info(str(top_file), mod="top file")
 
 
 @_exclude_from_all
-def pillar_top(tgt, tgt_type="glob", env="base"):
+def pillar_top(tgt, tgt_type="glob", env="base", layout="sls"):
     """
     Add the generated pillars to top.sls
 
@@ -290,32 +681,286 @@ def pillar_top(tgt, tgt_type="glob", env="base"):
     minions = masterapi.local.gather_minions(tgt, tgt_type)
 
     pillar_file_root = pathlib.Path(__salt__["config.get"]("pillar_roots:base")[0])
-    top_file = pillar_file_root / "top.sls"
+    if _update_top(pillar_file_root, minions, env=env, layout=layout) is None:
+        return False
 
-    if not top_file.is_file():
-        top_file.touch()
+    return True
 
-    top_file_dict = {}
 
-    with salt.utils.files.fopen(top_file, "r") as fp_:
-        top_file_dict = yaml.safe_load(fp_.read())
+def _extracted_minions(file_root, paths):
+    """
+    Return the minions the SLS files at paths were generated for in file_root
+    """
+    minions = set()
+    for path in paths:
+        try:
+            parts = path.relative_to(file_root).parts
+        except ValueError:
+            continue
+        if len(parts) == 2 and path.suffix == ".sls" and not parts[0].startswith("describe_"):
+            minions.add(parts[0])
+    return sorted(minions)
 
-    if env not in top_file_dict:
-        top_file_dict[env] = {}
 
-    for minion in minions:
-        add_top = []
-        minion_pillar_root = pillar_file_root / minion
-        for file in minion_pillar_root.iterdir():
-            if file.suffix == ".sls" and file.stem != "init":
-                add_top.append(minion + "." + file.stem)
-
-        if minion not in top_file_dict[env]:
-            top_file_dict[env][minion] = add_top
+@_exclude_from_all
+def extract(source, dest="/", top=True, env="base", layout="sls", output="archive", branch=None):
+    """
+    Write the files of an archive made with ``describe.all archive=<path>``,
+    or of the ``output`` backend at ``source``, to where they would have
+    been written, or below ``dest``. Each file of an archive or SQLite
+    database is checked against its stored sha256 hash, and files that are
+    already there with the same contents are not written again. From a git
+    repository the files of the last commit of ``branch``, or of the commit
+    HEAD points to, are written, and from a SQLite database the latest
+    version of every file. The files of a ``gitfs`` repository are written
+    below the state file root. With ``top`` the minions' SLS files are added
+    to the top file like with ``describe.top``.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.extract /var/cache/salt/describe/fleet.tar.gz
+
+        salt-run describe.extract fleet.zip dest=/srv/snapshot top=False
+
+        salt-run describe.extract /var/cache/salt/describe/fleet.git output=git
+
+        salt-run describe.extract /srv/git/states.git output=gitfs branch=describe
+    """
+    dest = pathlib.Path(dest)
+    file_root = None
+    if top or output == "gitfs":
+        file_root = dest / member_name(__salt__["config.get"](f"file_roots:{env}")[0])
+    base = file_root if output == "gitfs" else dest
+    root = base.resolve()
+    paths = []
+    try:
+        with describe_session():
+            options = {"branch": branch} if output in ("git", "gitfs") else {}
+            for name, entry, data in read_output(output, source, **options):
+                path = base / name
+                # A name like ../etc/cron.d/job would be written outside of the destination
+                if root not in path.resolve().parents:
+                    raise ValueError(f"{name} is not below {base}")
+                try:
+                    make_dirs(path.parent)
+                except PermissionError:
+                    log.warning(
+                        f"Unable to create directory {str(path.parent)}.  "
+                        "Check that the salt user has the correct permissions."
+                    )
+                    return False
+                write_file(path, data, mode=entry["mode"])
+                paths.append(path)
+    except READ_ERRORS as exc:
+        log.error(f"Unable to extract {source}: {exc}")
+        return False
+
+    if top:
+        minions = _extracted_minions(file_root, paths)
+        if minions and _update_top(file_root, minions, env=env, layout=layout) is None:
+            return False
+
+    return ret_info([str(path) for path in paths], mod="extract")
+
+
+def _load_state(sls_file):
+    """
+    Load the state in the SLS file, or an empty one when it does not exist
+    """
+    if not sls_file.is_file():
+        return {}
+    with salt.utils.files.fopen(sls_file, "r") as fp_:
+        return load_yaml(fp_.read()) or {}
+
+
+def _load_generated_state(minion, sls_name):
+    """
+    Load the state generated for the minion, with the shared
+    and baseline states it includes merged back into it
+    """
+    state = _load_state(get_minion_state_file_root(__opts__, minion) / f"{sls_name}.sls")
+    include = state.pop("include", None) or []
+    if isinstance(include, str):
+        include = [include]
+
+    other_includes = []
+    for sls in include:
+        if sls.startswith("describe_shared."):
+            # Generated with dedup
+            state = {**_load_state(get_sls_file(__opts__, sls)), **state}
+        elif sls.startswith("describe_baseline."):
+            state = merge_baseline(state, _load_state(get_sls_file(__opts__, sls)))
         else:
-            top_file_dict[env][minion].append(add_top)
+            other_includes.append(sls)
+    if other_includes:
+        state["include"] = other_includes
+    return state
 
-    with salt.utils.files.fopen(top_file, "w") as fp_:
-        fp_.write(yaml.dump(top_file_dict))
 
-    return True
+def _diff_states(old, new):
+    """
+    Return the states added, removed and changed in new compared to old
+    """
+    diff = {
+        "added": {state_id: new[state_id] for state_id in new if state_id not in old},
+        "removed": {state_id: old[state_id] for state_id in old if state_id not in new},
+        "changed": {
+            state_id: {"old": old[state_id], "new": new[state_id]}
+            for state_id in new
+            if state_id in old and old[state_id] != new[state_id]
+        },
+    }
+    return {kind: states for kind, states in diff.items() if states}
+
+
+def _group_name(value):
+    """
+    Return a grain value as a name that can be part of an SLS name
+    """
+    if isinstance(value, (list, tuple)):
+        value = "_".join(str(item) for item in value)
+    return re.sub(r"[^A-Za-z0-9_-]", "_", str(value)) or "default"
+
+
+@_exclude_from_all
+def baseline(tgt, sls_name="pkg", group_by=None, tgt_type="glob", min_minions=2, similarity=None):
+    """
+    Move the states the minions have in common out of their generated
+    ``sls_name`` SLS files into a baseline SLS file, so every minion's SLS
+    file only includes the baseline and keeps the states that differ. For a
+    state that manages a list of items, like the packages of ``describe.pkg``,
+    the items all of the minions have are moved to the baseline.
+
+    The baselines are stored as ``describe_baseline/<sls_name>/<group>.sls``
+    in the file root. Pass ``group_by`` to build a baseline for every value
+    of that grain, otherwise all of the targeted minions are one group. Pass
+    ``similarity``, between 0 and 1, to split every group further into groups
+    of minions whose states have at least that Jaccard similarity, compared
+    by their state IDs and the items of their list states. A group split up
+    is stored as ``<group>_<number>.sls``. Groups of fewer than
+    ``min_minions`` minions do not get a baseline. Running it again rebuilds
+    the baselines from the minions' current states.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.baseline '*' sls_name=pkg group_by=osfinger
+
+        salt-run describe.baseline 'web*' sls_name=service
+
+        salt-run describe.baseline '*' sls_name=pkg similarity=0.8
+    """
+    if similarity is not None and not 0 < float(similarity) <= 1:
+        log.error("similarity must be greater than 0 and at most 1")
+        return False
+
+    masterapi = salt.daemons.masterapi.RemoteFuncs(__opts__)
+    minions = masterapi.local.gather_minions(tgt, tgt_type)
+    grains = get_grains(__opts__, minions, keys=[group_by]) if group_by else {}
+
+    groups = {}
+    for minion in sorted(minions):
+        sls_file = get_minion_state_file_root(__opts__, minion) / f"{sls_name}.sls"
+        if not sls_file.is_file():
+            log.debug("%s has no %s SLS file", minion, sls_name)
+            continue
+        group = "all"
+        if group_by:
+            group = _group_name(grains.get(minion, {}).get(group_by, "default"))
+        groups.setdefault(group, {})[minion] = _load_generated_state(minion, sls_name)
+
+    if similarity is not None:
+        similar_groups = {}
+        for group, states in groups.items():
+            similar = group_similar(states, float(similarity))
+            for num, group_minions in enumerate(similar, 1):
+                name = group if len(similar) == 1 else f"{group}_{num}"
+                similar_groups[name] = {minion: states[minion] for minion in group_minions}
+        groups = similar_groups
+
+    sls_files = []
+    for group, states in sorted(groups.items()):
+        if len(states) < int(min_minions):
+            log.info(
+                "Not building a %s baseline for the %s group of %d minions",
+                sls_name,
+                group,
+                len(states),
+            )
+            continue
+        baseline_states, deltas = factor_states(states)
+        if not baseline_states:
+            log.info("The minions of the %s group have no %s states in common", group, sls_name)
+            continue
+
+        baseline_file, baseline_sls = get_baseline_state_file(__opts__, sls_name, group)
+        try:
+            make_dirs(baseline_file.parent)
+        except PermissionError:
+            log.warning(
+                f"Unable to create directory {str(baseline_file.parent)}.  "
+                "Check that the salt user has the correct permissions."
+            )
+            return False
+        write_file(baseline_file, dump_yaml(baseline_states))
+        sls_files.append(str(baseline_file))
+
+        for minion, delta in deltas.items():
+            delta["include"] = [baseline_sls] + delta.pop("include", [])
+            sls_file = get_minion_state_file_root(__opts__, minion) / f"{sls_name}.sls"
+            write_file(sls_file, dump_yaml(delta))
+            sls_files.append(str(sls_file))
+
+    return ret_info(sls_files, mod="baseline")
+
+
+@_exclude_from_all
+def drift(tgt, include=None, exclude=None, tgt_type="glob", **kwargs):
+    """
+    Compare the live data of the minions with the SLS files already generated
+    for them and return the states that were added, removed or changed for
+    every minion and SLS file that drifted. No files are written.
+
+    The describe functions are picked and given their arguments the same way
+    as with ``describe.all``.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.drift minion-tgt
+
+        salt-run describe.drift minion-tgt include='["pkg", "service"]'
+    """
+    with describe_session() as session:
+        session["capture"] = {}
+        try:
+            all_ret = __salt__["describe.all"](
+                tgt,
+                top=False,
+                include=include,
+                exclude=exclude,
+                config_system="salt",
+                tgt_type=tgt_type,
+                **kwargs,
+            )
+        finally:
+            captured = session.pop("capture")
+    if not all_ret:
+        return False
+
+    drift_ret = {}
+    for (minion, sls_name, _), state in sorted(captured.items()):
+        live = load_yaml(state) or {}
+        generated = _load_generated_state(minion, sls_name)
+
+        diff = _diff_states(generated, live)
+        if diff:
+            drift_ret.setdefault(minion, {})[sls_name] = diff
+
+    if not drift_ret:
+        log.info("None of the minions drifted from their generated SLS files")
+    return drift_ret
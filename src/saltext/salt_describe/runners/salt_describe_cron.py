@@ -9,11 +9,9 @@ Module for building state file
 import logging
 import sys
 
-import yaml
+from saltext.salt_describe.utils.aio import describe
 from saltext.salt_describe.utils.cron import _parse_pre_cron
-from saltext.salt_describe.utils.init import generate_files
-from saltext.salt_describe.utils.init import parse_salt_ret
-from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.init import dump_yaml
 
 __virtualname__ = "describe"
 
@@ -25,7 +23,19 @@ def __virtual__():
     return __virtualname__
 
 
-def cron(tgt, user="root", include_pre=True, tgt_type="glob", config_system="salt"):
+def cron(
+    tgt,
+    user="root",
+    include_pre=True,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+):
     """
     Generate the state file for a user's cron data
 
@@ -36,18 +46,8 @@ def cron(tgt, user="root", include_pre=True, tgt_type="glob", config_system="sal
         salt-run describe.all minion-tgt user
     """
     mod_name = sys._getframe().f_code.co_name
-    log.info("Attempting to generate SLS file for %s", mod_name)
-    cron_contents = __salt__["salt.execute"](
-        tgt,
-        "cron.ls",
-        arg=[user],
-        tgt_type=tgt_type,
-    )
-    sls_files = []
-    if not parse_salt_ret(ret=cron_contents, tgt=tgt):
-        return ret_info(sls_files, mod=mod_name)
-    for minion in list(cron_contents.keys()):
-        minion_crons = cron_contents[minion]
+
+    def _parse(minion, minion_crons):
         crons = minion_crons.get("crons", [])
         env = minion_crons.get("env", [])
         pre = minion_crons.get("pre", [])
@@ -124,9 +124,24 @@ def cron(tgt, user="root", include_pre=True, tgt_type="glob", config_system="sal
             for state_name in sls_contents:
                 final_sls[state_name] = sls_contents[state_name]
 
-        sls_yaml = yaml.dump(final_sls)
-        sls_files.append(
-            generate_files(__opts__, minion, sls_yaml, sls_name="cron", config_system=config_system)
-        )
+        return dump_yaml(final_sls)
 
-    return ret_info(sls_files, mod=mod_name)
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
+        tgt,
+        "cron.ls",
+        _parse,
+        sls_name="cron",
+        tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        options={"user": user, "include_pre": include_pre},
+        arg=[user],
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
+    )
@@ -6,29 +6,279 @@ Module for building state file
 .. versionadded:: 3006
 
 """
+import contextlib
+import hashlib
 import logging
 import os
 import pathlib
 import sys
 
 import salt.utils.files  # pylint: disable=import-error
-import yaml
+from saltext.salt_describe.utils.file import file_info_kwarg
+from saltext.salt_describe.utils.incremental import load_fingerprints
+from saltext.salt_describe.utils.incremental import record
+from saltext.salt_describe.utils.incremental import save_fingerprints
+from saltext.salt_describe.utils.incremental import unchanged
+from saltext.salt_describe.utils.init import dump_yaml
+from saltext.salt_describe.utils.init import execute
 from saltext.salt_describe.utils.init import generate_files
 from saltext.salt_describe.utils.init import get_minion_state_file_root
 from saltext.salt_describe.utils.init import parse_salt_ret
 from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.output import make_dirs
+from saltext.salt_describe.utils.output import open_temp_file
+from saltext.salt_describe.utils.output import replace_file
+from saltext.salt_describe.utils.output import write_file
+from saltext.salt_describe.utils.profile import count
+from saltext.salt_describe.utils.profile import profile_minions
+from saltext.salt_describe.utils.profile import profiled
+from saltext.salt_describe.utils.profile import start_profile
+from saltext.salt_describe.utils.salt_describe import generate_shared_file
+from saltext.salt_describe.utils.salt_describe import open_shared_file
+from saltext.salt_describe.utils.salt_describe import store_shared_file
 
 __virtualname__ = "describe"
 
 
 log = logging.getLogger(__name__)
 
+# The stats of a file its state is generated from, or that change with its contents
+_FINGERPRINT_STATS = ("user", "group", "mode", "size", "mtime")
+
 
 def __virtual__():
     return __virtualname__
 
 
-def file(tgt, paths, tgt_type="glob", config_system="salt"):
+def _file_info(tgt, paths, tgt_type="glob", contents=True, **job_options):
+    """
+    Gather the contents and stats of every path with
+    a file.read and a file.stats job per path
+    """
+    file_info = {}
+    for path in paths:
+        _func_rets = []
+        if contents:
+            _file_contents = execute(
+                __salt__,
+                tgt,
+                "file.read",
+                tgt_type=tgt_type,
+                arg=[path],
+                **job_options,
+            )
+            _func_rets.append(_file_contents)
+
+        _file_stats = execute(
+            __salt__,
+            tgt,
+            "file.stats",
+            tgt_type=tgt_type,
+            arg=[path],
+            **job_options,
+        )
+        _func_rets.append(_file_stats)
+        for _func_ret in _func_rets:
+            if not parse_salt_ret(ret=_func_ret, tgt=tgt):
+                return False
+
+        for minion in list(_file_stats.keys()):
+            file_info.setdefault(minion, {})[path] = {"stats": _file_stats[minion]}
+            if contents:
+                file_info[minion][path]["contents"] = _file_contents[minion]
+    return file_info
+
+
+def _bulk_file_info(tgt, paths, tgt_type="glob", contents=True, **job_options):
+    """
+    Gather the contents and stats of every path, expanding
+    directories and globs on the minions, with a single job
+    """
+    file_info = execute(
+        __salt__,
+        tgt,
+        "slsutil.renderer",
+        tgt_type=tgt_type,
+        kwarg=file_info_kwarg(paths, contents=contents),
+        **job_options,
+    )
+    if not parse_salt_ret(ret=file_info, tgt=tgt):
+        return False
+
+    for minion in list(file_info.keys()):
+        if not isinstance(file_info[minion], dict):
+            log.error("Could not gather the files on %s: %s", minion, file_info[minion])
+            file_info.pop(minion)
+        elif not file_info[minion]:
+            log.error("None of the paths %s matched a file on %s", paths, minion)
+            file_info.pop(minion)
+    return file_info
+
+
+def _fingerprint_data(minion_file_info):
+    """
+    Return what the states of the minion's files are generated from, for its
+    fingerprint. The other stats change without the file changing, like its
+    atime when it is read.
+    """
+    return {
+        path: {
+            "contents": info.get("contents"),
+            **{key: info["stats"].get(key) for key in _FINGERPRINT_STATS},
+        }
+        for path, info in minion_file_info.items()
+    }
+
+
+def _open_stream_dest(minion, path, dedup=False):
+    """
+    Open the temporary binary file a streamed file is written to. Returns
+    the open file, its path and the path it is moved to when it is complete,
+    which is None for the shared file root, or False when it cannot be
+    created.
+    """
+    if dedup:
+        dest = open_shared_file(__opts__)
+        return dest and dest + (None,)
+
+    minion_state_root = get_minion_state_file_root(__opts__, minion, config_system="salt")
+    path_obj = pathlib.Path(path)
+    path_file = minion_state_root / "files" / path_obj.relative_to(path_obj.anchor)
+    try:
+        return open_temp_file(path_file.parent) + (path_file,)
+    except PermissionError:
+        log.warning(
+            f"Unable to create directory {str(path_file.parent)}.  "
+            "Check that the salt user has the correct permissions."
+        )
+        return False
+
+
+def _discard_stream_dests(dests):
+    """
+    Close the temporary files of a group of streamed files and remove them,
+    for a group that could not be copied
+    """
+    for fp_, temp_file, *_ in dests.values():
+        fp_.close()
+        if temp_file is not None:
+            with contextlib.suppress(FileNotFoundError):
+                temp_file.unlink()
+
+
+def _copy_stream_group(path, dests, remaining, sources, chunk_size, dedup, job_options):
+    """
+    Copy the file at path from the minions of a group, which have
+    ``remaining`` bytes of it left, to their dests, and add the salt://
+    source of every copied file to sources. The files that cannot be read
+    are dropped. Returns False when a file cannot be stored.
+    """
+    offset = 0
+    while remaining:
+        chunks = execute(
+            __salt__,
+            list(remaining),
+            "file.seek_read",
+            tgt_type="list",
+            arg=[path, chunk_size, offset],
+            **job_options,
+        )
+        if not isinstance(chunks, dict):
+            chunks = {}
+        for minion in list(remaining):
+            fp_, temp_file, path_file, digest = dests[minion]
+            chunk = chunks.get(minion)
+            if not isinstance(chunk, bytes):
+                log.error("Could not read %s on %s: %s", path, minion, chunk)
+                fp_.close()
+                if temp_file is not None:
+                    temp_file.unlink()
+                remaining.pop(minion)
+                continue
+
+            fp_.write(chunk)
+            count("bytes_written", len(chunk))
+            digest.update(chunk)
+            if len(chunk) < chunk_size or offset + len(chunk) >= remaining[minion]:
+                fp_.close()
+                remaining.pop(minion)
+                if dedup:
+                    source = store_shared_file(__opts__, temp_file, digest.hexdigest())
+                    if not source:
+                        return False
+                else:
+                    replace_file(temp_file, path_file)
+                    source = f"salt://{minion}/files/{path}"
+                sources[minion][path] = source
+        offset += chunk_size
+    return True
+
+
+def _stream_files(file_info, chunk_size, max_memory, dedup=False, **job_options):
+    """
+    Copy every file in file_info from its minion with file.seek_read jobs
+    of chunk_size bytes, writing each chunk out as soon as it arrives.
+
+    The minions are read in groups small enough that at most max_memory
+    bytes of chunks are held by the runner at once. Returns the salt://
+    source of every copied file by minion and path, and drops the files
+    that could not be read from file_info.
+    """
+    chunk_size = int(chunk_size)
+    group_size = max(1, int(max_memory) // chunk_size)
+    minions_by_path = {}
+    for minion in file_info:
+        for path in file_info[minion]:
+            minions_by_path.setdefault(path, []).append(minion)
+
+    sources = {minion: {} for minion in file_info}
+    for path, minions in minions_by_path.items():
+        for index in range(0, len(minions), group_size):
+            remaining = {}
+            dests = {}
+            for minion in minions[index : index + group_size]:
+                dest = _open_stream_dest(minion, path, dedup=dedup)
+                if not dest:
+                    _discard_stream_dests(dests)
+                    return False
+                dests[minion] = dest + (hashlib.sha256(),)
+                remaining[minion] = file_info[minion][path]["stats"]["size"]
+
+            try:
+                copied = _copy_stream_group(
+                    path, dests, remaining, sources, chunk_size, dedup, job_options
+                )
+            except BaseException:
+                # Do not leave the temporary files of an interrupted copy behind
+                _discard_stream_dests(dests)
+                raise
+            if not copied:
+                _discard_stream_dests(dests)
+                return False
+            for minion in dests:
+                if path not in sources[minion]:
+                    file_info[minion].pop(path)
+
+    return sources
+
+
+@profiled
+def file(
+    tgt,
+    paths,
+    tgt_type="glob",
+    config_system="salt",
+    bulk=False,
+    dedup=False,
+    stream=False,
+    chunk_size=1048576,
+    max_memory=67108864,
+    incremental=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+):
     """
     Read a file on the minions and build a state file
     to managed a file.
@@ -38,8 +288,44 @@ def file(tgt, paths, tgt_type="glob", config_system="salt"):
     .. code-block:: bash
 
         salt-run describe.file minion-tgt /etc/salt/minion
+
+    Pass ``bulk=True`` to read all of the paths with a single job per target
+    instead of two jobs per path. In bulk mode the paths can also be
+    directories, which include every file below them, or globs in the last
+    path component, where ``**`` matches in any subdirectory.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.file minion-tgt '["/etc/nginx/**", "/etc/ssh/*_config"]' bulk=True
+
+    Pass ``dedup=True`` to store each distinct file content only once under
+    ``describe_shared/files`` in the file root, named by its sha256 hash. The
+    generated states of every minion with the same content use it as their
+    ``source`` instead of a copy in the minion's own ``files`` directory, and
+    the states themselves are shared the same way as with ``describe.all``.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.file '*' /etc/resolv.conf dedup=True
+
+    Pass ``stream=True`` to copy the files in binary mode, ``chunk_size``
+    bytes at a time, instead of reading them whole as text. The minions are
+    read in groups so that at most ``max_memory`` bytes of file contents are
+    held in memory at once, which keeps large and binary files safe to
+    capture from many minions.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run describe.file '*' /opt/app/app.jar stream=True chunk_size=4194304
     """
     mod_name = sys._getframe().f_code.co_name
+    start_profile(__opts__, mod_name, profile)
     log.info("Attempting to generate SLS file for %s", mod_name)
     if isinstance(paths, str):
         paths = [paths]
@@ -47,39 +333,59 @@ def file(tgt, paths, tgt_type="glob", config_system="salt"):
     state_contents = {}
     file_contents = {}
     sls_files = []
-    for path in paths:
-        _file_contents = __salt__["salt.execute"](
-            tgt,
-            "file.read",
-            tgt_type=tgt_type,
-            arg=[path],
+    job_options = {
+        "opts": __opts__,
+        "batch": batch,
+        "timeout": timeout,
+        "gather_job_timeout": gather_job_timeout,
+    }
+    if bulk:
+        file_info = _bulk_file_info(
+            tgt, paths, tgt_type=tgt_type, contents=not stream, **job_options
         )
+    else:
+        file_info = _file_info(tgt, paths, tgt_type=tgt_type, contents=not stream, **job_options)
+    if file_info is False:
+        return ret_info(sls_files, mod=mod_name)
 
-        _file_stats = __salt__["salt.execute"](
-            tgt,
-            "file.stats",
-            tgt_type=tgt_type,
-            arg=[path],
-        )
-        for _func_ret in _file_contents, _file_stats:
-            if not parse_salt_ret(ret=_func_ret, tgt=tgt):
-                return ret_info(sls_files, mod=mod_name)
+    fingerprints = load_fingerprints(
+        __opts__, mod_name, incremental, config_system=config_system, dedup=dedup, stream=stream
+    )
+    for minion in list(file_info.keys()):
+        sls_file = unchanged(fingerprints, minion, _fingerprint_data(file_info[minion]))
+        if sls_file:
+            sls_files.append(sls_file)
+            file_info.pop(minion)
+
+    if stream:
+        sources = _stream_files(file_info, chunk_size, max_memory, dedup=dedup, **job_options)
+        if sources is False:
+            return ret_info(sls_files, mod=mod_name)
 
-        for minion in list(_file_contents.keys()):
-            if minion not in file_contents:
-                file_contents[minion] = {}
-            file_contents[minion][path] = _file_contents[minion]
+    for minion in profile_minions(list(file_info)):
+        if not file_info[minion]:
+            continue
+        file_contents[minion] = {}
+        state_contents[minion] = {}
+        for path, info in file_info[minion].items():
+            if stream:
+                _file_source = sources[minion][path]
+            elif dedup:
+                _file_source = generate_shared_file(__opts__, info["contents"])
+                if not _file_source:
+                    return ret_info(sls_files, mod=mod_name)
+            else:
+                _file_source = f"salt://{minion}/files/{path}"
+                file_contents[minion][path] = info["contents"]
 
-            _file_mode = _file_stats[minion]["mode"]
-            _file_user = _file_stats[minion]["user"]
-            _file_group = _file_stats[minion]["group"]
+            _file_mode = info["stats"]["mode"]
+            _file_user = info["stats"]["user"]
+            _file_group = info["stats"]["group"]
 
-            if minion not in state_contents:
-                state_contents[minion] = {}
             state_contents[minion][path] = {
                 "file.managed": [
                     {
-                        "source": f"salt://{minion}/files/{path}",
+                        "source": _file_source,
                         "user": _file_user,
                         "group": _file_group,
                         "mode": _file_mode,
@@ -87,27 +393,38 @@ def file(tgt, paths, tgt_type="glob", config_system="salt"):
                 ]
             }
 
-    for minion in list(state_contents.keys()):
-        state = yaml.dump(state_contents[minion])
+    for minion in profile_minions(list(state_contents)):
+        state = dump_yaml(state_contents[minion])
         minion_state_root = get_minion_state_file_root(__opts__, minion, config_system="salt")
 
         for path in file_contents[minion]:
             path_obj = pathlib.Path(path)
             path_file = minion_state_root / "files" / path_obj.relative_to(path_obj.anchor)
             try:
-                path_file.parent.mkdir(parents=True, exist_ok=True)
+                make_dirs(path_file.parent)
             except PermissionError:
                 log.warning(
                     f"Unable to create directory {str(path_file.parent)}.  "
                     "Check that the salt user has the correct permissions."
                 )
-                return False
+                return ret_info(sls_files, mod=mod_name)
 
-            with salt.utils.files.fopen(path_file, "w") as fp_:
-                fp_.write(file_contents[minion][path])
+            write_file(path_file, file_contents[minion][path])
 
         sls_files.append(
-            generate_files(__opts__, minion, state, sls_name="files", config_system=config_system)
+            record(
+                fingerprints,
+                minion,
+                generate_files(
+                    __opts__,
+                    minion,
+                    state,
+                    sls_name="files",
+                    config_system=config_system,
+                    dedup=dedup,
+                ),
+            )
         )
 
+    save_fingerprints(fingerprints)
     return ret_info(sls_files, mod=mod_name)
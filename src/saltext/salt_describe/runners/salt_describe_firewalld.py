@@ -9,10 +9,8 @@ Module for building state file
 import logging
 import sys
 
-import yaml
-from saltext.salt_describe.utils.init import generate_files
-from saltext.salt_describe.utils.init import parse_salt_ret
-from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.aio import describe
+from saltext.salt_describe.utils.init import dump_yaml
 
 
 __virtualname__ = "describe"
@@ -25,7 +23,17 @@ def __virtual__():
     return __virtualname__
 
 
-def firewalld(tgt, tgt_type="glob", config_system="salt"):
+def firewalld(
+    tgt,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+):
     """
     Gather the firewalld rules for minions and generate a state file.
 
@@ -36,20 +44,11 @@ def firewalld(tgt, tgt_type="glob", config_system="salt"):
         salt-run describe.firewalld minion-tgt
     """
     mod_name = sys._getframe().f_code.co_name
-    log.info("Attempting to generate SLS file for %s", "firewalld")
-    rules = __salt__["salt.execute"](
-        tgt,
-        "firewalld.list_all",
-        tgt_type=tgt_type,
-    )
-    sls_files = []
-    if not parse_salt_ret(ret=rules, tgt=tgt):
-        return ret_info(sls_files, mod=mod_name)
-    for minion in list(rules.keys()):
+
+    def _parse(minion, rule):
         state_contents = {}
         state_func = "firewalld.present"
 
-        rule = rules[minion]
         zones = rule.keys()
         count = 0
         for zone in zones:
@@ -77,12 +76,22 @@ def firewalld(tgt, tgt_type="glob", config_system="salt"):
             state_contents[state_id][state_func] = kwargs
             count += 1
 
-        state = yaml.dump(state_contents)
+        return dump_yaml(state_contents)
 
-        sls_files.append(
-            generate_files(
-                __opts__, minion, state, sls_name="firewalld", config_system=config_system
-            )
-        )
-
-    return ret_info(sls_files, mod=mod_name)
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
+        tgt,
+        "firewalld.list_all",
+        _parse,
+        sls_name="firewalld",
+        tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
+    )
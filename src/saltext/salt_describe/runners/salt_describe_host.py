@@ -9,10 +9,8 @@ Module for building state file
 import logging
 import sys
 
-import yaml
-from saltext.salt_describe.utils.init import generate_files
-from saltext.salt_describe.utils.init import parse_salt_ret
-from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.aio import describe
+from saltext.salt_describe.utils.init import dump_yaml
 
 __virtualname__ = "describe"
 
@@ -24,7 +22,17 @@ def __virtual__():
     return __virtualname__
 
 
-def host(tgt, tgt_type="glob", config_system="salt"):
+def host(
+    tgt,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+):
     """
     Gather /etc/hosts file content on minions and build a state file.
 
@@ -36,18 +44,8 @@ def host(tgt, tgt_type="glob", config_system="salt"):
 
     """
     mod_name = sys._getframe().f_code.co_name
-    log.info("Attempting to generate SLS file for %s", mod_name)
-    ret = __salt__["salt.execute"](
-        tgt,
-        "hosts.list_hosts",
-        tgt_type=tgt_type,
-    )
-    sls_files = []
-    if not parse_salt_ret(ret=ret, tgt=tgt):
-        return ret_info(sls_files, mod=mod_name)
 
-    for minion in list(ret.keys()):
-        content = ret[minion]
+    def _parse(minion, content):
         count = 0
         state_contents = {}
         for key, value in content.items():
@@ -60,10 +58,22 @@ def host(tgt, tgt_type="glob", config_system="salt"):
                 state_contents[sls_id][state_func][0]["ip"] = key
                 state_contents[sls_id][state_func][1]["names"] = value["aliases"]
                 count += 1
+        return dump_yaml(state_contents)
 
-        state = yaml.dump(state_contents)
-        sls_files.append(
-            generate_files(__opts__, minion, state, sls_name="host", config_system=config_system)
-        )
-
-    return ret_info(sls_files, mod=mod_name)
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
+        tgt,
+        "hosts.list_hosts",
+        _parse,
+        sls_name="host",
+        tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
+    )
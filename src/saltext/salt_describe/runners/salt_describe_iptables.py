@@ -9,10 +9,8 @@ Module for building state file
 import logging
 import sys
 
-import yaml
-from saltext.salt_describe.utils.init import generate_files
-from saltext.salt_describe.utils.init import parse_salt_ret
-from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.aio import describe
+from saltext.salt_describe.utils.init import dump_yaml
 
 __virtualname__ = "describe"
 
@@ -24,7 +22,17 @@ def __virtual__():
     return __virtualname__
 
 
-def iptables(tgt, tgt_type="glob", config_system="salt"):
+def iptables(
+    tgt,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+):
     """
     Gather the iptable rules for minions and generate a state file.
 
@@ -35,21 +43,11 @@ def iptables(tgt, tgt_type="glob", config_system="salt"):
         salt-run describe.iptables minion-tgt
     """
     mod_name = sys._getframe().f_code.co_name
-    log.info("Attempting to generate SLS file for %s", mod_name)
-    rules = __salt__["salt.execute"](
-        tgt,
-        "iptables.get_rules",
-        tgt_type=tgt_type,
-    )
-    sls_files = []
-    if not parse_salt_ret(ret=rules, tgt=tgt):
-        return ret_info(sls_files, mod=mod_name)
 
-    for minion in list(rules.keys()):
+    def _parse(minion, rule):
         state_contents = {}
         state_func = "iptables.append"
 
-        rule = rules[minion]
         for table in list(rule):
             chains = list(rule[table])
             count = 0
@@ -67,12 +65,22 @@ def iptables(tgt, tgt_type="glob", config_system="salt"):
                     state_contents[state_id][state_func] = kwargs
                     count += 1
 
-        state = yaml.dump(state_contents)
-
-        sls_files.append(
-            generate_files(
-                __opts__, minion, state, sls_name="iptables", config_system=config_system
-            )
-        )
+        return dump_yaml(state_contents)
 
-    return ret_info(sls_files, mod=mod_name)
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
+        tgt,
+        "iptables.get_rules",
+        _parse,
+        sls_name="iptables",
+        tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
+    )
@@ -9,10 +9,8 @@ Module for building state file
 import logging
 import sys
 
-import yaml
-from saltext.salt_describe.utils.init import generate_files
-from saltext.salt_describe.utils.init import parse_salt_ret
-from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.aio import describe
+from saltext.salt_describe.utils.init import dump_yaml
 from saltext.salt_describe.utils.pip import _parse_ansible
 from saltext.salt_describe.utils.pip import _parse_salt
 
@@ -26,7 +24,19 @@ def __virtual__():
     return __virtualname__
 
 
-def pip(tgt, tgt_type="glob", bin_env=None, config_system="salt", **kwargs):
+def pip(
+    tgt,
+    tgt_type="glob",
+    bin_env=None,
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+    **kwargs,
+):
     """
     Gather installed pip libraries and build a state file.
 
@@ -38,26 +48,29 @@ def pip(tgt, tgt_type="glob", bin_env=None, config_system="salt", **kwargs):
 
     """
     mod_name = sys._getframe().f_code.co_name
-    log.info("Attempting to generate SLS file for %s", mod_name)
-    ret = __salt__["salt.execute"](
-        tgt,
-        "pip.freeze",
-        tgt_type=tgt_type,
-        bin_env=bin_env,
-    )
-    if not parse_salt_ret(ret=ret, tgt=tgt):
-        return ret_info(sls_files, mod=mod_name)
 
-    sls_files = []
-    for minion in list(ret.keys()):
-        minion_pip_list = ret[minion]
+    def _parse(minion, minion_pip_list):
         state_contents = getattr(sys.modules[__name__], f"_parse_{config_system}")(
             minion, minion_pip_list, **kwargs
         )
-        state = yaml.dump(state_contents)
-
-        sls_files.append(
-            generate_files(__opts__, minion, state, sls_name="pip", config_system=config_system)
-        )
+        return dump_yaml(state_contents)
 
-    return ret_info(sls_files, mod=mod_name)
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
+        tgt,
+        "pip.freeze",
+        _parse,
+        sls_name="pip",
+        tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        options=kwargs,
+        kwarg={"bin_env": bin_env} if bin_env else None,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
+    )
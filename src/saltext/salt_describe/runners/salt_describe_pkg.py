@@ -9,14 +9,22 @@ Module for building state file
 import logging
 import sys
 
-import salt.utils.minions  # pylint: disable=import-error
-import yaml
+from saltext.salt_describe.utils.incremental import load_fingerprints
+from saltext.salt_describe.utils.incremental import record
+from saltext.salt_describe.utils.incremental import save_fingerprints
+from saltext.salt_describe.utils.incremental import unchanged
+from saltext.salt_describe.utils.init import dump_yaml
+from saltext.salt_describe.utils.init import execute
 from saltext.salt_describe.utils.init import generate_files
+from saltext.salt_describe.utils.init import get_grains
 from saltext.salt_describe.utils.init import parse_salt_ret
 from saltext.salt_describe.utils.init import ret_info
 from saltext.salt_describe.utils.pkg import _parse_ansible
 from saltext.salt_describe.utils.pkg import _parse_chef
 from saltext.salt_describe.utils.pkg import _parse_salt
+from saltext.salt_describe.utils.profile import profile_minions
+from saltext.salt_describe.utils.profile import profiled
+from saltext.salt_describe.utils.profile import start_profile
 
 
 __virtualname__ = "describe"
@@ -29,8 +37,21 @@ def __virtual__():
     return __virtualname__
 
 
+@profiled
 def pkg(
-    tgt, tgt_type="glob", include_version=True, single_state=True, config_system="salt", **kwargs
+    tgt,
+    tgt_type="glob",
+    include_version=True,
+    single_state=True,
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+    dedup=False,
+    **kwargs,
 ):
     """
     Gather installed pkgs on minions and build a state file.
@@ -46,30 +67,56 @@ def pkg(
         salt-run describe.pkg minion-tgt config_system=chef
     """
     mod_name = sys._getframe().f_code.co_name
+    start_profile(__opts__, mod_name, profile)
     log.info("Attempting to generate SLS file for %s", mod_name)
-    ret = __salt__["salt.execute"](
+    ret = execute(
+        __salt__,
         tgt,
         "pkg.list_pkgs",
         tgt_type=tgt_type,
+        stream_returns=stream_returns,
+        opts=__opts__,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
     )
 
     sls_files = []
     if not parse_salt_ret(ret=ret, tgt=tgt):
         return ret_info(sls_files, mod=mod_name)
 
-    for minion in list(ret.keys()):
+    grains = {}
+    if config_system == "ansible" and not stream_returns:
+        grains = get_grains(__opts__, list(ret), keys=["os_family"])
+    fingerprints = load_fingerprints(
+        __opts__,
+        mod_name,
+        incremental,
+        config_system=config_system,
+        dedup=dedup,
+        include_version=include_version,
+        single_state=single_state,
+        **kwargs,
+    )
 
-        _, grains, _ = salt.utils.minions.get_minion_data(minion, __opts__)
+    for minion in profile_minions(ret):
+        if config_system == "ansible" and minion not in grains:
+            grains.update(get_grains(__opts__, [minion], keys=["os_family"]))
+        sls_file = unchanged(fingerprints, minion, ret[minion], grains.get(minion))
+        if sls_file:
+            sls_files.append(sls_file)
+            continue
 
         pkg_cmd = None
         if config_system == "ansible":
-            if grains["os_family"] not in ("Debian", "RedHat"):
+            os_family = grains[minion].get("os_family")
+            if os_family not in ("Debian", "RedHat"):
                 log.debug("Unsupported minion")
                 continue
             else:
-                if grains["os_family"] in ("Debian",):
+                if os_family in ("Debian",):
                     pkg_cmd = "apt"
-                elif grains["os_family"] in ("RedHat"):
+                elif os_family in ("RedHat"):
                     pkg_cmd = "dnf"
 
         pkgs = ret[minion]
@@ -78,12 +125,24 @@ def pkg(
         )
 
         if config_system in ("ansible", "salt"):
-            state = yaml.dump(state_contents)
+            state = dump_yaml(state_contents)
         else:
             state = "\n".join(state_contents)
 
         sls_files.append(
-            generate_files(__opts__, minion, state, sls_name="pkg", config_system=config_system)
+            record(
+                fingerprints,
+                minion,
+                generate_files(
+                    __opts__,
+                    minion,
+                    state,
+                    sls_name="pkg",
+                    config_system=config_system,
+                    dedup=dedup,
+                ),
+            )
         )
 
+    save_fingerprints(fingerprints)
     return ret_info(sls_files, mod=mod_name)
@@ -10,11 +10,19 @@ import logging
 import re
 import sys
 
-import salt.utils.minions  # pylint: disable=import-error
-import yaml
+from saltext.salt_describe.utils.incremental import load_fingerprints
+from saltext.salt_describe.utils.incremental import record
+from saltext.salt_describe.utils.incremental import save_fingerprints
+from saltext.salt_describe.utils.incremental import unchanged
+from saltext.salt_describe.utils.init import dump_yaml
+from saltext.salt_describe.utils.init import execute
 from saltext.salt_describe.utils.init import generate_files
+from saltext.salt_describe.utils.init import get_grains
 from saltext.salt_describe.utils.init import parse_salt_ret
 from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.profile import profile_minions
+from saltext.salt_describe.utils.profile import profiled
+from saltext.salt_describe.utils.profile import start_profile
 
 
 __virtualname__ = "describe"
@@ -27,7 +35,19 @@ def __virtual__():
     return __virtualname__
 
 
-def pkgrepo(tgt, tgt_type="glob", config_system="salt"):
+@profiled
+def pkgrepo(
+    tgt,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+    dedup=False,
+):
     """
     Gather the package repo data for minions and generate a state file.
 
@@ -39,19 +59,36 @@ def pkgrepo(tgt, tgt_type="glob", config_system="salt"):
 
     """
     mod_name = sys._getframe().f_code.co_name
+    start_profile(__opts__, mod_name, profile)
     log.info("Attempting to generate SLS file for %s", mod_name)
-    pkgrepos = __salt__["salt.execute"](
+    pkgrepos = execute(
+        __salt__,
         tgt,
         "pkg.list_repos",
         tgt_type=tgt_type,
+        stream_returns=stream_returns,
+        opts=__opts__,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
     )
     sls_files = []
     if not parse_salt_ret(ret=pkgrepos, tgt=tgt):
         return ret_info(sls_files, mod=mod_name)
-    for minion in list(pkgrepos.keys()):
-        _, grains, _ = salt.utils.minions.get_minion_data(minion, __opts__)
+    grains = {} if stream_returns else get_grains(__opts__, list(pkgrepos), keys=["os_family"])
+    fingerprints = load_fingerprints(
+        __opts__, mod_name, incremental, config_system=config_system, dedup=dedup
+    )
+    for minion in profile_minions(pkgrepos):
+        if minion not in grains:
+            grains.update(get_grains(__opts__, [minion], keys=["os_family"]))
+        sls_file = unchanged(fingerprints, minion, pkgrepos[minion], grains[minion])
+        if sls_file:
+            sls_files.append(sls_file)
+            continue
 
-        if grains["os_family"] not in ("Debian", "RedHat"):
+        os_family = grains[minion].get("os_family")
+        if os_family not in ("Debian", "RedHat"):
             log.debug("Unsupported minion")
             continue
 
@@ -64,7 +101,7 @@ def pkgrepo(tgt, tgt_type="glob", config_system="salt"):
         for _pkgrepo_name in _pkgrepo:
             if isinstance(_pkgrepo[_pkgrepo_name], dict):
 
-                if grains["os_family"] == "RedHat":
+                if os_family == "RedHat":
                     state_contents[_pkgrepo_name] = {
                         state_func: [
                             {"humanname": _pkgrepo[_pkgrepo_name]["name"]},
@@ -89,7 +126,7 @@ def pkgrepo(tgt, tgt_type="glob", config_system="salt"):
 
             elif isinstance(_pkgrepo[_pkgrepo_name], list):
                 for item in _pkgrepo[_pkgrepo_name]:
-                    if grains["os_family"] == "Debian":
+                    if os_family == "Debian":
 
                         sls_id = re.sub(r"^#\ ", "", item["line"])
 
@@ -112,12 +149,22 @@ def pkgrepo(tgt, tgt_type="glob", config_system="salt"):
                                 {"architectures": architectures}
                             )
 
-        state = yaml.dump(state_contents)
+        state = dump_yaml(state_contents)
 
         sls_files.append(
-            generate_files(
-                __opts__, minion, state, sls_name=state_name, config_system=config_system
+            record(
+                fingerprints,
+                minion,
+                generate_files(
+                    __opts__,
+                    minion,
+                    state,
+                    sls_name=state_name,
+                    config_system=config_system,
+                    dedup=dedup,
+                ),
             )
         )
 
+    save_fingerprints(fingerprints)
     return ret_info(sls_files, mod=mod_name)
@@ -10,10 +10,18 @@ import io
 import logging
 import sys
 
-import yaml
+from saltext.salt_describe.utils.incremental import load_fingerprints
+from saltext.salt_describe.utils.incremental import record
+from saltext.salt_describe.utils.incremental import save_fingerprints
+from saltext.salt_describe.utils.incremental import unchanged
+from saltext.salt_describe.utils.init import dump_yaml
+from saltext.salt_describe.utils.init import execute
 from saltext.salt_describe.utils.init import generate_files
 from saltext.salt_describe.utils.init import parse_salt_ret
 from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.profile import profile_minions
+from saltext.salt_describe.utils.profile import profiled
+from saltext.salt_describe.utils.profile import start_profile
 from saltext.salt_describe.utils.service import _parse_ansible
 from saltext.salt_describe.utils.service import _parse_chef
 from saltext.salt_describe.utils.service import _parse_salt
@@ -140,7 +148,19 @@ end
     return _contents
 
 
-def service(tgt, tgt_type="glob", config_system="salt", **kwargs):
+@profiled
+def service(
+    tgt,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+    **kwargs,
+):
     """
     Gather enabled and disabled services on minions and build a state file.
 
@@ -158,24 +178,40 @@ def service(tgt, tgt_type="glob", config_system="salt", **kwargs):
         salt-run describe.service minion-tgt config_system=ansible hosts=hostgroup
     """
     mod_name = sys._getframe().f_code.co_name
+    start_profile(__opts__, mod_name, profile)
     log.info("Attempting to generate SLS file for %s", mod_name)
-    enabled_services = __salt__["salt.execute"](
+    enabled_services = execute(
+        __salt__,
         tgt,
         "service.get_enabled",
         tgt_type=tgt_type,
+        opts=__opts__,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
     )
-    disabled_services = __salt__["salt.execute"](
+    disabled_services = execute(
+        __salt__,
         tgt,
         "service.get_disabled",
         tgt_type=tgt_type,
+        opts=__opts__,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
     )
 
     if sys.platform.startswith("darwin"):
 
-        all_services = __salt__["salt.execute"](
+        all_services = execute(
+            __salt__,
             tgt,
             "service.list",
             tgt_type=tgt_type,
+            opts=__opts__,
+            batch=batch,
+            timeout=timeout,
+            gather_job_timeout=gather_job_timeout,
         )
         buf = io.StringIO(all_services[tgt])
         contents = buf.readlines()
@@ -191,11 +227,17 @@ def service(tgt, tgt_type="glob", config_system="salt", **kwargs):
                 service_status[tgt][service] = True
         func_ret = [service_status, enabled_services]
     else:
-        service_status = __salt__["salt.execute"](
+        service_status = execute(
+            __salt__,
             tgt,
             "service.status",
-            "*",
+            arg=["*"],
             tgt_type=tgt_type,
+            stream_returns=stream_returns,
+            opts=__opts__,
+            batch=batch,
+            timeout=timeout,
+            gather_job_timeout=gather_job_timeout,
         )
         func_ret = [service_status, disabled_services, enabled_services]
 
@@ -203,17 +245,38 @@ def service(tgt, tgt_type="glob", config_system="salt", **kwargs):
     for _func_ret in func_ret:
         if not parse_salt_ret(ret=_func_ret, tgt=tgt):
             return ret_info(sls_files, mod=mod_name)
+    fingerprints = load_fingerprints(
+        __opts__, mod_name, incremental, config_system=config_system, **kwargs
+    )
+
+    for minion in profile_minions(service_status):
+        sls_file = unchanged(
+            fingerprints,
+            minion,
+            service_status[minion],
+            enabled_services.get(minion),
+            disabled_services.get(minion),
+        )
+        if sls_file:
+            sls_files.append(sls_file)
+            continue
 
-    for minion in list(service_status.keys()):
         state_contents = getattr(sys.modules[__name__], f"_parse_{config_system}")(
             minion, service_status, enabled_services, disabled_services, **kwargs
         )
         if config_system in ("ansible", "salt"):
-            state = yaml.dump(state_contents)
+            state = dump_yaml(state_contents)
         else:
             state = "\n".join(state_contents)
         sls_files.append(
-            generate_files(__opts__, minion, state, sls_name="service", config_system=config_system)
+            record(
+                fingerprints,
+                minion,
+                generate_files(
+                    __opts__, minion, state, sls_name="service", config_system=config_system
+                ),
+            )
         )
 
+    save_fingerprints(fingerprints)
     return ret_info(sls_files, mod=mod_name)
@@ -10,10 +10,8 @@ import logging
 import sys
 
 import salt.utils.minions  # pylint: disable=import-error
-import yaml
-from saltext.salt_describe.utils.init import generate_files
-from saltext.salt_describe.utils.init import parse_salt_ret
-from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.aio import describe
+from saltext.salt_describe.utils.init import dump_yaml
 from saltext.salt_describe.utils.ssh_known_hosts import _parse_ansible
 from saltext.salt_describe.utils.ssh_known_hosts import _parse_chef
 from saltext.salt_describe.utils.ssh_known_hosts import _parse_salt
@@ -29,7 +27,18 @@ def __virtual__():
     return __virtualname__
 
 
-def ssh_known_hosts(tgt, tgt_type="glob", config_system="salt", **kwargs):
+def ssh_known_hosts(
+    tgt,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+    **kwargs,
+):
     """
     Gather installed ssh_known_hosts on minions and build a state file.
 
@@ -43,29 +52,31 @@ def ssh_known_hosts(tgt, tgt_type="glob", config_system="salt", **kwargs):
 
         salt-run describe.ssh_known_hosts config_system=chef
     """
-    known_hosts = __salt__["salt.execute"](
-        tgt,
-        "ssh.auth_keys",
-        tgt_type=tgt_type,
-    )
-
-    sls_files = []
-    for _func_ret in func_ret:
-        if not parse_salt_ret(ret=_func_ret, tgt=tgt):
-            return ret_info(sls_files, mod=mod_name)
+    mod_name = sys._getframe().f_code.co_name
 
-    for minion in list(known_hosts.keys()):
+    def _parse(minion, user_keys):
         state_contents = getattr(sys.modules[__name__], f"_parse_{config_system}")(
-            minion, known_hosts, **kwargs
+            minion, user_keys, **kwargs
         )
         if config_system in ("ansible", "salt"):
-            state = yaml.dump(state_contents)
-        else:
-            state = "\n".join(state_contents)
-        sls_files.append(
-            generate_files(
-                __opts__, minion, state, sls_name="ssh_known_hosts", config_system=config_system
-            )
-        )
+            return dump_yaml(state_contents)
+        return "\n".join(state_contents)
 
-    return ret_info(sls_files, mod=mod_name)
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
+        tgt,
+        "ssh.auth_keys",
+        _parse,
+        sls_name="ssh_known_hosts",
+        tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        options=kwargs,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
+    )
@@ -9,10 +9,8 @@ Module for building state file
 import logging
 import sys
 
-import yaml
-from saltext.salt_describe.utils.init import generate_files
-from saltext.salt_describe.utils.init import parse_salt_ret
-from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.aio import describe
+from saltext.salt_describe.utils.init import dump_yaml
 
 
 __virtualname__ = "describe"
@@ -25,7 +23,19 @@ def __virtual__():
     return __virtualname__
 
 
-def sysctl(tgt, sysctl_items, tgt_type="glob", config_system="salt"):
+def sysctl(
+    tgt,
+    sysctl_items,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+    dedup=False,
+):
     """
     read sysctl on the minions and build a state file
     to managed the sysctl settings.
@@ -37,29 +47,33 @@ def sysctl(tgt, sysctl_items, tgt_type="glob", config_system="salt"):
         salt-run describe.sysctl minion-tgt '[vm.swappiness,vm.dirty_ratio]'
     """
     mod_name = sys._getframe().f_code.co_name
-    log.info("Attempting to generate SLS file for %s", mod_name)
-    sysctls = __salt__["salt.execute"](
-        tgt,
-        "sysctl.show",
-        tgt_type=tgt_type,
-    )
-
-    state_contents = {}
-    sls_files = []
-    if not parse_salt_ret(ret=sysctls, tgt=tgt):
-        return ret_info(sls_files, mod=mod_name)
 
-    for minion in list(sysctls.keys()):
+    def _parse(minion, sysctls):
+        state_contents = {}
         for current in sysctl_items:
-            if current in sysctls[minion].keys():
-                payload = [{"name": current}, {"value": sysctls[minion][current]}]
+            if current in sysctls.keys():
+                payload = [{"name": current}, {"value": sysctls[current]}]
                 state_contents[f"sysctl-{current}"] = {"sysctl.present": payload}
             else:
                 log.error("%s not found in sysctl", current)
+        return dump_yaml(state_contents)
 
-        state = yaml.dump(state_contents)
-        sls_files.append(
-            generate_files(__opts__, minion, state, sls_name="sysctl", config_system=config_system)
-        )
-
-    return ret_info(sls_files, mod=mod_name)
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
+        tgt,
+        "sysctl.show",
+        _parse,
+        sls_name="sysctl",
+        tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        dedup=dedup,
+        options={"dedup": dedup, "sysctl_items": sysctl_items},
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
+    )
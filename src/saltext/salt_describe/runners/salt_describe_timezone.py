@@ -9,10 +9,8 @@ Module for building state file
 import logging
 import sys
 
-import yaml
-from saltext.salt_describe.utils.init import generate_files
-from saltext.salt_describe.utils.init import parse_salt_ret
-from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.aio import describe
+from saltext.salt_describe.utils.init import dump_yaml
 
 __virtualname__ = "describe"
 
@@ -24,7 +22,18 @@ def __virtual__():
     return __virtualname__
 
 
-def timezone(tgt, tgt_type="glob", config_system="salt"):
+def timezone(
+    tgt,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
+    dedup=False,
+):
     """
     Gather the timezone data for minions and generate a state file.
 
@@ -36,29 +45,27 @@ def timezone(tgt, tgt_type="glob", config_system="salt"):
 
     """
     mod_name = sys._getframe().f_code.co_name
-    log.info("Attempting to generate SLS file for %s", mod_name)
-    timezones = __salt__["salt.execute"](
+
+    def _parse(minion, timezone):
+        state_contents = {timezone: {"timezone.system": []}}
+        return dump_yaml(state_contents)
+
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
         tgt,
         "timezone.get_zone",
+        _parse,
+        sls_name="timezone",
         tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        dedup=dedup,
+        options={"dedup": dedup},
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
     )
-
-    sls_files = []
-    if not parse_salt_ret(ret=timezones, tgt=tgt):
-        return ret_info(sls_files, mod=mod_name)
-
-    for minion in list(timezones.keys()):
-        timezone = timezones[minion]
-
-        state_contents = {}
-        state_contents = {timezone: {"timezone.system": []}}
-
-        state = yaml.dump(state_contents)
-
-        sls_files.append(
-            generate_files(
-                __opts__, minion, state, sls_name="timezone", config_system=config_system
-            )
-        )
-
-    return ret_info(sls_files, mod=mod_name)
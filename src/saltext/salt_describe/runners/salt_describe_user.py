@@ -9,11 +9,21 @@ Module for building state file
 import logging
 import sys
 
-import yaml
+from saltext.salt_describe.utils.aio import describe
+from saltext.salt_describe.utils.incremental import load_fingerprints
+from saltext.salt_describe.utils.incremental import record
+from saltext.salt_describe.utils.incremental import save_fingerprints
+from saltext.salt_describe.utils.incremental import unchanged
+from saltext.salt_describe.utils.init import dump_yaml
+from saltext.salt_describe.utils.init import execute
 from saltext.salt_describe.utils.init import generate_files
 from saltext.salt_describe.utils.init import parse_salt_ret
 from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.profile import profile_minions
+from saltext.salt_describe.utils.profile import profiled
+from saltext.salt_describe.utils.profile import start_profile
 from saltext.salt_describe.utils.salt_describe import generate_pillars
+from saltext.salt_describe.utils.user import USER_INFO_KWARG
 
 __virtualname__ = "describe"
 
@@ -25,6 +35,7 @@ def __virtual__():
     return __virtualname__
 
 
+@profiled
 def user(
     tgt,
     require_groups=False,
@@ -34,6 +45,12 @@ def user(
     maximum_gid=None,
     tgt_type="glob",
     config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
 ):
     """
     read users on the minions and build a state file
@@ -46,8 +63,8 @@ def user(
         salt-run describe.user minion-tgt
     """
     mod_name = sys._getframe().f_code.co_name
+    start_profile(__opts__, mod_name, profile)
     log.info("Attempting to generate SLS file for %s", mod_name)
-    state_contents = {}
     if require_groups is True:
         __salt__["describe.group"](
             tgt=tgt,
@@ -55,32 +72,56 @@ def user(
             minimum_gid=minimum_gid,
             maximum_gid=maximum_gid,
             tgt_type=tgt_type,
+            incremental=incremental,
+            batch=batch,
+            timeout=timeout,
+            gather_job_timeout=gather_job_timeout,
         )
 
-    users = __salt__["salt.execute"](
+    users = execute(
+        __salt__,
         tgt,
-        "user.getent",
+        "slsutil.renderer",
         tgt_type=tgt_type,
+        kwarg=USER_INFO_KWARG,
+        stream_returns=stream_returns,
+        opts=__opts__,
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
     )
 
-    pillars = {"users": {}}
     sls_files = []
     if not parse_salt_ret(ret=users, tgt=tgt):
         return ret_info(sls_files, mod=mod_name)
 
-    for minion in list(users.keys()):
-        for user in users[minion]:
+    fingerprints = load_fingerprints(
+        __opts__,
+        mod_name,
+        incremental,
+        config_system=config_system,
+        minimum_uid=minimum_uid,
+        maximum_uid=maximum_uid,
+    )
+    for minion in profile_minions(users):
+        sls_file = unchanged(fingerprints, minion, users[minion])
+        if sls_file:
+            sls_files.append(sls_file)
+            continue
+
+        if not isinstance(users[minion], list):
+            log.error("Could not gather the users on %s: %s", minion, users[minion])
+            continue
+        state_contents = {}
+        pillars = {"users": {}}
+        for user_info in users[minion]:
+            user = user_info["user"]
             if minimum_uid and int(user["uid"]) <= minimum_uid:
                 continue
             if maximum_uid and int(user["uid"]) >= maximum_uid:
                 continue
-            shadow = __salt__["salt.execute"](
-                minion, "shadow.info", arg=[user["name"]], tgt_type="glob"
-            )[minion]
-
-            homeexists = __salt__["salt.execute"](
-                minion, "file.directory_exists", arg=[user["home"]], tgt_type="glob"
-            )[minion]
+            shadow = user_info["shadow"]
+            homeexists = user_info["homeexists"]
             username = user["name"]
             payload = [
                 {"name": username},
@@ -120,12 +161,20 @@ def user(
             if passwd != "*":
                 pillars["users"].update({user["name"]: f"{passwd}"})
 
-        state = yaml.dump(state_contents)
-        pillars = yaml.dump(pillars)
+        state = dump_yaml(state_contents)
+        pillar = dump_yaml(pillars)
         sls_files.append(
-            generate_files(__opts__, minion, state, sls_name="users", config_system=config_system)
+            record(
+                fingerprints,
+                minion,
+                generate_files(
+                    __opts__, minion, state, sls_name="users", config_system=config_system
+                ),
+            )
         )
-        generate_pillars(__opts__, minion, pillars, sls_name="users")
+        generate_pillars(__opts__, minion, pillar, sls_name="users")
+
+    save_fingerprints(fingerprints)
     return ret_info(sls_files, mod=mod_name)
 
 
@@ -136,6 +185,12 @@ def group(
     maximum_gid=None,
     tgt_type="glob",
     config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    profile=False,
 ):
     """
     read groups on the minions and build a state file
@@ -148,18 +203,10 @@ def group(
         salt-run describe.group minion-tgt
     """
     mod_name = sys._getframe().f_code.co_name
-    groups = __salt__["salt.execute"](
-        tgt,
-        "group.getent",
-        tgt_type=tgt_type,
-    )
-    if not parse_salt_ret(ret=groups, tgt=tgt):
-        return ret_info(sls_files, mod=mod_name)
 
-    state_contents = {}
-    sls_files = []
-    for minion in list(groups.keys()):
-        for group in groups[minion]:
+    def _parse(minion, minion_groups):
+        state_contents = {}
+        for group in minion_groups:
             if minimum_gid and int(group["gid"]) <= minimum_gid:
                 continue
             groupname = group["name"]
@@ -168,10 +215,23 @@ def group(
                 payload.append({"members": group["members"]})
             state_contents[f"group-{groupname}"] = {"group.present": payload}
 
-        state = yaml.dump(state_contents)
+        return dump_yaml(state_contents)
 
-        sls_files.append(
-            generate_files(__opts__, minion, state, sls_name="groups", config_system=config_system)
-        )
-
-    return ret_info(sls_files, mod=mod_name)
+    return describe(
+        __opts__,
+        __salt__,
+        mod_name,
+        tgt,
+        "group.getent",
+        _parse,
+        sls_name="groups",
+        tgt_type=tgt_type,
+        config_system=config_system,
+        incremental=incremental,
+        stream_returns=stream_returns,
+        options={"include_members": include_members, "minimum_gid": minimum_gid},
+        batch=batch,
+        timeout=timeout,
+        gather_job_timeout=gather_job_timeout,
+        profile=profile,
+    )
@@ -0,0 +1,191 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import logging
+import time
+
+from saltext.salt_describe.utils.incremental import load_fingerprints
+from saltext.salt_describe.utils.incremental import record
+from saltext.salt_describe.utils.incremental import save_fingerprints
+from saltext.salt_describe.utils.incremental import unchanged
+from saltext.salt_describe.utils.init import execute
+from saltext.salt_describe.utils.init import generate_files
+from saltext.salt_describe.utils.init import parse_salt_ret
+from saltext.salt_describe.utils.init import ret_info
+from saltext.salt_describe.utils.init import StreamedReturns
+from saltext.salt_describe.utils.profile import add_profile
+from saltext.salt_describe.utils.profile import call_profiled
+from saltext.salt_describe.utils.profile import finish_profile
+from saltext.salt_describe.utils.profile import is_profiling
+from saltext.salt_describe.utils.profile import profile_minion
+from saltext.salt_describe.utils.profile import start_profile
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def run(coro):
+    """
+    Run the coroutine to completion and return its result. When an event
+    loop is already running on this thread, the coroutine is run on a
+    thread of its own, so the synchronous describe functions work either way.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        # The loader's __salt__ and __opts__ are context variables
+        return executor.submit(contextvars.copy_context().run, asyncio.run, coro).result()
+
+
+async def run_in_executor(func, *args, executor=None, minion=None, **kwargs):
+    """
+    Await func on the executor, the loop's default one when none is given.
+    When this thread is being profiled, what func records on the executor
+    is added to the profile, as the minion's when it is given. func is run
+    in a copy of the current context, so the loader's ``__salt__`` and
+    ``__opts__`` resolve on the executor's threads too.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    if not is_profiling():
+        return await loop.run_in_executor(
+            executor, functools.partial(context.run, func, *args, **kwargs)
+        )
+
+    ret, data = await loop.run_in_executor(
+        executor, functools.partial(context.run, call_profiled, func, *args, **kwargs)
+    )
+    add_profile(data, minion=minion)
+    return ret
+
+
+async def execute_async(salt_funcs, tgt, fun, **kwargs):
+    """
+    Await ``execute`` without blocking the loop. Takes the same arguments.
+    """
+    return await run_in_executor(execute, salt_funcs, tgt, fun, **kwargs)
+
+
+async def iter_returns(returns):
+    """
+    Yield every minion and its return. The returns of a ``StreamedReturns``
+    are awaited as they arrive, on a thread of their own, as the local
+    client that streams them must not move between threads.
+    """
+    if not isinstance(returns, StreamedReturns):
+        for minion in returns:
+            yield minion, returns[minion]
+        return
+
+    minions = iter(returns)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        while True:
+            start = time.perf_counter()
+            minion = await run_in_executor(next, minions, _DONE, executor=executor)
+            if minion is _DONE:
+                return
+            add_profile({"collect": time.perf_counter() - start}, minion=minion)
+            yield minion, returns[minion]
+
+
+async def _generate(opts, fingerprints, minion, state, **kwargs):
+    sls_file = await run_in_executor(generate_files, opts, minion, state, minion=minion, **kwargs)
+    return record(fingerprints, minion, sls_file)
+
+
+async def describe_minions(
+    opts,
+    salt_funcs,
+    name,
+    tgt,
+    fun,
+    parse,
+    sls_name,
+    tgt_type="glob",
+    config_system="salt",
+    incremental=False,
+    stream_returns=False,
+    dedup=False,
+    options=None,
+    **job_options,
+):
+    """
+    The flow the describe functions share. Run ``fun`` against the target,
+    turn every minion's return into its state with ``parse`` and generate
+    the files of the state as ``sls_name``.
+
+    ``parse`` is called with the minion and its return and returns the
+    serialized state, or None to leave the minion out. The files of a minion
+    are generated on the loop's default executor while the next minion is
+    parsed. ``options`` are the other arguments of the describe function that
+    change the generated states, for the fingerprints of ``incremental``.
+
+    Returns the generated SLS files, in the order the minions returned in.
+    """
+    returns = await execute_async(
+        salt_funcs,
+        tgt,
+        fun,
+        tgt_type=tgt_type,
+        stream_returns=stream_returns,
+        opts=opts,
+        **job_options,
+    )
+    if not parse_salt_ret(ret=returns, tgt=tgt):
+        return []
+    fingerprints = load_fingerprints(
+        opts, name, incremental, config_system=config_system, **(options or {})
+    )
+
+    sls_files = []
+    async for minion, minion_ret in iter_returns(returns):
+        with profile_minion(minion):
+            sls_file = unchanged(fingerprints, minion, minion_ret)
+            state = None if sls_file else parse(minion, minion_ret)
+        if sls_file:
+            sls_files.append(sls_file)
+        elif state is not None:
+            sls_files.append(
+                asyncio.ensure_future(
+                    _generate(
+                        opts,
+                        fingerprints,
+                        minion,
+                        state,
+                        sls_name=sls_name,
+                        config_system=config_system,
+                        dedup=dedup,
+                    )
+                )
+            )
+
+    sls_files = [
+        await sls_file if isinstance(sls_file, asyncio.Future) else sls_file
+        for sls_file in sls_files
+    ]
+    save_fingerprints(fingerprints)
+    return sls_files
+
+
+def describe(opts, salt_funcs, name, tgt, fun, parse, sls_name, profile=False, **kwargs):
+    """
+    Run ``describe_minions`` to completion for the describe function ``name``
+    and return what the describe functions return
+    """
+    start_profile(opts, name, profile)
+    try:
+        log.info("Attempting to generate SLS file for %s", name)
+        return ret_info(
+            run(describe_minions(opts, salt_funcs, name, tgt, fun, parse, sls_name, **kwargs)),
+            mod=name,
+        )
+    finally:
+        # Already finished by ret_info, unless describe_minions raised
+        finish_profile(name)
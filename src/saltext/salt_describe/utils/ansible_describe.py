@@ -8,6 +8,8 @@ import salt.config
 import salt.syspaths
 import salt.utils.files
 import yaml
+from saltext.salt_describe.utils.output import make_dirs
+from saltext.salt_describe.utils.output import write_file
 
 log = logging.getLogger(__name__)
 
@@ -21,7 +23,7 @@ def generate_files(opts, minion, state, sls_name="default", env="base", root=Non
     else:
         minion_state_root = pathlib.Path(root, "ansible", minion)
     try:
-        minion_state_root.mkdir(parents=True, exist_ok=True)
+        make_dirs(minion_state_root)
     except PermissionError:
         log.warning(
             f"Unable to create directory {str(minion_state_root)}.  Check that the salt user has the correct permissions."
@@ -30,7 +32,6 @@ def generate_files(opts, minion, state, sls_name="default", env="base", root=Non
 
     minion_state_file = minion_state_root / f"{sls_name}.yml"
 
-    with salt.utils.files.fopen(minion_state_file, "w") as fp_:
-        fp_.write(state)
+    write_file(minion_state_file, state)
 
     return minion_state_file
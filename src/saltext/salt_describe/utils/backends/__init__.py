@@ -0,0 +1,127 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import logging
+import sqlite3
+import subprocess
+import tarfile
+import zipfile
+
+import saltext.salt_describe.utils.backends.archive
+import saltext.salt_describe.utils.backends.git
+import saltext.salt_describe.utils.backends.sqlite
+from saltext.salt_describe.utils.backends.index import covers as index_covers
+from saltext.salt_describe.utils.session import get_session
+
+log = logging.getLogger(__name__)
+
+BACKENDS = ("archive", "git", "gitfs", "sqlite")
+
+# The backends that are a configuration of another backend
+_CONFIGURATIONS = {"gitfs": "git"}
+
+# The errors reading the files of an output backend can fail with
+READ_ERRORS = (
+    OSError,
+    KeyError,
+    ValueError,
+    subprocess.SubprocessError,
+    sqlite3.Error,
+    tarfile.TarError,
+    zipfile.BadZipFile,
+)
+
+
+def _backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown output backend {name}, use one of {', '.join(BACKENDS)}")
+    return getattr(saltext.salt_describe.utils.backends, _CONFIGURATIONS.get(name, name))
+
+
+def open_output(session, name, target, **options):
+    """
+    Write the files of the describe session with the output backend
+    ``name`` to ``target`` instead of the filesystem, until close_output is
+    called. The backends are ``archive``, a single tar or zip file, ``git``,
+    a bare git repository that gets one commit per run, ``gitfs``, the
+    ``git`` backend with the state file root passed as its ``root``, and
+    ``sqlite``, a SQLite database that keeps every run. The options are
+    passed on to the backend.
+    """
+    backend = _backend(name)
+    session["output"] = {
+        "name": name,
+        "backend": backend,
+        "handle": backend.open_output(target, **options),
+    }
+    return session["output"]
+
+
+def get_output():
+    """
+    Return the output backend of the current describe session or None
+    """
+    session = get_session()
+    if session is None:
+        return None
+    return session.get("output")
+
+
+def covers(output, path):
+    """
+    Return whether the file at path is written to the output backend. The
+    other files are written to the filesystem as without a backend.
+    """
+    return index_covers(output["handle"], path)
+
+
+def add_file(output, path, contents, mode=0o644):
+    """
+    Write the contents of the file at path to the output backend. Returns
+    False when the backend already has these contents for the file.
+    """
+    return output["backend"].add_file(output["handle"], path, contents, mode)
+
+
+def list_dir(output, path):
+    """
+    Return the names of the files written to the directory at path
+    """
+    return output["backend"].list_dir(output["handle"], path)
+
+
+def close_output(session):
+    """
+    Finish writing to the output backend of the describe session. Returns
+    what the backend wrote to, or None when the session does not have one.
+    When the backend fails to finish, what it wrote in this run is dropped.
+    """
+    output = session.pop("output", None)
+    if output is None:
+        return None
+    try:
+        info = output["backend"].close_output(output["handle"])
+    except BaseException:
+        output["backend"].abort_output(output["handle"])
+        raise
+    return dict(info, backend=output["name"])
+
+
+def abort_output(session):
+    """
+    Drop what the output backend of the describe session wrote in this run
+    and release it, for a run that failed
+    """
+    output = session.pop("output", None)
+    if output is not None:
+        output["backend"].abort_output(output["handle"])
+
+
+def read_output(name, target, **options):
+    """
+    Yield the name, entry and contents of every file the output
+    backend ``name`` wrote to ``target``. The name of a file is
+    its path without the anchor, see ``index.member_name``. The
+    options are passed on to the backend.
+    """
+    return _backend(name).read_output(target, **options)
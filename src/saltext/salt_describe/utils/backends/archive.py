@@ -0,0 +1,140 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import contextlib
+import io
+import json
+import logging
+import os
+import pathlib
+import tarfile
+import time
+import zipfile
+
+from saltext.salt_describe.utils.backends.index import check_digest
+from saltext.salt_describe.utils.backends.index import index_file
+from saltext.salt_describe.utils.backends.index import list_index_dir
+from saltext.salt_describe.utils.backends.index import new_index
+
+log = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+_TAR_MODES = {
+    ".tar": "w",
+    ".gz": "w:gz",
+    ".tgz": "w:gz",
+    ".bz2": "w:bz2",
+    ".xz": "w:xz",
+}
+
+
+def open_output(target):
+    """
+    Open the archive at target to write the generated files into, with
+    ``manifest.json`` as its last member. A ``.zip`` path gives a zip file
+    and every other one a tar file, compressed when the path ends in
+    ``.gz``, ``.tgz``, ``.bz2`` or ``.xz``.
+    """
+    path = pathlib.Path(target)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".zip":
+        handle = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+    else:
+        handle = tarfile.open(path, _TAR_MODES.get(path.suffix, "w"))
+    return dict(new_index(), path=path, handle=handle, listed=set())
+
+
+def _add_member(handle, name, data, mode=0o644):
+    if isinstance(handle, zipfile.ZipFile):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = (0o100000 | mode) << 16
+        handle.writestr(info, data)
+        return
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = int(time.time())
+    handle.addfile(info, io.BytesIO(data))
+
+
+def add_file(archive, path, contents, mode=0o644):
+    """
+    Add the contents of the file at path to the archive. Returns False,
+    without adding them again, when the archive already has these contents
+    for the file.
+    """
+    with archive["lock"]:
+        indexed = index_file(archive, path, contents, mode)
+        if indexed is None:
+            return False
+        name, _, data = indexed
+        _add_member(archive["handle"], name, data, mode)
+    return True
+
+
+def list_dir(archive, path):
+    """
+    Return the names of the files in the directory at path in the archive,
+    and of the files already in the directory the archive is extracted to
+    """
+    path = pathlib.Path(path)
+    with archive["lock"]:
+        if path not in archive["listed"]:
+            archive["listed"].add(path)
+            try:
+                names = {entry.name for entry in os.scandir(path) if entry.is_file()}
+            except OSError:
+                names = set()
+            archive["dirs"].setdefault(path, set()).update(names)
+    return list_index_dir(archive, path)
+
+
+def close_output(archive):
+    """
+    Add the manifest, the index of every file in the archive, as its last
+    member and close the archive. Returns its path and number of files.
+    """
+    with archive["lock"]:
+        manifest = {"version": 1, "created": int(time.time()), "files": archive["files"]}
+        _add_member(
+            archive["handle"], MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode()
+        )
+        archive["handle"].close()
+    log.info("Wrote %s files to %s", len(archive["files"]), archive["path"])
+    return {"path": str(archive["path"]), "files": len(archive["files"])}
+
+
+def abort_output(archive):
+    """
+    Close the archive and remove it, as it has no manifest
+    """
+    with archive["lock"]:
+        archive["handle"].close()
+        with contextlib.suppress(FileNotFoundError):
+            archive["path"].unlink()
+
+
+def read_output(target):
+    """
+    Yield the name, manifest entry and contents of every file of the
+    archive at target in the order of its manifest. The contents of every
+    file are checked against the sha256 hash in the manifest.
+    """
+    path = pathlib.Path(target)
+    if zipfile.is_zipfile(path):
+        handle = zipfile.ZipFile(path)
+        read = handle.read
+    else:
+        handle = tarfile.open(path)
+
+        def read(name):
+            return handle.extractfile(handle.getmember(name)).read()
+
+    with handle:
+        manifest = json.loads(read(MANIFEST))
+        for name, entry in sorted(manifest["files"].items()):
+            data = read(name)
+            check_digest(name, entry, data)
+            yield name, entry, data
@@ -0,0 +1,216 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import hashlib
+import logging
+import pathlib
+import subprocess
+import time
+
+from saltext.salt_describe.utils.backends.index import index_file
+from saltext.salt_describe.utils.backends.index import list_index_dir
+from saltext.salt_describe.utils.backends.index import new_index
+from saltext.salt_describe.utils.backends.index import seed_index
+
+log = logging.getLogger(__name__)
+
+COMMITTER = "salt-describe <salt-describe@localhost>"
+
+
+def run_git(repo, *args, check=True, **kwargs):
+    """
+    Run the git command in the repository and return its output
+    """
+    return subprocess.run(
+        ["git", f"--git-dir={repo}", *args],
+        check=check,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        **kwargs,
+    )
+
+
+def _object_id(kind, data):
+    return hashlib.sha1(b"%s %d\0%s" % (kind.encode(), len(data), data)).hexdigest()
+
+
+def _head_ref(repo, branch=None):
+    """
+    Return the ref of the branch, or of the branch HEAD of the repository
+    points to, and its commit, or None for the commit when the branch has
+    no commits yet
+    """
+    if branch:
+        ref = f"refs/heads/{branch}"
+    else:
+        ref = run_git(repo, "symbolic-ref", "HEAD").stdout.decode().strip()
+    commit = run_git(repo, "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}", check=False)
+    return ref, commit.stdout.decode().strip() or None
+
+
+def ls_tree(repo, rev):
+    """
+    Return the name, mode and object id of every file in the tree of rev
+    """
+    tree = run_git(repo, "ls-tree", "-r", "-z", "--full-tree", rev).stdout
+    entries = []
+    for line in tree.split(b"\0"):
+        if not line:
+            continue
+        info, name = line.split(b"\t", 1)
+        mode, kind, obj = info.decode().split()
+        if kind == "blob":
+            entries.append((name.decode(), mode, obj))
+    return entries
+
+
+def _quote(name):
+    """
+    Quote a path for git fast-import when it has to be
+    """
+    if "\n" not in name and not name.startswith('"'):
+        return name
+    escaped = name.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def open_output(target, root=None, branch=None):
+    """
+    Open the bare git repository at target, creating it when it does not
+    exist, to commit the generated files to ``branch``, or the branch its
+    HEAD points to. The files are streamed into the repository with ``git
+    fast-import`` as they are written and all of them are committed at once
+    when the output is closed, on top of the files of the previous commit.
+    The files of the previous commit are listed with the ones written in
+    this run.
+
+    With a ``root`` directory, like the state file root for gitfs to serve
+    the repository, only the files below it are committed, with the root
+    as the root of the repository. The other generated files, like the
+    pillars, are written to the filesystem as usual.
+    """
+    repo = pathlib.Path(target)
+    if not (repo / "HEAD").is_file():
+        subprocess.run(
+            ["git", "init", "--bare", "--quiet", str(repo)],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    ref, parent = _head_ref(repo, branch)
+    git = dict(new_index(root), path=repo, ref=ref, parent=parent, tree={}, marks={}, blobs=0)
+    if parent is not None:
+        git["tree"] = {name: (mode, obj) for name, mode, obj in ls_tree(repo, parent)}
+        base = git["root"] or pathlib.Path("/")
+        seed_index(git, (base / name for name in git["tree"]))
+    git["process"] = subprocess.Popen(
+        ["git", f"--git-dir={repo}", "fast-import", "--quiet", "--done"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    return git
+
+
+def add_file(git, path, contents, mode=0o644):
+    """
+    Stream the contents of the file at path into the repository as a blob.
+    Returns False, without streaming them again, when they were already
+    written for the file in this run. Contents the previous commit already
+    has for the file are not streamed either.
+    """
+    with git["lock"]:
+        indexed = index_file(git, path, contents, mode)
+        if indexed is None:
+            return False
+        name, _, data = indexed
+        file_mode = "100755" if mode & 0o111 else "100644"
+        if git["tree"].get(name) == (file_mode, _object_id("blob", data)):
+            git["marks"].pop(name, None)
+            return True
+        git["blobs"] += 1
+        mark = git["blobs"]
+        git["process"].stdin.write(b"blob\nmark :%d\ndata %d\n%s\n" % (mark, len(data), data))
+        git["marks"][name] = (mark, file_mode)
+    return True
+
+
+def list_dir(git, path):
+    """
+    Return the names of the files in the directory at path in the previous
+    commit and the ones written to it in this run
+    """
+    return list_index_dir(git, path)
+
+
+def close_output(git, message="Update the generated states"):
+    """
+    Commit all of the files written in this run to the branch in a single
+    commit. Returns the path of the repository, the number of files written
+    and the commit, which is None when no file was changed.
+    """
+    with git["lock"]:
+        stream = []
+        if git["marks"]:
+            message = f"{message}\n\n{len(git['files'])} files written by salt-describe\n".encode()
+            stream.append(f"commit {git['ref']}\n".encode())
+            stream.append(f"committer {COMMITTER} {int(time.time())} +0000\n".encode())
+            stream.append(b"data %d\n%s\n" % (len(message), message))
+            if git["parent"]:
+                stream.append(f"from {git['parent']}\n".encode())
+            for name, (mark, mode) in sorted(git["marks"].items()):
+                stream.append(f"M {mode} :{mark} {_quote(name)}\n".encode())
+        stream.append(b"done\n")
+        _, stderr = git["process"].communicate(b"".join(stream))
+    if git["process"].returncode:
+        raise RuntimeError(
+            f"Unable to commit to {git['path']}: {stderr.decode(errors='replace').strip()}"
+        )
+
+    commit = None
+    if git["marks"]:
+        commit = run_git(git["path"], "rev-parse", git["ref"]).stdout.decode().strip()
+        log.info("Committed %s files to %s as %s", len(git["files"]), git["path"], commit)
+    else:
+        log.info("The generated files in %s did not change", git["path"])
+    return {"path": str(git["path"]), "files": len(git["files"]), "commit": commit}
+
+
+def abort_output(git):
+    """
+    Stop streaming the files into the repository without committing them
+    """
+    with git["lock"]:
+        if git["process"].returncode is None:
+            git["process"].kill()
+            git["process"].communicate()
+
+
+def read_output(target, branch=None):
+    """
+    Yield the name, entry and contents of every file in the last commit
+    of ``branch``, or the commit HEAD points to, in the git repository at
+    target. The names are relative to the root the files were committed
+    with.
+    """
+    repo = pathlib.Path(target)
+    entries = ls_tree(repo, f"refs/heads/{branch}" if branch else "HEAD")
+    with subprocess.Popen(
+        ["git", f"--git-dir={repo}", "cat-file", "--batch"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    ) as process:
+        for name, mode, obj in entries:
+            process.stdin.write(f"{obj}\n".encode())
+            process.stdin.flush()
+            size = int(process.stdout.readline().split()[2])
+            data = process.stdout.read(size)
+            process.stdout.read(1)
+            entry = {
+                "path": f"/{name}",
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "size": size,
+                "mode": 0o755 if mode == "100755" else 0o644,
+            }
+            yield name, entry, data
+        process.stdin.close()
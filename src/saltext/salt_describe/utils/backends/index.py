@@ -0,0 +1,90 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import hashlib
+import pathlib
+import threading
+
+
+def member_name(path):
+    """
+    Return the name the file at the absolute path is stored under in an
+    output backend, which is the path without its anchor
+    """
+    path = pathlib.Path(path)
+    return path.relative_to(path.anchor).as_posix()
+
+
+def new_index(root=None):
+    """
+    Return an empty index of the files written to an output backend. With
+    a ``root`` directory only the files below it are written to the backend
+    and their names are relative to it.
+    """
+    return {
+        "lock": threading.Lock(),
+        "files": {},
+        "dirs": {},
+        "root": pathlib.Path(root) if root is not None else None,
+    }
+
+
+def covers(index, path):
+    """
+    Return whether the file at path is written to the backend of the index
+    """
+    if index["root"] is None:
+        return True
+    try:
+        pathlib.Path(path).relative_to(index["root"])
+    except ValueError:
+        return False
+    return True
+
+
+def seed_index(index, paths):
+    """
+    List the files at paths, written to the backend by earlier runs, with
+    the files written in this run. Call it with the index's lock held.
+    """
+    for path in paths:
+        path = pathlib.Path(path)
+        index["dirs"].setdefault(path.parent, set()).add(path.name)
+
+
+def index_file(index, path, contents, mode=0o644):
+    """
+    Add the file to the index and return its member name, entry and
+    contents as bytes, or None when the index already has these contents
+    for the file. Call it with the index's lock held.
+    """
+    data = contents.encode() if isinstance(contents, str) else contents
+    digest = hashlib.sha256(data).hexdigest()
+    path = pathlib.Path(path)
+    if index["root"] is None:
+        name = member_name(path)
+    else:
+        name = path.relative_to(index["root"]).as_posix()
+    known = index["files"].get(name)
+    if known and known["sha256"] == digest:
+        return None
+    entry = {"path": str(path), "sha256": digest, "size": len(data), "mode": mode}
+    index["files"][name] = entry
+    index["dirs"].setdefault(path.parent, set()).add(path.name)
+    return name, entry, data
+
+
+def list_index_dir(index, path):
+    """
+    Return the names of the files in the directory at path in the index
+    """
+    with index["lock"]:
+        return set(index["dirs"].get(pathlib.Path(path), ()))
+
+
+def check_digest(name, entry, data):
+    """
+    Raise a ValueError when the contents do not match the sha256 hash of the entry
+    """
+    if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+        raise ValueError(f"The contents of {name} do not match its sha256 hash")
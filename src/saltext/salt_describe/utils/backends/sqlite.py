@@ -0,0 +1,123 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import contextlib
+import logging
+import pathlib
+import sqlite3
+import time
+
+from saltext.salt_describe.utils.backends.index import check_digest
+from saltext.salt_describe.utils.backends.index import index_file
+from saltext.salt_describe.utils.backends.index import list_index_dir
+from saltext.salt_describe.utils.backends.index import new_index
+from saltext.salt_describe.utils.backends.index import seed_index
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, created INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS blobs (sha256 TEXT PRIMARY KEY, contents BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    run INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    mode INTEGER NOT NULL,
+    PRIMARY KEY (name, run)
+);
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def open_output(target):
+    """
+    Open the SQLite database at target, creating it when it does not exist,
+    to store the generated files in. Every run is stored as one transaction,
+    and the contents of the files are only stored once for all runs, so
+    earlier runs stay available. The files stored by earlier runs are listed
+    with the ones stored in this run.
+    """
+    path = pathlib.Path(target)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = _connect(path)
+    store = dict(new_index(), path=path, conn=conn)
+    seed_index(store, (row[0] for row in conn.execute("SELECT DISTINCT path FROM files")))
+    store["run"] = conn.execute(
+        "INSERT INTO runs (created) VALUES (?)", (int(time.time()),)
+    ).lastrowid
+    return store
+
+
+def add_file(store, path, contents, mode=0o644):
+    """
+    Store the contents of the file at path as part of the run. Returns
+    False when they were already stored for the file in this run.
+    """
+    with store["lock"]:
+        indexed = index_file(store, path, contents, mode)
+        if indexed is None:
+            return False
+        name, entry, data = indexed
+        store["conn"].execute(
+            "INSERT OR IGNORE INTO blobs VALUES (?, ?)", (entry["sha256"], sqlite3.Binary(data))
+        )
+        store["conn"].execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+            (store["run"], name, entry["path"], entry["sha256"], mode),
+        )
+    return True
+
+
+def list_dir(store, path):
+    """
+    Return the names of the files stored in the directory at path
+    """
+    return list_index_dir(store, path)
+
+
+def close_output(store):
+    """
+    Commit the run. Returns the path of the database, the
+    number of files stored and the id of the run.
+    """
+    with store["lock"], contextlib.closing(store["conn"]) as conn:
+        conn.commit()
+    log.info("Stored %s files in %s as run %s", len(store["files"]), store["path"], store["run"])
+    return {"path": str(store["path"]), "files": len(store["files"]), "run": store["run"]}
+
+
+def abort_output(store):
+    """
+    Roll back the run and close the database
+    """
+    with store["lock"], contextlib.closing(store["conn"]) as conn:
+        # The database is already closed when committing the run failed
+        with contextlib.suppress(sqlite3.ProgrammingError):
+            conn.rollback()
+
+
+def read_output(target):
+    """
+    Yield the name, entry and contents of the latest version
+    of every file stored in the SQLite database at target
+    """
+    if not pathlib.Path(target).is_file():
+        raise FileNotFoundError(f"{target} does not exist")
+    with contextlib.closing(_connect(target)) as conn:
+        rows = conn.execute(
+            "SELECT files.name, files.path, files.sha256, files.mode, blobs.contents "
+            "FROM files JOIN blobs ON blobs.sha256 = files.sha256 "
+            "WHERE files.run = (SELECT MAX(run) FROM files AS latest WHERE latest.name = files.name) "
+            "ORDER BY files.name"
+        )
+        for name, path, sha256, mode, contents in rows:
+            data = bytes(contents)
+            entry = {"path": path, "sha256": sha256, "size": len(data), "mode": mode}
+            check_digest(name, entry, data)
+            yield name, entry, data
@@ -0,0 +1,186 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+BASELINE_SUFFIX = "_baseline"
+
+# State arguments that list the items one state manages,
+# like the packages of describe.pkg with single_state
+LIST_ARGS = ("pkgs", "names")
+
+
+def _item_key(item):
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def _item_name(item):
+    if isinstance(item, dict) and item:
+        return str(next(iter(item)))
+    return str(item)
+
+
+def _split_list_arg(state):
+    """
+    Split the arguments of a state with a single function into the
+    list argument it manages and all of the other arguments. Returns
+    None when the state does not have exactly one list argument.
+    """
+    if not isinstance(state, dict) or len(state) != 1:
+        return None
+    fun, args = next(iter(state.items()))
+    if not isinstance(args, list):
+        return None
+
+    list_args = [
+        (index, arg)
+        for index, arg in enumerate(args)
+        if isinstance(arg, dict)
+        and len(arg) == 1
+        and next(iter(arg)) in LIST_ARGS
+        and isinstance(next(iter(arg.values())), list)
+    ]
+    if len(list_args) != 1:
+        return None
+    index, arg = list_args[0]
+    name, items = next(iter(arg.items()))
+    return fun, name, items, args[:index] + args[index + 1 :]
+
+
+def _with_items(fun, name, items, other_args):
+    return {fun: other_args + [{name: items}]}
+
+
+def _state_keys(state):
+    """
+    Return the IDs of the states, and the names of the items of the states
+    that manage a list of items, which group_similar compares minions by
+    """
+    keys = set()
+    for state_id, args in state.items():
+        if state_id == "include":
+            continue
+        keys.add(state_id)
+        split = _split_list_arg(args)
+        if split is not None:
+            keys.update(f"{state_id}:{_item_name(item)}" for item in split[2])
+    return keys
+
+
+def similarity(keys, other_keys):
+    """
+    Return the Jaccard similarity of two sets of state keys
+    """
+    if not keys and not other_keys:
+        return 1.0
+    return len(keys & other_keys) / len(keys | other_keys)
+
+
+def group_similar(states, threshold):
+    """
+    Split the minions into groups of minions with similar states. ``states``
+    are the generated states by minion.
+
+    The minions are compared by the IDs of their states and the names of the
+    items of the states that manage a list of items, like the packages of a
+    ``pkg.installed`` state. A minion joins the first group whose first
+    minion's states have a Jaccard similarity of at least ``threshold`` with
+    its own, or starts a new group.
+
+    Returns the groups as lists of minions, in the order of ``states``.
+    """
+    groups = []
+    for minion, state in states.items():
+        keys = _state_keys(state)
+        for group_keys, minions in groups:
+            if similarity(keys, group_keys) >= threshold:
+                minions.append(minion)
+                break
+        else:
+            groups.append((keys, [minion]))
+    return [minions for _, minions in groups]
+
+
+def factor_states(states):
+    """
+    Factor out the states the minions have in common. ``states`` are the
+    generated states by minion.
+
+    A state all of the minions have with the same arguments is moved to the
+    baseline. When a state manages a list of items, like the packages of a
+    ``pkg.installed`` state, the items all of the minions have are moved to
+    a baseline state of the same name with ``_baseline`` appended.
+
+    Returns the baseline states and what is left of the states of every
+    minion, which merged with the baseline are the original states again.
+    """
+    minions = list(states)
+    if not minions:
+        return {}, {}
+
+    baseline = {}
+    deltas = {minion: dict(states[minion]) for minion in minions}
+    for state_id, state in states[minions[0]].items():
+        others = [states[minion].get(state_id) for minion in minions[1:]]
+        if all(other == state for other in others):
+            baseline[state_id] = state
+            for minion in minions:
+                deltas[minion].pop(state_id)
+            continue
+
+        split = [_split_list_arg(state)] + [_split_list_arg(other) for other in others]
+        if (
+            None in split
+            or len({_item_key((fun, name, args)) for fun, name, _, args in split}) != 1
+        ):
+            continue
+        fun, name, items, other_args = split[0]
+        common = {_item_key(item) for item in items}
+        for _, _, other_items, _ in split[1:]:
+            common &= {_item_key(item) for item in other_items}
+        if not common or f"{state_id}{BASELINE_SUFFIX}" in states[minions[0]]:
+            continue
+
+        baseline[f"{state_id}{BASELINE_SUFFIX}"] = _with_items(
+            fun, name, [item for item in items if _item_key(item) in common], other_args
+        )
+        for minion, (_, _, minion_items, _) in zip(minions, split):
+            remaining = [item for item in minion_items if _item_key(item) not in common]
+            if remaining:
+                deltas[minion][state_id] = _with_items(fun, name, remaining, other_args)
+            else:
+                deltas[minion].pop(state_id)
+
+    return baseline, deltas
+
+
+def merge_baseline(state, baseline):
+    """
+    Merge the baseline states factored out with factor_states
+    back into what is left of a minion's states
+    """
+    merged = dict(state)
+    for state_id, baseline_state in baseline.items():
+        if not state_id.endswith(BASELINE_SUFFIX):
+            merged[state_id] = baseline_state
+            continue
+
+        orig_id = state_id[: -len(BASELINE_SUFFIX)]
+        if orig_id not in merged:
+            merged[orig_id] = baseline_state
+            continue
+
+        split = _split_list_arg(baseline_state)
+        delta_split = _split_list_arg(merged[orig_id])
+        if split is None or delta_split is None:
+            log.warning("Cannot merge the baseline state %s back into %s", state_id, orig_id)
+            merged[state_id] = baseline_state
+            continue
+        fun, name, items, other_args = split
+        merged[orig_id] = _with_items(
+            fun, name, sorted(items + delta_split[2], key=_item_name), other_args
+        )
+    return merged
@@ -0,0 +1,75 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import logging
+import posixpath
+
+log = logging.getLogger(__name__)
+
+_GLOB_CHARS = ("*", "?", "[")
+
+# Rendered on the minion by slsutil.renderer. Directories and globs are
+# expanded with file.find, and the contents and stats of every matching
+# file come back in a single job. Without contents only the stats are
+# gathered.
+FILE_INFO_TEMPLATE = """
+{%- set files = {} %}
+{%- for spec in specs %}
+{%-   if spec["find"] is not none %}
+{%-     set found = salt["file.find"](spec["path"], type="f", **spec["find"]) %}
+{%-   elif salt["file.directory_exists"](spec["path"]) %}
+{%-     set found = salt["file.find"](spec["path"], type="f") %}
+{%-   elif salt["file.file_exists"](spec["path"]) %}
+{%-     set found = [spec["path"]] %}
+{%-   else %}
+{%-     set found = [] %}
+{%-   endif %}
+{%-   for path in found %}
+{%-     set info = {"stats": salt["file.stats"](path)} %}
+{%-     if contents %}
+{%-       do info.update({"contents": salt["file.read"](path)}) %}
+{%-     endif %}
+{%-     do files.update({path: info}) %}
+{%-   endfor %}
+{%- endfor %}
+{{ files | tojson }}
+"""
+
+
+def _file_spec(path):
+    """
+    Turn a requested path into what the file info template needs to
+    expand it on the minion. Globs are only supported in the last path
+    component, optionally preceded by ``**`` to match in any subdirectory.
+    """
+    if not any(char in path for char in _GLOB_CHARS):
+        return {"path": path, "find": None}
+
+    dirname, name = posixpath.split(path)
+    find = {"maxdepth": 1}
+    if posixpath.basename(dirname) == "**":
+        dirname = posixpath.dirname(dirname)
+        find = {}
+    if any(char in dirname for char in _GLOB_CHARS):
+        log.error("Globs are only supported in the last component of a path: %s", path)
+        return None
+    if name != "**":
+        find["name"] = name
+    else:
+        find = {}
+    return {"path": dirname, "find": find}
+
+
+def file_info_kwarg(paths, contents=True):
+    """
+    Return the slsutil.renderer kwargs that gather the contents and
+    stats of all of the paths on the minion. Pass ``contents=False``
+    to only gather the stats.
+    """
+    specs = [spec for spec in (_file_spec(path) for path in paths) if spec]
+    return {
+        "string": FILE_INFO_TEMPLATE,
+        "default_renderer": "jinja|json",
+        "specs": specs,
+        "contents": contents,
+    }
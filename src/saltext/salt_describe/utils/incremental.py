@@ -0,0 +1,136 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+
+import salt.syspaths  # pylint: disable=import-error
+from saltext.salt_describe.utils.backends import get_output
+from saltext.salt_describe.utils.session import get_capture
+
+log = logging.getLogger(__name__)
+
+_DB_LOCK = threading.Lock()
+
+
+def get_fingerprint_db(opts):
+    """
+    Return the path of the database holding the fingerprints of the
+    returns the SLS files were last generated from
+    """
+    cachedir = opts.get("cachedir") or os.path.join(salt.syspaths.CACHE_DIR, "master")
+    return pathlib.Path(cachedir) / "salt-describe" / "fingerprints.db"
+
+
+@contextlib.contextmanager
+def _connect(opts):
+    db_file = get_fingerprint_db(opts)
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    with _DB_LOCK, contextlib.closing(sqlite3.connect(str(db_file), timeout=30)) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            "name TEXT, minion TEXT, fingerprint TEXT, sls_file TEXT, "
+            "PRIMARY KEY (name, minion))"
+        )
+        with conn:
+            yield conn
+
+
+def fingerprint(*data):
+    """
+    Return a fingerprint of the data
+    """
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_fingerprints(opts, name, incremental=False, **options):
+    """
+    Load the fingerprints stored for the describe function ``name``. The
+    options are everything besides the minion's return that changes the
+    generated SLS file, like the config system.
+
+    Returns None when ``incremental`` is not set, while the describe
+    session captures the generated files, or when it writes them to an
+    output backend, which turns the other functions of this module into
+    no-ops. A capture needs every SLS file generated, and must not record
+    the files it does not write. The output of a backend, like an archive,
+    only has the files written to it, so it needs every SLS file generated
+    as well.
+    """
+    if not incremental or get_capture() is not None or get_output() is not None:
+        return None
+
+    try:
+        with _connect(opts) as conn:
+            known = {
+                minion: (_fingerprint, sls_file)
+                for minion, _fingerprint, sls_file in conn.execute(
+                    "SELECT minion, fingerprint, sls_file FROM fingerprints WHERE name = ?",
+                    (name,),
+                )
+            }
+    except (OSError, sqlite3.Error) as exc:
+        log.warning(f"Unable to load the fingerprints, generating all SLS files: {exc}")
+        known = {}
+
+    return {
+        "opts": opts,
+        "name": name,
+        # Leave out the __pub_ keys salt adds, they change on every run
+        "options": {key: value for key, value in options.items() if not key.startswith("__")},
+        "known": known,
+        "pending": {},
+        "new": {},
+    }
+
+
+def unchanged(fingerprints, minion, *data):
+    """
+    Return the SLS file generated for the minion if its return data did
+    not change since it was generated, otherwise None
+    """
+    if fingerprints is None:
+        return None
+
+    _fingerprint = fingerprint(fingerprints["options"], data)
+    fingerprints["pending"][minion] = _fingerprint
+    known_fingerprint, sls_file = fingerprints["known"].get(minion, (None, None))
+    if known_fingerprint == _fingerprint and sls_file and os.path.exists(sls_file):
+        log.debug("The %s data of %s did not change", fingerprints["name"], minion)
+        return sls_file
+    return None
+
+
+def record(fingerprints, minion, sls_file):
+    """
+    Remember the fingerprint of the data the minion's SLS file was
+    just generated from. Returns the SLS file.
+    """
+    if fingerprints is not None and sls_file and minion in fingerprints["pending"]:
+        fingerprints["new"][minion] = (fingerprints["pending"].pop(minion), str(sls_file))
+    return sls_file
+
+
+def save_fingerprints(fingerprints):
+    """
+    Store the fingerprints recorded for the newly generated SLS files
+    """
+    if not fingerprints or not fingerprints["new"]:
+        return
+    try:
+        with _connect(fingerprints["opts"]) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?)",
+                [
+                    (fingerprints["name"], minion, _fingerprint, sls_file)
+                    for minion, (_fingerprint, sls_file) in fingerprints["new"].items()
+                ],
+            )
+    except (OSError, sqlite3.Error) as exc:
+        log.warning(f"Unable to save the fingerprints: {exc}")
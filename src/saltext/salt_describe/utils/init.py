@@ -1,23 +1,51 @@
 # Copyright 2023 VMware, Inc.
 # SPDX-License-Identifier: Apache-2.0
 #
+import json
 import logging
 
+import salt.cache  # pylint: disable=import-error
+import salt.client  # pylint: disable=import-error
 import saltext.salt_describe.utils.ansible_describe
 import saltext.salt_describe.utils.chef_describe
 import saltext.salt_describe.utils.salt_describe
+from salt.exceptions import SaltClientError  # pylint: disable=import-error
+from saltext.salt_describe.utils.output import dump_yaml  # pylint: disable=unused-import
+from saltext.salt_describe.utils.output import load_yaml  # pylint: disable=unused-import
+from saltext.salt_describe.utils.profile import count
+from saltext.salt_describe.utils.profile import finish_profile
+from saltext.salt_describe.utils.profile import phase
+from saltext.salt_describe.utils.session import get_capture
+from saltext.salt_describe.utils.session import get_session
 
 
 log = logging.getLogger(__name__)
 
 
-def generate_files(opts, minion, state, sls_name="default", env="base", config_system="salt"):
+def generate_files(
+    opts, minion, state, sls_name="default", env="base", config_system="salt", dedup=False
+):
     """
-    Generate the files for the given config management system
+    Generate the files for the given config management system. With
+    ``dedup`` identical salt states are only stored once for all minions.
     """
     config = getattr(saltext.salt_describe.utils, f"{config_system}_describe")
 
-    res = config.generate_files(opts, minion, state, sls_name=sls_name, env=env)
+    capture = get_capture()
+    if capture is not None:
+        with get_session()["lock"]:
+            capture[(minion, sls_name, config_system)] = state
+        return f"{minion}.{sls_name}"
+
+    kwargs = {}
+    if dedup and config_system == "salt":
+        kwargs["dedup"] = True
+    elif dedup:
+        log.warning(
+            "Only salt states can be shared, generating the %s files per minion", config_system
+        )
+    with phase("write"):
+        res = config.generate_files(opts, minion, state, sls_name=sls_name, env=env, **kwargs)
     if res:
         return str(res)
     else:
@@ -34,11 +62,15 @@ def get_minion_state_file_root(opts, minion, env="base", config_system="salt"):
 
 
 def ret_info(sls_files, mod=None):
+    profile = finish_profile(mod) if mod else None
     if not any(sls_files):
         if mod:
             log.error("Could not generate SLS file for %s", mod)
         return False
-    return {"Generated SLS file locations": sls_files}
+    ret = {"Generated SLS file locations": sls_files}
+    if profile is not None:
+        ret["Profile"] = profile
+    return ret
 
 
 def parse_salt_ret(ret, tgt):
@@ -46,6 +78,9 @@ def parse_salt_ret(ret, tgt):
     Parse the Salt return to check for Success
     or Error
     """
+    if isinstance(ret, StreamedReturns):
+        # The minions that return an error are skipped as the returns arrive
+        return True
     _status = []
     _errorrs = [
         "ERROR:",
@@ -60,3 +95,312 @@ def parse_salt_ret(ret, tgt):
                 _status.append(False)
         _status.append(True)
     return all(_status)
+
+
+def _collect_key(tgt, tgt_type, fun, arg=None, kwarg=None):
+    """
+    Return the key a collected return is stored under in the describe session
+    """
+    return json.dumps(
+        [tgt, tgt_type, fun, list(arg or []), kwarg or {}], sort_keys=True, default=str
+    )
+
+
+class StreamedReturns:
+    """
+    The returns of a job, handed out one minion at a time as they arrive.
+
+    Iterating over it yields the minions that returned without an error, and
+    only the return of the minion the iteration is at can be looked up. The
+    returns are not kept, so it can only be iterated over once.
+    """
+
+    def __init__(self, returns, tgt):
+        self._returns = returns
+        self._tgt = tgt
+        self._current = {}
+
+    def __iter__(self):
+        for minion, minion_ret in self._returns:
+            if not parse_salt_ret(ret={minion: minion_ret}, tgt=self._tgt):
+                continue
+            self._current = {minion: minion_ret}
+            yield minion
+        self._current = {}
+
+    def __getitem__(self, minion):
+        return self._current[minion]
+
+    def __contains__(self, minion):
+        return minion in self._current
+
+    def get(self, minion, default=None):
+        return self._current.get(minion, default)
+
+    def keys(self):
+        return iter(self)
+
+
+def _iter_returns(opts, tgt, fun, tgt_type="glob", arg=None, kwarg=None, batch=None, **kwargs):
+    """
+    Run ``fun`` against the target and yield every minion's return as
+    soon as it arrives. With ``batch`` the job only runs on that many
+    minions at a time, either a count or a percentage like ``10%``.
+    """
+    kwargs["timeout"] = kwargs.get("timeout") or opts.get("timeout")
+    with salt.client.get_local_client(opts["conf_file"]) as client:
+        try:
+            if batch:
+                for fn_ret in client.cmd_batch(
+                    tgt,
+                    fun,
+                    arg=arg or (),
+                    tgt_type=tgt_type,
+                    kwarg=kwarg,
+                    batch=str(batch),
+                    **kwargs,
+                ):
+                    yield from fn_ret.items()
+                return
+
+            for fn_ret in client.cmd_iter(
+                tgt,
+                fun,
+                arg=arg or (),
+                tgt_type=tgt_type,
+                kwarg=kwarg,
+                **kwargs,
+            ):
+                for minion, minion_ret in fn_ret.items():
+                    if isinstance(minion_ret, dict) and "ret" in minion_ret:
+                        minion_ret = minion_ret["ret"]
+                    yield minion, minion_ret
+        except SaltClientError as client_error:
+            log.error("Error while executing %s on %s (%s)", fun, tgt, tgt_type)
+            log.error(client_error)
+
+
+def _job_options(**options):
+    """
+    Return the job options that were set
+    """
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _run_job(salt_funcs, tgt, fun, tgt_type="glob", arg=None, kwarg=None, opts=None, **kwargs):
+    """
+    Run ``fun`` against the target and return the returns of all minions,
+    with ``salt.execute`` or, when the job is batched, the local client
+    """
+    batch = kwargs.pop("batch", None)
+    if batch:
+        return dict(
+            _iter_returns(
+                opts, tgt, fun, tgt_type=tgt_type, arg=arg, kwarg=kwarg, batch=batch, **kwargs
+            )
+        )
+
+    call_kwargs = {"tgt_type": tgt_type}
+    if arg is not None:
+        call_kwargs["arg"] = arg
+    if kwarg is not None:
+        call_kwargs["kwarg"] = kwarg
+    return salt_funcs["salt.execute"](tgt, fun, **call_kwargs, **kwargs)
+
+
+def execute(
+    salt_funcs,
+    tgt,
+    fun,
+    tgt_type="glob",
+    arg=None,
+    kwarg=None,
+    stream_returns=False,
+    opts=None,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+    **kwargs,
+):
+    """
+    Run ``fun`` against the target with ``salt.execute``. If the return was
+    already collected in the current describe session, use that instead.
+
+    With ``stream_returns`` the job is run with the master's ``opts`` through
+    the local client's ``cmd_iter`` and a ``StreamedReturns`` is returned, so
+    each minion's return can be processed as soon as it arrives.
+
+    ``batch``, ``timeout`` and ``gather_job_timeout`` work like the options
+    of the same name of the salt command. A batched job also needs ``opts``.
+    """
+    session = get_session()
+    if session is not None and not kwargs:
+        key = _collect_key(tgt, tgt_type, fun, arg=arg, kwarg=kwarg)
+        with session["lock"]:
+            if key in session["returns"]:
+                log.debug("Using the collected return of %s for %s", fun, tgt)
+                return session["returns"][key]
+
+    kwargs.update(_job_options(batch=batch, timeout=timeout, gather_job_timeout=gather_job_timeout))
+    count("calls")
+    if stream_returns:
+        return StreamedReturns(
+            _iter_returns(opts, tgt, fun, tgt_type=tgt_type, arg=arg, kwarg=kwarg, **kwargs),
+            tgt,
+        )
+    with phase("collect"):
+        return _run_job(
+            salt_funcs, tgt, fun, tgt_type=tgt_type, arg=arg, kwarg=kwarg, opts=opts, **kwargs
+        )
+
+
+def collect(
+    salt_funcs,
+    tgt,
+    jobs,
+    tgt_type="glob",
+    opts=None,
+    batch=None,
+    timeout=None,
+    gather_job_timeout=None,
+):
+    """
+    Run all of the ``(fun, arg, kwarg)`` jobs against the target in a
+    single compound job and store each function's return in the current
+    describe session, so ``execute`` does not need to publish them again.
+    The job options are the same as the ones of ``execute``.
+    """
+    session = get_session()
+    if session is None:
+        log.error("Cannot collect returns outside of a describe session")
+        return False
+
+    # Compound job returns are keyed by function name, so a function that
+    # is called with different arguments is collected in another job.
+    keys = set()
+    compound_jobs = []
+    for fun, arg, kwarg in jobs:
+        key = _collect_key(tgt, tgt_type, fun, arg=arg, kwarg=kwarg)
+        if key in keys:
+            log.debug("%s is already part of the job, it will not be collected again", fun)
+            continue
+        keys.add(key)
+        _arg = list(arg or [])
+        if kwarg:
+            _arg.append(dict(kwarg, __kwarg__=True))
+        for fun_jobs in compound_jobs:
+            if fun not in [job[0] for job in fun_jobs]:
+                break
+        else:
+            fun_jobs = []
+            compound_jobs.append(fun_jobs)
+        fun_jobs.append((fun, _arg, key))
+
+    if not compound_jobs:
+        return False
+
+    job_options = _job_options(batch=batch, timeout=timeout, gather_job_timeout=gather_job_timeout)
+    collected = [
+        _collect_job(salt_funcs, session, tgt, fun_jobs, tgt_type, opts, job_options)
+        for fun_jobs in compound_jobs
+    ]
+    return all(collected)
+
+
+def _collect_job(salt_funcs, session, tgt, fun_jobs, tgt_type, opts, job_options):
+    """
+    Run the ``(fun, arg, key)`` jobs, each with a different function, in a
+    single compound job and store each function's return under its key
+    """
+    funs = [fun for fun, _, _ in fun_jobs]
+    log.debug("Collecting %s from %s in a single job", funs, tgt)
+    ret = _run_job(
+        salt_funcs,
+        tgt,
+        funs,
+        tgt_type=tgt_type,
+        arg=[_arg for _, _arg, _ in fun_jobs],
+        opts=opts,
+        **job_options,
+    )
+    if not ret:
+        log.warning("Could not collect %s from %s", funs, tgt)
+        return False
+
+    with session["lock"]:
+        for index, (fun, _, key) in enumerate(fun_jobs):
+            fun_ret = {}
+            for minion, minion_ret in ret.items():
+                if isinstance(minion_ret, dict) and fun in minion_ret:
+                    fun_ret[minion] = minion_ret[fun]
+                elif isinstance(minion_ret, list) and len(minion_ret) == len(funs):
+                    # The minion is configured with multifunc_ordered
+                    fun_ret[minion] = minion_ret[index]
+                else:
+                    # The whole job failed on this minion, give every function the error
+                    fun_ret[minion] = minion_ret
+            session["returns"][key] = fun_ret
+    return True
+
+
+def _fetch_grains(cache, minion):
+    """
+    Fetch the minion's grains from the minion data cache. Salt 3008 keeps
+    them in the ``grains`` bank, older releases under the ``data`` key of
+    the minion's own ``minions/<id>`` bank.
+    """
+    grains = cache.fetch("grains", minion)
+    if grains is None:
+        grains = (cache.fetch(f"minions/{minion}", "data") or {}).get("grains")
+    return grains
+
+
+def get_grains(opts, minions, keys=None):
+    """
+    Return the grains of the minions from the master's minion data cache.
+    Pass ``keys`` to only keep those grains. Within a describe session every
+    minion's grains are only read from the cache once.
+    """
+    session = get_session()
+    cached = {}
+    if session is not None:
+        with session["lock"]:
+            cached = session.setdefault("grains", {})
+
+    grains = {}
+    missing = []
+    for minion in minions:
+        cached_keys, minion_grains = cached.get(minion, (set(), {}))
+        if cached_keys is None or (keys is not None and set(keys) <= cached_keys):
+            grains[minion] = minion_grains
+        else:
+            missing.append(minion)
+
+    if missing:
+        cache = None
+        if opts.get("minion_data_cache", False):
+            cache = salt.cache.factory(opts)
+        else:
+            log.warning("The minion data cache is disabled, no grains are available")
+        for minion in missing:
+            minion_grains = (_fetch_grains(cache, minion) if cache else None) or {}
+            if keys is not None:
+                minion_grains = {key: minion_grains[key] for key in keys if key in minion_grains}
+            grains[minion] = minion_grains
+            if session is not None:
+                with session["lock"]:
+                    cached[minion] = (None if keys is None else set(keys), minion_grains)
+
+    return _filter_grains(grains, keys)
+
+
+def _filter_grains(grains, keys):
+    """
+    Only keep the given keys of every minion's grains
+    """
+    if keys is None:
+        return grains
+    return {
+        minion: {key: minion_grains[key] for key in keys if key in minion_grains}
+        for minion, minion_grains in grains.items()
+    }
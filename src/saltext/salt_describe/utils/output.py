@@ -0,0 +1,407 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import collections
+import concurrent.futures
+import contextvars
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+
+import salt.utils.files
+import yaml
+from saltext.salt_describe.utils.backends import add_file
+from saltext.salt_describe.utils.backends import covers
+from saltext.salt_describe.utils.backends import get_output
+from saltext.salt_describe.utils.backends import list_dir as list_output_dir
+from saltext.salt_describe.utils.profile import call_profiled
+from saltext.salt_describe.utils.profile import count
+from saltext.salt_describe.utils.profile import phase
+from saltext.salt_describe.utils.session import get_capture
+from saltext.salt_describe.utils.session import get_session
+
+log = logging.getLogger(__name__)
+
+try:
+    from yaml import CSafeDumper as _SafeDumper
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeDumper as _SafeDumper
+    from yaml import SafeLoader as _SafeLoader
+
+# How many writes can wait for a writer before write_file blocks
+MAX_PENDING_WRITES = 1024
+
+
+class _Dumper(_SafeDumper):  # pylint: disable=too-many-ancestors
+    """
+    The LibYAML safe dumper when PyYAML was built with it, otherwise the
+    pure Python one, that can also represent ordered dicts
+    """
+
+
+_Dumper.add_representer(collections.OrderedDict, _Dumper.represent_dict)
+
+
+def _file_digest(path):
+    """
+    Return the sha256 hash of the file at path
+    """
+    digest = hashlib.sha256()
+    with salt.utils.files.fopen(path, "rb") as fp_:
+        for chunk in iter(lambda: fp_.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_UMASK_LOCK = threading.Lock()
+
+
+def _umask():
+    """
+    Return the umask of the process
+    """
+    try:
+        with salt.utils.files.fopen("/proc/self/status", "r") as fp_:
+            for line in fp_:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    # The umask can only be read by setting it
+    with _UMASK_LOCK:
+        umask = os.umask(0o077)
+        os.umask(umask)
+    return umask
+
+
+def _file_mode(path, exists):
+    """
+    Return the mode to write the file at path with, which is the mode of the
+    file that is replaced, like writing to it would keep, or the mode the
+    umask allows for a new file
+    """
+    return path.stat().st_mode & 0o7777 if exists else 0o666 & ~_umask()
+
+
+def _write_file(path, contents, mode=None):
+    path = pathlib.Path(path)
+    data = contents.encode() if isinstance(contents, str) else contents
+    exists = not _known_missing(path) and path.is_file()
+    if exists and _file_digest(path) == hashlib.sha256(data).hexdigest():
+        log.debug("%s is unchanged, not writing it", path)
+        return False
+    if mode is None:
+        mode = _file_mode(path, exists)
+
+    fd_, temp_file = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    os.close(fd_)
+    try:
+        with salt.utils.files.fopen(temp_file, "w" if isinstance(contents, str) else "wb") as fp_:
+            fp_.write(contents)
+        os.chmod(temp_file, mode)
+        os.replace(temp_file, path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.unlink(temp_file)
+        raise
+    _add_file(path)
+    count("bytes_written", len(data))
+    return True
+
+
+def write_file(path, contents, mode=None):
+    """
+    Write the contents to path unless the file there already has the same
+    contents. The contents are written to a temporary file next to path
+    first and then renamed over it, so a partly written file is never seen.
+    Without a ``mode`` the file keeps the mode of the file it replaces, and
+    a new file gets the mode the umask allows.
+
+    Returns True when the file was written and False when it was unchanged,
+    or when the current describe session captures the generated files. When
+    the session writes its files with a writer pool, the write is handed to
+    the pool and True is returned right away. When the session writes its
+    files to an output backend, such as an archive or a git repository,
+    they are written to the backend instead.
+    """
+    if get_capture() is not None:
+        log.debug("Not writing %s while the generated files are captured", path)
+        return False
+
+    output = get_output()
+    if output is not None and covers(output, path):
+        return add_file(output, path, contents, 0o644 if mode is None else mode)
+
+    writer = get_writer()
+    if writer is not None:
+        writer["pending"].acquire()
+        try:
+            writer["executor"].submit(
+                contextvars.copy_context().run,
+                _pool_write,
+                writer,
+                pathlib.Path(path),
+                contents,
+                mode,
+            )
+        except RuntimeError:
+            # The pool was shut down in the meantime
+            writer["pending"].release()
+            return _write_file(path, contents, mode)
+        return True
+    return _write_file(path, contents, mode)
+
+
+def open_temp_file(directory):
+    """
+    Open a temporary file in the directory to write the contents of a file
+    to as they arrive, which replace_file then moves into place, so a partly
+    written file is never seen. Returns the open binary file and its path.
+    While the describe session captures the generated files, the contents
+    are discarded and the path is None. When the directory is written to an
+    output backend, the file is spooled in the system's temporary directory.
+    """
+    if get_capture() is not None:
+        return salt.utils.files.fopen(os.devnull, "wb"), None
+
+    output = get_output()
+    if output is not None and covers(output, directory):
+        fd_, temp_file = tempfile.mkstemp(prefix="salt-describe-")
+    else:
+        directory = pathlib.Path(directory)
+        make_dirs(directory, lazy=False)
+        fd_, temp_file = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    return os.fdopen(fd_, "wb"), pathlib.Path(temp_file)
+
+
+def replace_file(temp_file, path, mode=None):
+    """
+    Move the temporary file written with open_temp_file to path, replacing
+    the file there. Without a ``mode`` the file gets its mode like with
+    write_file. When path is written to an output backend, the contents
+    are added to it instead and the temporary file is removed. Returns
+    False, without writing anything, when the contents were discarded or
+    the backend already has them.
+    """
+    if temp_file is None:
+        return False
+
+    path = pathlib.Path(path)
+    output = get_output()
+    if output is not None and covers(output, path):
+        try:
+            with salt.utils.files.fopen(temp_file, "rb") as fp_:
+                contents = fp_.read()
+        finally:
+            os.unlink(temp_file)
+        return add_file(output, path, contents, 0o644 if mode is None else mode)
+
+    _make_dirs(path.parent)
+    if mode is None:
+        mode = _file_mode(path, not _known_missing(path) and path.is_file())
+    try:
+        os.chmod(temp_file, mode)
+        os.replace(temp_file, path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.unlink(temp_file)
+        raise
+    _add_file(path)
+    return True
+
+
+def _fs_cache():
+    """
+    Return the filesystem cache of the current describe session, or None
+    without a session. It has the directories known to exist and the names
+    of the files in every directory that was listed.
+    """
+    session = get_session()
+    if session is None:
+        return None
+    with session["lock"]:
+        return session.setdefault("fs", {"lock": threading.Lock(), "dirs": set(), "files": {}})
+
+
+def _make_dirs(path):
+    cache = _fs_cache()
+    if cache is not None:
+        with cache["lock"]:
+            if path in cache["dirs"]:
+                return
+    path.mkdir(parents=True, exist_ok=True)
+    if cache is not None:
+        with cache["lock"]:
+            cache["dirs"].update((path, *path.parents))
+
+
+def make_dirs(path, lazy=True):
+    """
+    Create the directory and its parents. Within a describe session each
+    directory is only created once. With ``lazy`` and a writer pool, the
+    pool creates the directory before it writes to it instead, so only
+    leave out ``lazy`` for directories that are written to directly. With
+    ``lazy`` and an output backend the directory is written to, or while
+    the session captures the generated files, no directory is created at all.
+    """
+    if lazy:
+        if get_writer() is not None or get_capture() is not None:
+            return
+        output = get_output()
+        if output is not None and covers(output, path):
+            return
+    _make_dirs(pathlib.Path(path))
+
+
+def list_dir(path):
+    """
+    Return the names of the files in the directory, or an empty set when
+    it does not exist. Within a describe session the directory is only
+    listed once and the files written to it later are added to the names.
+    When the session writes its files to an output backend, the files
+    written to the directory in the backend are listed.
+    """
+    path = pathlib.Path(path)
+    output = get_output()
+    if output is not None and covers(output, path):
+        return list_output_dir(output, path)
+    cache = _fs_cache()
+    if cache is None:
+        return _list_dir(path)
+    with cache["lock"]:
+        if path not in cache["files"]:
+            cache["files"][path] = _list_dir(path)
+        return set(cache["files"][path])
+
+
+def _list_dir(path):
+    try:
+        return {file.name for file in path.iterdir()}
+    except FileNotFoundError:
+        return set()
+
+
+def _known_missing(path):
+    """
+    Return True when the file is known not to exist without checking it
+    """
+    cache = _fs_cache()
+    if cache is None:
+        return False
+    with cache["lock"]:
+        names = cache["files"].get(path.parent)
+        return names is not None and path.name not in names
+
+
+def _add_file(path):
+    cache = _fs_cache()
+    if cache is None:
+        return
+    with cache["lock"]:
+        if path.parent in cache["files"]:
+            cache["files"][path.parent].add(path.name)
+
+
+def start_writer(session, workers=4, max_pending=MAX_PENDING_WRITES):
+    """
+    Write the files of the describe session on a pool of ``workers``
+    background threads until flush_writer is called, so generating the
+    files does not wait for them to be written. Every directory is only
+    created once. At most ``max_pending`` writes wait for a writer, after
+    that write_file waits for one of them to finish.
+    """
+    session["writer"] = {
+        "executor": concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(workers), thread_name_prefix="describe-writer"
+        ),
+        "pending": threading.BoundedSemaphore(max_pending),
+        "lock": threading.Lock(),
+        "written": 0,
+        "unchanged": 0,
+        "bytes_written": 0,
+        "failed": {},
+    }
+    return session["writer"]
+
+
+def get_writer():
+    """
+    Return the writer pool of the current describe session or None
+    """
+    session = get_session()
+    if session is None:
+        return None
+    return session.get("writer")
+
+
+def _pool_write(writer, path, contents, mode):
+    """
+    Write a file on one of the writer pool's threads
+    """
+    try:
+        _make_dirs(path.parent)
+        # Counted here, as the profile of the describe function is on another thread
+        written, data = call_profiled(_write_file, path, contents, mode)
+    except Exception as exc:  # pylint: disable=broad-except
+        with writer["lock"]:
+            writer["failed"][str(path)] = str(exc)
+    else:
+        with writer["lock"]:
+            writer["written" if written else "unchanged"] += 1
+            writer["bytes_written"] += data["bytes_written"]
+    finally:
+        writer["pending"].release()
+
+
+def flush_writer(session):
+    """
+    Wait for the writer pool of the describe session to write all of the
+    files handed to it and shut it down. The files written after that are
+    written right away again.
+
+    Returns the number of files written and unchanged, the bytes written
+    and the error of every file that could not be written, or None without
+    a writer pool. The bytes written are added to the current profile.
+    """
+    writer = session.pop("writer", None)
+    if writer is None:
+        return None
+
+    writer["executor"].shutdown(wait=True)
+    count("bytes_written", writer["bytes_written"])
+    summary = {
+        "written": writer["written"],
+        "unchanged": writer["unchanged"],
+        "bytes_written": writer["bytes_written"],
+        "failed": writer["failed"],
+    }
+    if writer["failed"]:
+        log.error(
+            "%s of %s files could not be written",
+            len(writer["failed"]),
+            sum((writer["written"], writer["unchanged"], len(writer["failed"]))),
+        )
+        for path, error in sorted(writer["failed"].items()):
+            log.error("Unable to write %s: %s", path, error)
+    return summary
+
+
+def dump_yaml(data, **kwargs):
+    """
+    Serialize data to YAML with the LibYAML emitter when it is available.
+    Mapping keys are sorted, so the same data always gives the same output.
+    """
+    kwargs.setdefault("sort_keys", True)
+    with phase("serialize"):
+        return yaml.dump(data, Dumper=_Dumper, **kwargs)
+
+
+def load_yaml(stream):
+    """
+    Load YAML with the LibYAML parser when it is available
+    """
+    return yaml.load(stream, Loader=_SafeLoader)
@@ -0,0 +1,242 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import contextlib
+import functools
+import logging
+import threading
+import time
+
+import salt.utils.event  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+PHASES = ("collect", "parse", "serialize", "write")
+
+_LOCAL = threading.local()
+
+
+def _profiles():
+    """
+    Return the profiles started on this thread, the innermost one last
+    """
+    if not hasattr(_LOCAL, "profiles"):
+        _LOCAL.profiles = []
+    return _LOCAL.profiles
+
+
+def _current():
+    profiles = _profiles()
+    if profiles:
+        return profiles[-1]
+    return None
+
+
+def _stats():
+    stats = dict.fromkeys(PHASES, 0.0)
+    stats.update({"calls": 0, "bytes_written": 0})
+    return stats
+
+
+def start_profile(opts, name, profile=False):
+    """
+    Start recording where the time of the describe function ``name`` goes,
+    when ``profile`` is set. With ``profile=event`` the profile is also
+    fired on the master's event bus when it is finished.
+    """
+    if not profile:
+        return None
+    _profile = {
+        "opts": opts,
+        "name": name,
+        "event": profile == "event",
+        "start": time.perf_counter(),
+        "phase": None,
+        "minion": None,
+        "totals": _stats(),
+        "minions": {},
+    }
+    _profiles().append(_profile)
+    return _profile
+
+
+def _add(_profile, key, value, minion=None):
+    _profile["totals"][key] += value
+    minion = minion or _profile["minion"]
+    if minion is not None:
+        _profile["minions"].setdefault(minion, _stats())[key] += value
+
+
+def count(key, value=1):
+    """
+    Add value to the ``calls`` or ``bytes_written`` counter of the current
+    profile and the minion it is at
+    """
+    _profile = _current()
+    if _profile is not None:
+        _add(_profile, key, value)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Record the time spent in the block as time spent in the phase. A phase
+    entered while another one is being recorded is part of the outer one.
+    """
+    _profile = _current()
+    if _profile is None or _profile["phase"] is not None:
+        yield
+        return
+
+    _profile["phase"] = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _profile["phase"] = None
+        _add(_profile, name, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def profile_minion(minion):
+    """
+    Record the time spent in the block on the minion. The time not spent
+    in any other phase counts as parsing.
+    """
+    _profile = _current()
+    if _profile is None:
+        yield
+        return
+
+    stats = _profile["minions"].setdefault(minion, _stats())
+    recorded = sum(stats[_phase] for _phase in PHASES)
+    _profile["minion"] = minion
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _profile["minion"] = None
+        elapsed = time.perf_counter() - start
+        _add(
+            _profile,
+            "parse",
+            elapsed - (sum(stats[_phase] for _phase in PHASES) - recorded),
+            minion=minion,
+        )
+
+
+def profile_minions(returns):
+    """
+    Iterate over the minions of the returns, recording the time spent on
+    each minion. The time spent waiting for the next minion counts as
+    collection.
+    """
+    _profile = _current()
+    if _profile is None:
+        yield from returns
+        return
+
+    minions = iter(returns)
+    while True:
+        start = time.perf_counter()
+        try:
+            minion = next(minions)
+        except StopIteration:
+            break
+        _add(_profile, "collect", time.perf_counter() - start, minion=minion)
+
+        with profile_minion(minion):
+            yield minion
+
+
+def profiled(func):
+    """
+    Decorator that finishes the profile of the describe function when it
+    returns or raises without ret_info finishing it, so the profile does
+    not leak into the next describe function run on the thread
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            finish_profile(func.__name__)
+
+    return wrapper
+
+
+def is_profiling():
+    """
+    Return True when a profile is being recorded on this thread
+    """
+    return _current() is not None
+
+
+def call_profiled(func, *args, **kwargs):
+    """
+    Call func with a profile of its own, for the work a profiled describe
+    function hands to another thread. Returns the return of func and the
+    profile, which add_profile adds to the describe function's profile.
+    """
+    start_profile(None, "call", True)
+    try:
+        ret = func(*args, **kwargs)
+    finally:
+        data = finish_profile("call")
+    return ret, data
+
+
+def add_profile(data, minion=None):
+    """
+    Add the phase times and counters of the profile data to the current
+    profile, and to the minion's when it is given
+    """
+    _profile = _current()
+    if _profile is None or not data:
+        return
+    for key in (*PHASES, "calls", "bytes_written"):
+        if data.get(key):
+            _add(_profile, key, data[key], minion=minion)
+
+
+def _round(stats):
+    return {
+        key: round(value, 6) if isinstance(value, float) else value for key, value in stats.items()
+    }
+
+
+def _fire_profile(opts, name, data):
+    """
+    Fire the profile of the describe function on the master's event bus
+    """
+    try:
+        with salt.utils.event.get_master_event(opts, opts["sock_dir"], listen=False) as event:
+            event.fire_event(data, salt.utils.event.tagify([name, "profile"], "describe"))
+    except Exception as exc:  # pylint: disable=broad-except
+        log.warning(f"Unable to fire the profile of {name}: {exc}")
+
+
+def finish_profile(name):
+    """
+    Stop recording the profile of the describe function ``name``. Returns the
+    wall time of every phase and the counters, in total and by minion, or
+    None when the function is not being profiled.
+    """
+    profiles = _profiles()
+    for index in range(len(profiles) - 1, -1, -1):
+        if profiles[index]["name"] == name:
+            _profile = profiles.pop(index)
+            break
+    else:
+        return None
+
+    data = {
+        "total": round(time.perf_counter() - _profile["start"], 6),
+        **_round(_profile["totals"]),
+        "minions": {minion: _round(stats) for minion, stats in sorted(_profile["minions"].items())},
+    }
+    log.debug("Profile of %s: %s", name, data)
+    if _profile["event"]:
+        _fire_profile(_profile["opts"], name, data)
+    return data
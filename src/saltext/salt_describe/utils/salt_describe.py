@@ -1,13 +1,23 @@
 # Copyright 2023 VMware, Inc.
 # SPDX-License-Identifier: Apache-2.0
 #
+import hashlib
 import logging
 import pathlib
 
 import salt.config
 import salt.syspaths
 import salt.utils.files
-import yaml
+from saltext.salt_describe.utils.backends import covers
+from saltext.salt_describe.utils.backends import get_output
+from saltext.salt_describe.utils.output import dump_yaml
+from saltext.salt_describe.utils.output import list_dir
+from saltext.salt_describe.utils.output import make_dirs
+from saltext.salt_describe.utils.output import open_temp_file
+from saltext.salt_describe.utils.output import replace_file
+from saltext.salt_describe.utils.output import write_file
+from saltext.salt_describe.utils.session import defer
+from saltext.salt_describe.utils.session import get_capture
 
 log = logging.getLogger(__name__)
 
@@ -40,13 +50,155 @@ def get_minion_pillar_file_root(opts, minion, env="base"):
     return get_pillar_file_root(opts, env=env) / minion
 
 
-def generate_files(opts, minion, state, sls_name="default", env="base"):
+def get_shared_file_root(opts, env="base"):
     """
-    Generate an sls file for the minion with given state contents
+    Get the root for the files shared between minions
     """
+    return get_state_file_root(opts, env=env) / "describe_shared" / "files"
+
+
+def _shared_file(opts, digest, env="base"):
+    """
+    Return the path of the shared file with the given
+    sha256 hash and the salt:// source to use for it
+    """
+    shared_file = get_shared_file_root(opts, env=env) / digest[:2] / digest
+    return shared_file, f"salt://describe_shared/files/{digest[:2]}/{digest}"
+
+
+def generate_shared_file(opts, contents, env="base"):
+    """
+    Store the file contents once, named by their sha256 hash, in the shared
+    file root and return the salt:// source to use for them. When the file
+    root is written to an output backend, the contents are always written to
+    it, whether or not the file root on disk already has them.
+    """
+    if isinstance(contents, str):
+        contents = contents.encode()
+    shared_file, source = _shared_file(opts, hashlib.sha256(contents).hexdigest(), env=env)
+    output = get_output()
+    if (output is None or not covers(output, shared_file)) and shared_file.exists():
+        return source
+
+    try:
+        make_dirs(shared_file.parent)
+    except PermissionError:
+        log.warning(
+            f"Unable to create directory {str(shared_file.parent)}.  Check that the salt user has the correct permissions."
+        )
+        return False
+
+    write_file(shared_file, contents)
+    return source
+
+
+def open_shared_file(opts, env="base"):
+    """
+    Open a temporary file in the shared file root to write file contents
+    to before their hash is known. Returns the open binary file and its
+    path, which is then passed to store_shared_file with the hash, or
+    False when it cannot be created.
+    """
+    shared_file_root = get_shared_file_root(opts, env=env)
+    try:
+        return open_temp_file(shared_file_root)
+    except PermissionError:
+        log.warning(
+            f"Unable to create directory {str(shared_file_root)}.  Check that the salt user has the correct permissions."
+        )
+        return False
+
+
+def store_shared_file(opts, temp_file, digest, env="base"):
+    """
+    Move a file written with open_shared_file to its place in the shared
+    file root, or drop it when those contents are already stored, and
+    return the salt:// source to use for it
+    """
+    shared_file, source = _shared_file(opts, digest, env=env)
+    if temp_file is None:
+        return source
+    output = get_output()
+    if (output is None or not covers(output, shared_file)) and shared_file.exists():
+        temp_file.unlink()
+        return source
+
+    try:
+        replace_file(temp_file, shared_file)
+    except PermissionError:
+        log.warning(
+            f"Unable to create directory {str(shared_file.parent)}.  Check that the salt user has the correct permissions."
+        )
+        if temp_file.exists():
+            temp_file.unlink()
+        return False
+    return source
+
+
+def get_shared_state_file(opts, digest, env="base"):
+    """
+    Return the path of the shared SLS file with the given
+    sha256 hash and the name to include it with
+    """
+    shared_state_file = get_state_file_root(opts, env=env) / "describe_shared" / f"{digest}.sls"
+    return shared_state_file, f"describe_shared.{digest}"
+
+
+def get_baseline_state_file(opts, sls_name, group, env="base"):
+    """
+    Return the path of the baseline SLS file of the
+    group's sls_name states and the name to include it with
+    """
+    baseline_file = (
+        get_state_file_root(opts, env=env) / "describe_baseline" / sls_name / f"{group}.sls"
+    )
+    return baseline_file, f"describe_baseline.{sls_name}.{group}"
+
+
+def get_sls_file(opts, sls, env="base"):
+    """
+    Return the path of the SLS file with the given name in the state file root
+    """
+    return get_state_file_root(opts, env=env).joinpath(*sls.split(".")).with_suffix(".sls")
+
+
+def generate_shared_state(opts, state, env="base"):
+    """
+    Store the state once, named by its sha256 hash, under describe_shared
+    in the state file root and return the SLS name to include it with
+    """
+    shared_state_file, sls = get_shared_state_file(
+        opts, hashlib.sha256(state.encode()).hexdigest(), env=env
+    )
+    try:
+        make_dirs(shared_state_file.parent)
+    except PermissionError:
+        log.warning(
+            f"Unable to create directory {str(shared_state_file.parent)}.  Check that the salt user has the correct permissions."
+        )
+        return False
+
+    write_file(shared_state_file, state)
+    return sls
+
+
+def generate_files(opts, minion, state, sls_name="default", env="base", dedup=False):
+    """
+    Generate an sls file for the minion with given state contents.
+
+    With ``dedup`` the state is stored once for all of the minions it was
+    generated for, with generate_shared_state, and the minion's sls file
+    only includes it.
+    """
+    if dedup:
+        shared_sls = generate_shared_state(opts, state, env=env)
+        if not shared_sls:
+            return False
+        state = dump_yaml({"include": [shared_sls]})
+
     minion_state_root = get_minion_state_file_root(opts, minion, env=env)
     try:
-        minion_state_root.mkdir(parents=True, exist_ok=True)
+        make_dirs(minion_state_root)
     except PermissionError:
         log.warning(
             f"Unable to create directory {str(minion_state_root)}.  Check that the salt user has the correct permissions."
@@ -55,10 +207,10 @@ def generate_files(opts, minion, state, sls_name="default", env="base"):
 
     minion_state_file = minion_state_root / f"{sls_name}.sls"
 
-    with salt.utils.files.fopen(minion_state_file, "w") as fp_:
-        fp_.write(state)
-
-    generate_init(opts, minion, env=env)
+    if write_file(minion_state_file, state) or "init.sls" not in list_dir(minion_state_root):
+        # Inside a describe session the init.sls is written once, at the end
+        if not defer(("init", str(minion_state_root)), generate_init, opts, minion, env=env):
+            generate_init(opts, minion, env=env)
     return minion_state_file
 
 
@@ -68,7 +220,7 @@ def generate_init(opts, minion=None, env="base"):
     """
     minion_state_root = get_minion_state_file_root(opts, minion, env=env)
     try:
-        minion_state_root.mkdir(parents=True, exist_ok=True)
+        make_dirs(minion_state_root)
     except PermissionError:
         log.warning(
             f"Unable to create directory {str(minion_state_root)}.  Check that the salt user has the correct permissions."
@@ -78,15 +230,15 @@ def generate_init(opts, minion=None, env="base"):
     minion_init_file = minion_state_root / "init.sls"
 
     include_files = []
-    for file in minion_state_root.iterdir():
+    for name in list_dir(minion_state_root):
+        file = pathlib.Path(name)
         if file.suffix == ".sls" and file.stem != "init":
             _file = file.stem
             include_files.append(f"{minion}.{_file}")
 
-    state_contents = {"include": include_files}
+    state_contents = {"include": sorted(include_files)}
 
-    with salt.utils.files.fopen(minion_init_file, "w") as fp_:
-        fp_.write(yaml.dump(state_contents))
+    write_file(minion_init_file, dump_yaml(state_contents))
 
     return True
 
@@ -97,7 +249,7 @@ def generate_pillar_init(opts, minion=None, env="base"):
     """
     minion_pillar_root = get_minion_pillar_file_root(opts, minion, env=env)
     try:
-        minion_pillar_root.mkdir(parents=True, exist_ok=True)
+        make_dirs(minion_pillar_root)
     except PermissionError:
         log.warning(
             f"Unable to create directory {str(minion_pillar_root)}.  Check that the salt user has the correct permissions."
@@ -107,15 +259,15 @@ def generate_pillar_init(opts, minion=None, env="base"):
     minion_init_file = minion_pillar_root / "init.sls"
 
     include_files = []
-    for file in minion_pillar_root.iterdir():
+    for name in list_dir(minion_pillar_root):
+        file = pathlib.Path(name)
         if file.suffix == ".sls" and file.stem != "init":
             _file = file.stem
             include_files.append(f"{minion}.{_file}")
 
-    pillar_contents = {"include": include_files}
+    pillar_contents = {"include": sorted(include_files)}
 
-    with salt.utils.files.fopen(minion_init_file, "w") as fp_:
-        fp_.write(yaml.dump(pillar_contents))
+    write_file(minion_init_file, dump_yaml(pillar_contents))
 
     return True
 
@@ -124,9 +276,12 @@ def generate_pillars(opts, minion, pillar, sls_name="default", env="base"):
     """
     Generate pillar files for the minion to hold more sensitive information
     """
+    if get_capture() is not None:
+        return True
+
     minion_pillar_root = get_minion_pillar_file_root(opts, minion, env=env)
     try:
-        minion_pillar_root.mkdir(parents=True, exist_ok=True)
+        make_dirs(minion_pillar_root)
     except PermissionError:
         log.warning(
             f"Unable to create directory {str(minion_pillar_root)}.  Check that the salt user has the correct permissions."
@@ -135,8 +290,12 @@ def generate_pillars(opts, minion, pillar, sls_name="default", env="base"):
 
     minion_pillar_file = minion_pillar_root / f"{sls_name}.sls"
 
-    with salt.utils.files.fopen(minion_pillar_file, "w") as fp_:
-        fp_.write(pillar)
-
-    generate_pillar_init(opts, minion, env=env)
+    # The pillars hold sensitive data, like password hashes, only the master may read them
+    if write_file(minion_pillar_file, pillar, mode=0o600) or "init.sls" not in list_dir(
+        minion_pillar_root
+    ):
+        if not defer(
+            ("pillar_init", str(minion_pillar_root)), generate_pillar_init, opts, minion, env=env
+        ):
+            generate_pillar_init(opts, minion, env=env)
     return True
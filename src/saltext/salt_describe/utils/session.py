@@ -0,0 +1,88 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import contextlib
+import contextvars
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# Every context, like a salt-api thread running a runner, has its own session
+_SESSION = contextvars.ContextVar("describe_session", default=None)
+
+
+@contextlib.contextmanager
+def describe_session():
+    """
+    Open a describe session. Everything run inside of it, including the
+    describe functions started on other threads with a copy of its context,
+    shares the same session data. A session opened while another one is open
+    joins the outer session. Sessions opened on other threads are separate.
+    """
+    outer = get_session()
+    if outer is not None:
+        yield outer
+        return
+
+    session = {
+        "lock": threading.RLock(),
+        "returns": {},
+        "deferred": {},
+    }
+    token = _SESSION.set(session)
+    try:
+        yield session
+    finally:
+        # The deferred calls still share the session, like its filesystem cache
+        try:
+            _run_deferred(session)
+        finally:
+            _SESSION.reset(token)
+
+
+def _run_deferred(session):
+    """
+    Run the calls deferred to the end of the session, including
+    the ones deferred by the deferred calls
+    """
+    while session["deferred"]:
+        with session["lock"]:
+            deferred, session["deferred"] = session["deferred"], {}
+        for key, (func, args, kwargs) in deferred.items():
+            try:
+                func(*args, **kwargs)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Deferred call %s failed", key)
+
+
+def get_session():
+    """
+    Return the current describe session or None when there is not one
+    """
+    return _SESSION.get()
+
+
+def defer(key, func, *args, **kwargs):
+    """
+    Call func once when the current describe session ends, no matter how
+    many times it is deferred with the same key. Returns False, without
+    deferring anything, when there is no session.
+    """
+    session = get_session()
+    if session is None:
+        return False
+    with session["lock"]:
+        session["deferred"][key] = (func, args, kwargs)
+    return True
+
+
+def get_capture():
+    """
+    Return where the generated SLS files are captured instead of being
+    written when the current describe session captures them, otherwise None
+    """
+    session = get_session()
+    if session is None:
+        return None
+    return session.get("capture")
@@ -0,0 +1,22 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import logging
+
+log = logging.getLogger(__name__)
+
+# Rendered on the minion by slsutil.renderer, so the users, their shadow
+# records and whether their home directories exist come back in one job
+USER_INFO_TEMPLATE = """
+{%- set users = [] %}
+{%- for user in salt["user.getent"]() %}
+{%-   do users.append({
+        "user": user,
+        "shadow": salt["shadow.info"](user["name"]),
+        "homeexists": salt["file.directory_exists"](user["home"]),
+      }) %}
+{%- endfor %}
+{{ users | tojson }}
+"""
+
+USER_INFO_KWARG = {"string": USER_INFO_TEMPLATE, "default_renderer": "jinja|json"}
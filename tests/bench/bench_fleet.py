@@ -0,0 +1,270 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+"""
+Time the parsers, runners and file generation on the synthetic returns of
+fleets of 1, 100, 1000 and 10000 minions and report their peak memory.
+
+.. code-block:: bash
+
+    python tests/bench/bench_fleet.py
+    python tests/bench/bench_fleet.py --minions 100 1000 --only pkg service --output before.json
+    python tests/bench/bench_fleet.py --minions 100 1000 --only pkg service --compare before.json
+"""
+import argparse
+import json
+import pathlib
+import tempfile
+import time
+import tracemalloc
+
+import saltext.salt_describe.runners.salt_describe as describe_runner
+import saltext.salt_describe.runners.salt_describe_cron as cron_runner
+import saltext.salt_describe.runners.salt_describe_iptables as iptables_runner
+import saltext.salt_describe.utils.pkg as pkg_util
+import saltext.salt_describe.utils.service as service_util
+from saltext.salt_describe.utils.init import generate_files
+from saltext.salt_describe.utils.output import dump_yaml
+from saltext.salt_describe.utils.session import describe_session
+
+FLEET_SIZES = (1, 100, 1000, 10000)
+
+
+def minion_id(num):
+    return f"minion-{num:05d}"
+
+
+def fleet(returns, count):
+    """
+    The return of every minion of a fleet of count minions
+    """
+    return {minion_id(num): returns(num) for num in range(count)}
+
+
+def pkg_return(num, count=300):
+    """
+    The pkg.list_pkgs return of a minion with count packages
+    """
+    return {f"package-{pkg}": f"{pkg % 10}.{(pkg + num) % 7}.{pkg}-1.el9" for pkg in range(count)}
+
+
+def service_return(num, count=100):
+    """
+    The service.status, service.get_enabled and service.get_disabled
+    returns of a minion with count services
+    """
+    status = {f"service-{svc}.service": (svc + num) % 3 != 0 for svc in range(count)}
+    enabled = [service for index, service in enumerate(status) if index % 2 == 0]
+    disabled = [service for index, service in enumerate(status) if index % 5 == 1]
+    return status, enabled, disabled
+
+
+def iptables_return(num, count=40):
+    """
+    The iptables.get_rules return of a minion with count rules
+    """
+    rules = [
+        {
+            "source": [f"10.{num // 256 % 256}.{num % 256}.{rule}/32"],
+            "protocol": ["tcp"],
+            "dport": [str(1024 + rule)],
+            "jump": ["ACCEPT"],
+        }
+        for rule in range(count)
+    ]
+    return {
+        "filter": {
+            "INPUT": {"policy": "ACCEPT", "rules": rules},
+            "OUTPUT": {"policy": "ACCEPT", "rules": []},
+        }
+    }
+
+
+def cron_return(num, count=20):
+    """
+    The cron.ls return of a minion with count cron jobs
+    """
+    return {
+        "pre": ["# Lines below here are managed by Salt, do not edit"],
+        "crons": [
+            {
+                "minute": str((num + job) % 60),
+                "hour": "*",
+                "daymonth": "*",
+                "month": "*",
+                "dayweek": "*",
+                "identifier": f"job-{job}",
+                "cmd": f"/usr/local/bin/job-{job} --minion {num}",
+                "comment": None,
+                "commented": False,
+            }
+            for job in range(count)
+        ],
+        "special": [],
+        "env": [{"name": "MAILTO", "value": "root"}],
+    }
+
+
+def _opts(file_root):
+    return {"file_roots": {"base": [str(file_root)]}}
+
+
+def _run_runner(module, func, returns, file_root, **kwargs):
+    """
+    Run the describe runner on the returns, like describe.all does
+    """
+    module.__salt__ = {"salt.execute": lambda *args, **kwargs: returns}
+    module.__opts__ = _opts(file_root)
+    with describe_session():
+        return getattr(module, func)("*", **kwargs)
+
+
+def bench_pkg(config_system, count):
+    pkgs = fleet(pkg_return, count)
+    parser = getattr(pkg_util, f"_parse_{config_system}")
+    pkg_cmd = "dnf" if config_system == "ansible" else None
+
+    def run(file_root):
+        for minion, minion_pkgs in pkgs.items():
+            parser(minion, minion_pkgs, True, True, pkg_cmd, hosts="all")
+
+    return run
+
+
+def bench_service(config_system, count):
+    returns = fleet(service_return, count)
+    status = {minion: ret[0] for minion, ret in returns.items()}
+    enabled = {minion: ret[1] for minion, ret in returns.items()}
+    disabled = {minion: ret[2] for minion, ret in returns.items()}
+    parser = getattr(service_util, f"_parse_{config_system}")
+
+    def run(file_root):
+        for minion in status:
+            parser(minion, status, enabled, disabled, hosts="all")
+
+    return run
+
+
+def bench_iptables(count):
+    rules = fleet(iptables_return, count)
+
+    def run(file_root):
+        assert _run_runner(iptables_runner, "iptables", rules, file_root)
+
+    return run
+
+
+def bench_cron(count):
+    crons = fleet(cron_return, count)
+
+    def run(file_root):
+        assert _run_runner(cron_runner, "cron", crons, file_root)
+
+    return run
+
+
+def bench_generate_files(count):
+    states = {
+        minion: dump_yaml(pkg_util._parse_salt(minion, pkgs, True, True, None))
+        for minion, pkgs in fleet(pkg_return, count).items()
+    }
+
+    def run(file_root):
+        opts = _opts(file_root)
+        with describe_session():
+            for minion, state in states.items():
+                assert generate_files(opts, minion, state, sls_name="pkg")
+
+    return run
+
+
+def bench_top(count):
+    minions = [minion_id(num) for num in range(count)]
+
+    def run(file_root):
+        for minion in minions:
+            (file_root / minion).mkdir()
+            (file_root / minion / "pkg.sls").touch()
+        # The part of describe.top that runs after the minions are gathered
+        assert describe_runner._update_top(file_root, minions)
+
+    return run
+
+
+BENCHMARKS = {
+    "pkg._parse_salt": lambda count: bench_pkg("salt", count),
+    "pkg._parse_ansible": lambda count: bench_pkg("ansible", count),
+    "pkg._parse_chef": lambda count: bench_pkg("chef", count),
+    "service._parse_salt": lambda count: bench_service("salt", count),
+    "service._parse_ansible": lambda count: bench_service("ansible", count),
+    "service._parse_chef": lambda count: bench_service("chef", count),
+    "describe.iptables": bench_iptables,
+    "describe.cron": bench_cron,
+    "generate_files": bench_generate_files,
+    "describe.top": bench_top,
+}
+
+
+def measure(run, repeat):
+    """
+    Return the best wall time of repeat runs, each with an empty file root,
+    and the peak memory allocated by one more run
+    """
+    times = []
+    for _ in range(repeat + 1):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_root = pathlib.Path(tmp_dir)
+            if len(times) < repeat:
+                start = time.perf_counter()
+                run(file_root)
+                times.append(time.perf_counter() - start)
+            else:
+                tracemalloc.start()
+                try:
+                    run(file_root)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minions", type=int, nargs="+", default=FLEET_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only", nargs="+", help="only run the benchmarks whose name contains one of these"
+    )
+    parser.add_argument("--output", type=pathlib.Path, help="write the results to this JSON file")
+    parser.add_argument(
+        "--compare", type=pathlib.Path, help="compare with the results in this JSON file"
+    )
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+
+    results = {}
+    print(f"{'benchmark':<24}{'minions':>8}{'seconds':>10}{'ms/minion':>11}{'peak MiB':>10}")
+    for name, bench in BENCHMARKS.items():
+        if args.only and not any(only in name for only in args.only):
+            continue
+        for count in args.minions:
+            seconds, peak = measure(bench(count), args.repeat)
+            key = f"{name}[{count}]"
+            results[key] = {"seconds": seconds, "peak": peak}
+            line = (
+                f"{name:<24}{count:>8}{seconds:>10.3f}{seconds * 1000 / count:>11.3f}"
+                f"{peak / 2**20:>10.1f}"
+            )
+            if key in baseline:
+                line += f"  {baseline[key]['seconds'] / seconds:.2f}x"
+            print(line, flush=True)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+"""
+Compare the YAML serialization used by the runners with plain ``yaml.dump``
+on the states generated for a large pkg and iptables return.
+
+.. code-block:: bash
+
+    python tests/bench/bench_yaml.py
+"""
+import argparse
+import timeit
+
+import yaml
+from saltext.salt_describe.utils.output import dump_yaml
+from saltext.salt_describe.utils.pkg import _parse_salt as _parse_pkg
+
+
+def pkg_state(count=3000):
+    """
+    The describe.pkg state of a minion with count packages
+    """
+    pkgs = {f"package-{num}": f"{num % 10}.{num % 7}.{num}-1.el9" for num in range(count)}
+    return _parse_pkg("minion", pkgs, single_state=False, include_version=True, pkg_cmd=None)
+
+
+def iptables_state(count=5000):
+    """
+    The describe.iptables state of a minion with count rules
+    """
+    state_contents = {}
+    for num in range(count):
+        state_contents[f"add_iptables_rule_{num}"] = {
+            "iptables.append": [
+                {"chain": "INPUT"},
+                {"table": "filter"},
+                {"source": f"10.{num // 65536 % 256}.{num // 256 % 256}.{num % 256}/32"},
+                {"protocol": "tcp"},
+                {"dport": str(1024 + num % 60000)},
+                {"jump": "ACCEPT"},
+                {"comment": f"allow service {num}"},
+            ]
+        }
+    return state_contents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    payloads = {
+        "pkg (3000 packages)": pkg_state(),
+        "iptables (5000 rules)": iptables_state(),
+    }
+    print(f"LibYAML available: {yaml.__with_libyaml__}")
+    for name, data in payloads.items():
+        assert yaml.safe_load(dump_yaml(data)) == yaml.safe_load(yaml.dump(data))
+        plain = min(timeit.repeat(lambda: yaml.dump(data), number=1, repeat=args.repeat))
+        fast = min(timeit.repeat(lambda: dump_yaml(data), number=1, repeat=args.repeat))
+        print(f"{name}: yaml.dump {plain:.3f}s, dump_yaml {fast:.3f}s, {plain / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
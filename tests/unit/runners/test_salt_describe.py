@@ -2,8 +2,11 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 # pylint: disable=line-too-long
+import contextvars
 import inspect
 import logging
+import sqlite3
+import types
 from unittest.mock import create_autospec
 from unittest.mock import MagicMock
 from unittest.mock import patch
@@ -15,7 +18,14 @@ import saltext.salt_describe.runners.salt_describe_cron as salt_describe_cron_ru
 import saltext.salt_describe.runners.salt_describe_file as salt_describe_file_runner
 import saltext.salt_describe.runners.salt_describe_pip as salt_describe_pip_runner
 import saltext.salt_describe.runners.salt_describe_pkg as salt_describe_pkg_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
+from salt.loader.context import LoaderContext
+from saltext.salt_describe.utils.backends import close_output
+from saltext.salt_describe.utils.backends import open_output
+from saltext.salt_describe.utils.output import write_file
+from saltext.salt_describe.utils.salt_describe import generate_files
+from saltext.salt_describe.utils.session import describe_session
 
 log = logging.getLogger(__name__)
 
@@ -24,6 +34,9 @@ log = logging.getLogger(__name__)
 def configure_loader_modules():
     return {
         salt_describe_runner: {},
+        salt_describe_cron_runner: {"__opts__": {}},
+        salt_describe_file_runner: {"__opts__": {}, "__salt__": {}},
+        salt_describe_pkg_runner: {"__opts__": {}},
     }
 
 
@@ -99,6 +112,121 @@ def test_all(tmp_path):
                 pkg_mock.assert_not_called()
 
 
+def test_all_parallel(tmp_path):
+    """
+    test describe.all with parallel
+    """
+    cron_mock = create_autospec(salt_describe_cron_runner.cron)
+    pkg_mock = create_autospec(salt_describe_pkg_runner.pkg)
+
+    cron_mock.return_value = {"generate": [str(tmp_path / "cron.sls")]}
+    pkg_mock.return_value = {"generate": [str(tmp_path / "pkg.sls")]}
+
+    all_methods = {
+        "cron": cron_mock,
+        "pkg": pkg_mock,
+    }
+
+    inspect_retvals = [
+        inspect.signature(salt_describe_cron_runner.cron),
+        inspect.signature(salt_describe_pkg_runner.pkg),
+    ]
+
+    with patch.object(
+        salt_describe_runner, "_get_all_single_describe_methods", return_value=all_methods
+    ):
+        # __salt__ is a loader context variable like in a real runner, so the
+        # worker threads only see it when they run in the caller's context
+        loader_ctxvar = contextvars.ContextVar("loader_ctxvar")
+        loader = types.SimpleNamespace(
+            pack_self="__loader__",
+            pack={"__salt__": {"describe.cron": cron_mock, "describe.pkg": pkg_mock}},
+        )
+        token = loader_ctxvar.set(loader)
+        try:
+            with patch.object(
+                salt_describe_runner,
+                "__salt__",
+                LoaderContext(loader_ctxvar).named_context("__salt__"),
+                create=True,
+            ):
+                with patch.object(salt_describe_runner, "signature", side_effect=inspect_retvals):
+                    ret = salt_describe_runner.all_("minion", top=False, parallel=2)
+        finally:
+            loader_ctxvar.reset(token)
+        cron_mock.assert_called_with("minion", config_system="salt")
+        pkg_mock.assert_called_with("minion", config_system="salt")
+        assert ret["Generated SLS file locations"] == [
+            str(tmp_path / "cron.sls"),
+            str(tmp_path / "pkg.sls"),
+        ]
+        assert list(ret["Run times (seconds)"]) == ["cron", "pkg"]
+
+
+def test_all_collect(tmp_path):
+    """
+    test describe.all with collect
+    """
+    compound_ret = {
+        "minion": {
+            "cron.ls": {"crons": [], "env": [], "pre": [], "special": []},
+            "pkg.list_pkgs": {"pkg1": "0.1.2-3"},
+        }
+    }
+    execute_mock = MagicMock(return_value=compound_ret)
+
+    all_methods = {
+        "cron": salt_describe_cron_runner.cron,
+        "pkg": salt_describe_pkg_runner.pkg,
+    }
+
+    inspect_retvals = [
+        inspect.signature(salt_describe_cron_runner.cron),
+        inspect.signature(salt_describe_pkg_runner.pkg),
+    ]
+
+    with patch.object(
+        salt_describe_runner, "_get_all_single_describe_methods", return_value=all_methods
+    ):
+        dunder_salt_mock = {
+            "describe.cron": salt_describe_cron_runner.cron,
+            "describe.pkg": salt_describe_pkg_runner.pkg,
+            "salt.execute": execute_mock,
+        }
+
+        with patch.dict(salt_describe_runner.__salt__, dunder_salt_mock), patch.dict(
+            salt_describe_cron_runner.__salt__, {"salt.execute": execute_mock}
+        ), patch.dict(salt_describe_pkg_runner.__salt__, {"salt.execute": execute_mock}):
+            with patch.object(
+                salt_describe_runner, "signature", side_effect=inspect_retvals
+            ), patch.object(
+                aio_util, "generate_files", return_value=str(tmp_path / "cron.sls")
+            ) as cron_generate_mock, patch.object(
+                salt_describe_pkg_runner, "generate_files", return_value=str(tmp_path / "pkg.sls")
+            ) as pkg_generate_mock:
+                ret = salt_describe_runner.all_("minion", top=False, collect=True)
+                execute_mock.assert_called_once_with(
+                    "minion", ["cron.ls", "pkg.list_pkgs"], arg=[["root"], []], tgt_type="glob"
+                )
+                cron_generate_mock.assert_called_with(
+                    {}, "minion", yaml.dump({}), sls_name="cron", config_system="salt", dedup=False
+                )
+                pkg_generate_mock.assert_called_with(
+                    {},
+                    "minion",
+                    yaml.dump(
+                        {"installed_packages": {"pkg.installed": [{"pkgs": [{"pkg1": "0.1.2-3"}]}]}}
+                    ),
+                    sls_name="pkg",
+                    config_system="salt",
+                    dedup=False,
+                )
+                assert ret["Generated SLS file locations"] == [
+                    str(tmp_path / "cron.sls"),
+                    str(tmp_path / "pkg.sls"),
+                ]
+
+
 def test__get_all_single_describe_methods():
     dunder_salt_mock = {
         "describe.fake": MagicMock(__all_excluded__=True),
@@ -160,6 +288,69 @@ def test_top(tmp_path):
                         assert sls in top_contents[env][minion]
 
 
+@pytest.mark.parametrize("indent", [2, 4])
+def test_top_include(tmp_path, indent):
+    gather_minions_mock = MagicMock(return_value=["minion-1", "minion-2"])
+    local_mock = MagicMock(local=MagicMock(gather_minions=gather_minions_mock))
+    remote_funcs_mock = MagicMock(return_value=local_mock)
+
+    for minion in ("minion-1", "minion-2"):
+        (tmp_path / minion).mkdir()
+        (tmp_path / minion / "pkg.sls").touch()
+
+    top_file = tmp_path / "top.sls"
+    top_data = f"# managed by hand\nbase:\n{' ' * indent}minion-1:\n{' ' * indent}- minion-1\n"
+    top_file.write_text(top_data)
+
+    with patch("salt.daemons.masterapi.RemoteFuncs", remote_funcs_mock):
+        with patch.dict(
+            salt_describe_runner.__salt__, {"config.get": MagicMock(return_value=[tmp_path])}
+        ):
+            with patch.object(
+                salt_describe_runner, "load_yaml", wraps=salt_describe_runner.load_yaml
+            ) as load_mock:
+                assert "Generated SLS file locations" in salt_describe_runner.top_(
+                    "*", layout="include"
+                )
+            # The new minion is appended without rewriting the rest of the file,
+            # and the top file is only parsed once
+            load_mock.assert_called_once_with(top_data)
+            top_contents = top_file.read_text()
+            assert top_contents.startswith(top_data)
+            assert yaml.safe_load(top_contents) == {
+                "base": {"minion-1": ["minion-1"], "minion-2": ["minion-2"]}
+            }
+
+            assert "Top file was not changed" in str(
+                salt_describe_runner.top_("*", layout="include")
+            )
+            assert top_file.read_text() == top_contents
+
+
+def test_top_unchanged(tmp_path):
+    gather_minions_mock = MagicMock(return_value=["minion-1"])
+    local_mock = MagicMock(local=MagicMock(gather_minions=gather_minions_mock))
+    remote_funcs_mock = MagicMock(return_value=local_mock)
+
+    (tmp_path / "minion-1").mkdir()
+    (tmp_path / "minion-1" / "pkg.sls").touch()
+    (tmp_path / "minion-1" / "cron.sls").touch()
+    top_file = tmp_path / "top.sls"
+    top_file.write_text(yaml.dump({"base": {"minion-1": ["minion-1.pkg"]}}))
+
+    with patch("salt.daemons.masterapi.RemoteFuncs", remote_funcs_mock):
+        with patch.dict(
+            salt_describe_runner.__salt__, {"config.get": MagicMock(return_value=[tmp_path])}
+        ):
+            salt_describe_runner.top_("*")
+            assert yaml.safe_load(top_file.read_text()) == {
+                "base": {"minion-1": ["minion-1.pkg", "minion-1.cron"]}
+            }
+            with patch.object(salt_describe_runner, "write_file") as write_mock:
+                assert "Top file was not changed" in str(salt_describe_runner.top_("*"))
+                write_mock.assert_not_called()
+
+
 def test_pillar_top(tmp_path):
     gather_minions_mock = MagicMock(return_value=["minion-1", "minion-2"])
     local_mock = MagicMock(local=MagicMock(gather_minions=gather_minions_mock))
@@ -204,3 +395,394 @@ def test_pillar_top(tmp_path):
                     assert len(expected_contents[env][minion]) == len(top_contents[env][minion])
                     for sls in expected_contents[env][minion]:
                         assert sls in top_contents[env][minion]
+
+
+def test_baseline(tmp_path):
+    """
+    test describe.baseline
+    """
+    opts = {"file_roots": {"base": [str(tmp_path)]}}
+    minions = ["minion-1", "minion-2", "minion-3"]
+    gather_minions_mock = MagicMock(return_value=minions)
+    local_mock = MagicMock(local=MagicMock(gather_minions=gather_minions_mock))
+    grains = {
+        "minion-1": {"os": "Rocky"},
+        "minion-2": {"os": "Rocky"},
+        "minion-3": {"os": "Debian"},
+    }
+    states = {}
+    for num, minion in enumerate(minions):
+        states[minion] = {
+            "installed_packages": {
+                "pkg.installed": [{"pkgs": [{"bash": "5.1"}, {f"tool-{num}": "1.0"}]}]
+            }
+        }
+        (tmp_path / minion).mkdir()
+        (tmp_path / minion / "pkg.sls").write_text(yaml.dump(states[minion]))
+
+    with patch("salt.daemons.masterapi.RemoteFuncs", MagicMock(return_value=local_mock)):
+        with patch.object(
+            salt_describe_runner, "get_grains", MagicMock(return_value=grains)
+        ), patch.dict(salt_describe_runner.__opts__, opts):
+            for _ in range(2):
+                ret = salt_describe_runner.baseline("*", sls_name="pkg", group_by="os")
+                assert ret == {
+                    "Generated SLS file locations": [
+                        str(tmp_path / "describe_baseline" / "pkg" / "Rocky.sls"),
+                        str(tmp_path / "minion-1" / "pkg.sls"),
+                        str(tmp_path / "minion-2" / "pkg.sls"),
+                    ]
+                }
+                assert yaml.safe_load(
+                    (tmp_path / "describe_baseline" / "pkg" / "Rocky.sls").read_text()
+                ) == {
+                    "installed_packages_baseline": {"pkg.installed": [{"pkgs": [{"bash": "5.1"}]}]}
+                }
+                assert yaml.safe_load((tmp_path / "minion-1" / "pkg.sls").read_text()) == {
+                    "include": ["describe_baseline.pkg.Rocky"],
+                    "installed_packages": {"pkg.installed": [{"pkgs": [{"tool-0": "1.0"}]}]},
+                }
+                # The only Debian minion does not get a baseline
+                assert not (tmp_path / "describe_baseline" / "pkg" / "Debian.sls").exists()
+                assert (
+                    yaml.safe_load((tmp_path / "minion-3" / "pkg.sls").read_text())
+                    == states["minion-3"]
+                )
+
+            for minion in minions:
+                assert salt_describe_runner._load_generated_state(minion, "pkg") == states[minion]
+
+
+def test_baseline_similarity(tmp_path):
+    """
+    test describe.baseline with similarity
+    """
+    opts = {"file_roots": {"base": [str(tmp_path)]}}
+    packages = {
+        "minion-1": ["bash", "nginx", "openssl"],
+        "minion-2": ["bash", "postgresql", "openssl"],
+        "minion-3": ["bash", "nginx", "openssl", "curl"],
+        "minion-4": ["bash", "postgresql", "openssl", "pgbouncer"],
+    }
+    for minion, names in packages.items():
+        state = {
+            "installed_packages": {"pkg.installed": [{"pkgs": [{name: "1.0"} for name in names]}]}
+        }
+        (tmp_path / minion).mkdir()
+        (tmp_path / minion / "pkg.sls").write_text(yaml.dump(state))
+    gather_minions_mock = MagicMock(return_value=list(packages))
+    local_mock = MagicMock(local=MagicMock(gather_minions=gather_minions_mock))
+
+    with patch("salt.daemons.masterapi.RemoteFuncs", MagicMock(return_value=local_mock)):
+        with patch.dict(salt_describe_runner.__opts__, opts):
+            assert salt_describe_runner.baseline("*", similarity=1.5) is False
+            ret = salt_describe_runner.baseline("*", sls_name="pkg", similarity=0.7)
+
+    baseline_dir = tmp_path / "describe_baseline" / "pkg"
+    assert ret == {
+        "Generated SLS file locations": [
+            str(baseline_dir / "all_1.sls"),
+            str(tmp_path / "minion-1" / "pkg.sls"),
+            str(tmp_path / "minion-3" / "pkg.sls"),
+            str(baseline_dir / "all_2.sls"),
+            str(tmp_path / "minion-2" / "pkg.sls"),
+            str(tmp_path / "minion-4" / "pkg.sls"),
+        ]
+    }
+    # Without similarity only bash and openssl would be in the baseline
+    assert yaml.safe_load((baseline_dir / "all_2.sls").read_text()) == {
+        "installed_packages_baseline": {
+            "pkg.installed": [
+                {"pkgs": [{"bash": "1.0"}, {"postgresql": "1.0"}, {"openssl": "1.0"}]}
+            ]
+        }
+    }
+    assert yaml.safe_load((tmp_path / "minion-4" / "pkg.sls").read_text()) == {
+        "include": ["describe_baseline.pkg.all_2"],
+        "installed_packages": {"pkg.installed": [{"pkgs": [{"pgbouncer": "1.0"}]}]},
+    }
+
+
+@pytest.mark.parametrize("dedup", [False, True])
+def test_drift(tmp_path, dedup):
+    """
+    test describe.drift
+    """
+    opts = {"file_roots": {"base": [str(tmp_path)]}}
+    (tmp_path / "minion").mkdir()
+    pkg_sls = tmp_path / "minion" / "pkg.sls"
+    state = yaml.dump(
+        {
+            "install_vim": {"pkg.installed": [{"name": "vim", "version": "9.0"}]},
+            "install_nano": {"pkg.installed": [{"name": "nano", "version": "7.2"}]},
+            "install_git": {"pkg.installed": [{"name": "git", "version": "2.42"}]},
+        }
+    )
+    if dedup:
+        # The minion's SLS file includes the state shared with other minions
+        (tmp_path / "describe_shared").mkdir()
+        (tmp_path / "describe_shared" / "0123abcd.sls").write_text(state)
+        pkg_sls.write_text(yaml.dump({"include": ["describe_shared.0123abcd"]}))
+    else:
+        pkg_sls.write_text(state)
+    generated = pkg_sls.read_text()
+    execute_mock = MagicMock(return_value={"minion": {"vim": "9.1", "git": "2.42", "tmux": "3.3"}})
+
+    with patch.object(
+        salt_describe_runner,
+        "_get_all_single_describe_methods",
+        return_value={"pkg": salt_describe_pkg_runner.pkg},
+    ), patch.object(
+        salt_describe_runner,
+        "signature",
+        return_value=inspect.signature(salt_describe_pkg_runner.pkg),
+    ):
+        with patch.dict(
+            salt_describe_runner.__salt__,
+            {
+                "describe.all": salt_describe_runner.all_,
+                "describe.pkg": salt_describe_pkg_runner.pkg,
+            },
+        ), patch.dict(salt_describe_runner.__opts__, opts), patch.dict(
+            salt_describe_pkg_runner.__opts__, opts
+        ), patch.dict(
+            salt_describe_pkg_runner.__salt__, {"salt.execute": execute_mock}
+        ):
+            ret = salt_describe_runner.drift("minion", single_state=False)
+
+    assert ret == {
+        "minion": {
+            "pkg": {
+                "added": {"install_tmux": {"pkg.installed": [{"name": "tmux", "version": "3.3"}]}},
+                "removed": {
+                    "install_nano": {"pkg.installed": [{"name": "nano", "version": "7.2"}]}
+                },
+                "changed": {
+                    "install_vim": {
+                        "old": {"pkg.installed": [{"name": "vim", "version": "9.0"}]},
+                        "new": {"pkg.installed": [{"name": "vim", "version": "9.1"}]},
+                    }
+                },
+            }
+        }
+    }
+    # Nothing was written
+    assert pkg_sls.read_text() == generated
+    assert sorted(path.name for path in (tmp_path / "minion").iterdir()) == ["pkg.sls"]
+
+
+def test_all_writers(tmp_path):
+    """
+    test describe.all with writers
+    """
+
+    def _cron(tgt, config_system="salt", **kwargs):
+        write_file(tmp_path / "minion" / "cron.sls", "cron: {}\n")
+        write_file(tmp_path / "cron.sls" / "minion.sls", "cron: {}\n")
+        return {"generate": [str(tmp_path / "minion" / "cron.sls")]}
+
+    (tmp_path / "cron.sls").touch()
+    cron_mock = create_autospec(salt_describe_cron_runner.cron, side_effect=_cron)
+    with patch.object(
+        salt_describe_runner, "_get_all_single_describe_methods", return_value={"cron": cron_mock}
+    ), patch.dict(salt_describe_runner.__salt__, {"describe.cron": cron_mock}), patch.object(
+        salt_describe_runner,
+        "signature",
+        side_effect=[inspect.signature(salt_describe_cron_runner.cron)],
+    ):
+        ret = salt_describe_runner.all_("minion", top=False, writers=2)
+    assert ret["Generated SLS file locations"] == [str(tmp_path / "minion" / "cron.sls")]
+    assert (tmp_path / "minion" / "cron.sls").read_text() == "cron: {}\n"
+    assert list(ret["Write errors"]) == [str(tmp_path / "cron.sls" / "minion.sls")]
+
+
+@pytest.mark.parametrize(
+    "output,output_name",
+    [
+        ("archive", "fleet.tar.gz"),
+        ("git", "fleet.git"),
+        ("gitfs", "states.git"),
+        ("sqlite", "fleet.db"),
+    ],
+)
+def test_all_output_extract(tmp_path, output, output_name):
+    """
+    test describe.all with an output backend and describe.extract
+    """
+    file_root = tmp_path / "srv" / "salt"
+    opts = {"file_roots": {"base": [str(file_root)]}}
+
+    def _cron(tgt, config_system="salt", **kwargs):
+        sls_files = [
+            str(generate_files(opts, minion, "cron: {}\n", sls_name="cron"))
+            for minion in ("minion-1", "minion-2")
+        ]
+        return {"generate": sls_files}
+
+    cron_mock = create_autospec(salt_describe_cron_runner.cron, side_effect=_cron)
+    output_path = tmp_path / output_name
+    with patch.object(
+        salt_describe_runner, "_get_all_single_describe_methods", return_value={"cron": cron_mock}
+    ), patch.dict(
+        salt_describe_runner.__salt__,
+        {"describe.cron": cron_mock, "describe.top": MagicMock()},
+    ), patch.object(
+        salt_describe_runner,
+        "signature",
+        side_effect=[inspect.signature(salt_describe_cron_runner.cron)],
+    ), patch.dict(
+        salt_describe_runner.__opts__, opts
+    ):
+        if output == "archive":
+            ret = salt_describe_runner.all_("*", archive=str(output_path))
+        else:
+            ret = salt_describe_runner.all_("*", output=output, output_path=str(output_path))
+        salt_describe_runner.__salt__["describe.top"].assert_not_called()
+    assert ret["Output"]["backend"] == output
+    assert ret["Output"]["path"] == str(output_path)
+    assert ret["Output"]["files"] == 4
+    assert not file_root.exists()
+
+    dest = tmp_path / "snapshot"
+    with patch.dict(
+        salt_describe_runner.__salt__, {"config.get": MagicMock(return_value=[str(file_root)])}
+    ):
+        ret = salt_describe_runner.extract(str(output_path), dest=str(dest), output=output)
+    extracted_root = dest / file_root.relative_to(file_root.anchor)
+    assert len(ret["Generated SLS file locations"]) == 4
+    assert (extracted_root / "minion-2" / "cron.sls").read_text() == "cron: {}\n"
+    assert yaml.safe_load((extracted_root / "top.sls").read_text()) == {
+        "base": {"minion-1": ["minion-1.cron"], "minion-2": ["minion-2.cron"]}
+    }
+
+
+def test_extract_gitfs_branch(tmp_path):
+    """
+    test describe.extract with the branch describe.all committed to
+    """
+    file_root = tmp_path / "srv" / "salt"
+    opts = {"file_roots": {"base": [str(file_root)]}}
+    repo = tmp_path / "states.git"
+    with describe_session() as session:
+        open_output(session, "gitfs", repo, root=file_root, branch="describe")
+        generate_files(opts, "minion", "cron: {}\n", sls_name="cron")
+    close_output(session)
+
+    dest = tmp_path / "snapshot"
+    with patch.dict(
+        salt_describe_runner.__salt__, {"config.get": MagicMock(return_value=[str(file_root)])}
+    ):
+        assert salt_describe_runner.extract(str(repo), dest=str(dest), output="gitfs") is False
+        ret = salt_describe_runner.extract(
+            str(repo), dest=str(dest), output="gitfs", branch="describe"
+        )
+    extracted_root = dest / file_root.relative_to(file_root.anchor)
+    assert len(ret["Generated SLS file locations"]) == 2
+    assert (extracted_root / "minion" / "cron.sls").read_text() == "cron: {}\n"
+
+
+@pytest.mark.parametrize("name", ["../job", "{tmp_path}/job", "link/job"])
+def test_extract_outside_dest(tmp_path, caplog, name):
+    """
+    test describe.extract does not write files outside of dest
+    """
+    name = name.format(tmp_path=tmp_path)
+    dest = tmp_path / "snapshot"
+    dest.mkdir()
+    (dest / "link").symlink_to(tmp_path)
+    files = [
+        ("srv/salt/minion/cron.sls", {"mode": 0o644}, b"cron: {}\n"),
+        (name, {"mode": 0o644}, b"* * * * * root true\n"),
+    ]
+    with patch.object(salt_describe_runner, "read_output", return_value=iter(files)):
+        assert salt_describe_runner.extract("fleet.tar", dest=str(dest), top=False) is False
+    assert f"{name} is not below {dest}" in caplog.text
+    assert not (tmp_path / "job").exists()
+
+
+def _sources(state):
+    """
+    Return the salt:// sources the state references
+    """
+    if isinstance(state, dict):
+        return [source for value in state.values() for source in _sources(value)]
+    if isinstance(state, list):
+        return [source for value in state for source in _sources(value)]
+    if isinstance(state, str) and state.startswith("salt://"):
+        return [state]
+    return []
+
+
+def test_extract_dedup_sources(tmp_path):
+    """
+    test describe.extract writes the shared files the states of an archive
+    reference, when an earlier run already wrote them to the file root
+    """
+    file_root = tmp_path / "srv" / "salt"
+    path = "/etc/resolv.conf"
+    stats = {"user": "root", "group": "root", "mode": "0644"}
+    file_info = {
+        minion: {path: {"contents": "nameserver 127.0.0.1\n", "stats": stats}}
+        for minion in ("minion-1", "minion-2")
+    }
+    archive_path = tmp_path / "fleet.tar"
+    with patch.dict(
+        salt_describe_file_runner.__salt__, {"salt.execute": MagicMock(return_value=file_info)}
+    ), patch.dict(salt_describe_file_runner.__opts__, {"file_roots": {"base": [str(file_root)]}}):
+        # The earlier run wrote the shared file to the file root
+        assert salt_describe_file_runner.file("*", path, bulk=True, dedup=True)
+        with describe_session() as session:
+            open_output(session, "archive", archive_path)
+            assert salt_describe_file_runner.file("*", path, bulk=True, dedup=True)
+        close_output(session)
+
+    dest = tmp_path / "snapshot"
+    with patch.dict(
+        salt_describe_runner.__salt__, {"config.get": MagicMock(return_value=[str(file_root)])}
+    ):
+        ret = salt_describe_runner.extract(str(archive_path), dest=str(dest), top=False)
+    assert ret
+    extracted_root = dest / file_root.relative_to(file_root.anchor)
+    sources = [
+        source
+        for sls_file in extracted_root.rglob("*.sls")
+        for source in _sources(yaml.safe_load(sls_file.read_text()))
+    ]
+    assert sources
+    for source in sources:
+        assert (extracted_root / source[len("salt://") :]).is_file()
+
+
+def test_all_output_error(tmp_path):
+    """
+    test describe.all drops what a failed run wrote to the output backend
+    """
+    file_root = tmp_path / "srv" / "salt"
+    opts = {"file_roots": {"base": [str(file_root)]}}
+
+    def _cron(tgt, config_system="salt", **kwargs):
+        generate_files(opts, "minion", "cron: {}\n", sls_name="cron")
+        raise RuntimeError("The master went away")
+
+    cron_mock = create_autospec(salt_describe_cron_runner.cron, side_effect=_cron)
+    database = tmp_path / "fleet.db"
+    with patch.object(
+        salt_describe_runner, "_get_all_single_describe_methods", return_value={"cron": cron_mock}
+    ), patch.dict(salt_describe_runner.__salt__, {"describe.cron": cron_mock}), patch.object(
+        salt_describe_runner,
+        "signature",
+        side_effect=[inspect.signature(salt_describe_cron_runner.cron)],
+    ):
+        with patch.object(
+            salt_describe_runner, "abort_output", wraps=salt_describe_runner.abort_output
+        ) as abort_mock, pytest.raises(RuntimeError):
+            salt_describe_runner.all_("*", output="sqlite", output_path=str(database))
+    abort_mock.assert_called_once()
+    # The run was rolled back, and the database is not left locked
+    conn = sqlite3.connect(str(database), timeout=0)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM runs").fetchone() == (0,)
+        conn.execute("INSERT INTO runs (created) VALUES (0)")
+        conn.commit()
+    finally:
+        conn.close()
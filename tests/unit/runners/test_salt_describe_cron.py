@@ -10,6 +10,7 @@ from unittest.mock import patch
 
 import pytest
 import saltext.salt_describe.runners.salt_describe_cron as salt_describe_cron_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
 
 log = logging.getLogger(__name__)
@@ -182,10 +183,10 @@ def test_cron(tmp_path, cron_ret):
     with patch.dict(
         salt_describe_cron_runner.__salt__, {"salt.execute": MagicMock(return_value=cron_ret)}
     ):
-        with patch.object(salt_describe_cron_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_cron_runner.cron("minion", user)
             generate_mock.assert_called_with(
-                {}, "minion", cron_sls, sls_name="cron", config_system="salt"
+                {}, "minion", cron_sls, sls_name="cron", config_system="salt", dedup=False
             )
 
 
@@ -198,7 +199,7 @@ def test_cron_crontab_unavailable(tmp_path):
     with patch.dict(
         salt_describe_cron_runner.__salt__, {"salt.execute": MagicMock(return_value=cron_ret)}
     ):
-        with patch.object(salt_describe_cron_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert not salt_describe_cron_runner.cron("minion", user)
 
 
@@ -1,7 +1,9 @@
 # Copyright 2023 VMware, Inc.
 # SPDX-License-Identifier: Apache-2.0
 #
+import hashlib
 import logging
+import re
 import sys
 from pathlib import PosixPath
 from pathlib import WindowsPath
@@ -12,6 +14,12 @@ from unittest.mock import patch
 import pytest
 import saltext.salt_describe.runners.salt_describe_file as salt_describe_file_runner
 import yaml
+from saltext.salt_describe.utils.backends import close_output
+from saltext.salt_describe.utils.backends import open_output
+from saltext.salt_describe.utils.backends import read_output
+from saltext.salt_describe.utils.backends.index import member_name
+from saltext.salt_describe.utils.profile import is_profiling
+from saltext.salt_describe.utils.session import describe_session
 
 log = logging.getLogger(__name__)
 
@@ -65,12 +73,352 @@ def test_file(tmp_path):
                         "minion", str(testfile)
                     )
                     generate_mock.assert_called_with(
-                        {}, "minion", file_sls, sls_name="files", config_system="salt"
+                        {}, "minion", file_sls, sls_name="files", config_system="salt", dedup=False
                     )
                     get_minion_root_mock.assert_called_with({}, "minion", config_system="salt")
                     open_mock().write.assert_called_with("contents of testfile")
 
 
+def test_file_bulk(tmp_path):
+    nginx_conf = "/etc/nginx/nginx.conf"
+    site_conf = "/etc/nginx/sites-enabled/default"
+    file_sls_contents = {}
+    file_info = {"minion": {}}
+    for path in (nginx_conf, site_conf):
+        file_sls_contents[path] = {
+            "file.managed": [
+                {
+                    "source": f"salt://minion/files/{path}",
+                    "user": "root",
+                    "group": "root",
+                    "mode": "0644",
+                },
+            ],
+        }
+        file_info["minion"][path] = {
+            "contents": f"contents of {path}",
+            "stats": {"user": "root", "group": "root", "mode": "0644"},
+        }
+
+    file_sls = yaml.dump(file_sls_contents)
+    execute_mock = MagicMock(return_value=file_info)
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.object(salt_describe_file_runner, "generate_files") as generate_mock:
+            with patch.object(
+                salt_describe_file_runner,
+                "get_minion_state_file_root",
+                return_value=tmp_path / "file_roots" / "minion",
+            ):
+                assert "Generated SLS file locations" in salt_describe_file_runner.file(
+                    "minion", "/etc/nginx/**", bulk=True
+                )
+                execute_mock.assert_called_once()
+                assert execute_mock.call_args.args[1] == "slsutil.renderer"
+                assert execute_mock.call_args.kwargs["kwarg"]["specs"] == [
+                    {"path": "/etc/nginx", "find": {}}
+                ]
+                generate_mock.assert_called_with(
+                    {}, "minion", file_sls, sls_name="files", config_system="salt", dedup=False
+                )
+                for path in (nginx_conf, site_conf):
+                    written = tmp_path / "file_roots" / "minion" / "files" / path.lstrip("/")
+                    assert written.read_text() == f"contents of {path}"
+
+
+def test_file_dedup(tmp_path):
+    path = "/etc/resolv.conf"
+    contents = "nameserver 127.0.0.1\n"
+    digest = hashlib.sha256(contents.encode()).hexdigest()
+    stats = {"user": "root", "group": "root", "mode": "0644"}
+    file_sls = yaml.dump(
+        {
+            path: {
+                "file.managed": [
+                    {
+                        "source": f"salt://describe_shared/files/{digest[:2]}/{digest}",
+                        "user": "root",
+                        "group": "root",
+                        "mode": "0644",
+                    },
+                ],
+            },
+        }
+    )
+    file_info = {
+        "minion1": {path: {"contents": contents, "stats": stats}},
+        "minion2": {path: {"contents": contents, "stats": stats}},
+    }
+    execute_mock = MagicMock(return_value=file_info)
+    opts = {"file_roots": {"base": [tmp_path]}}
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.dict(salt_describe_file_runner.__opts__, opts):
+            with patch.object(salt_describe_file_runner, "generate_files") as generate_mock:
+                assert "Generated SLS file locations" in salt_describe_file_runner.file(
+                    "*", path, bulk=True, dedup=True
+                )
+                for minion in ("minion1", "minion2"):
+                    generate_mock.assert_any_call(
+                        opts, minion, file_sls, sls_name="files", config_system="salt", dedup=True
+                    )
+                    assert not (tmp_path / minion / "files").exists()
+    shared_files = [f for f in (tmp_path / "describe_shared").rglob("*") if f.is_file()]
+    assert len(shared_files) == 1
+    assert shared_files[0].read_text() == contents
+
+
+def test_file_dedup_permission_denied(tmp_path):
+    """
+    The SLS files of the unchanged minions are returned when the shared file cannot be stored
+    """
+    path = "/etc/resolv.conf"
+    stats = {"user": "root", "group": "root", "mode": "0644"}
+    file_info = {
+        minion: {path: {"contents": "nameserver 127.0.0.1\n", "stats": stats}}
+        for minion in ("minion1", "minion2")
+    }
+    sls_file = str(tmp_path / "minion1" / "files.sls")
+
+    def _unchanged(fingerprints, minion, *data):
+        return sls_file if minion == "minion1" else None
+
+    execute_mock = MagicMock(return_value=file_info)
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}), patch.dict(
+        salt_describe_file_runner.__opts__, {"cachedir": str(tmp_path)}
+    ):
+        with patch.object(
+            salt_describe_file_runner,
+            "unchanged",
+            side_effect=_unchanged,
+        ), patch.object(salt_describe_file_runner, "generate_shared_file", return_value=False):
+            with patch.object(salt_describe_file_runner, "generate_files") as generate_mock:
+                ret = salt_describe_file_runner.file(
+                    "*", path, bulk=True, dedup=True, incremental=True, profile=True
+                )
+                generate_mock.assert_not_called()
+    assert ret["Generated SLS file locations"] == [sls_file]
+    assert "Profile" in ret
+
+
+def test_file_incremental(tmp_path):
+    """
+    Reading a file, which changes its atime, does not change its fingerprint
+    """
+    path = "/etc/resolv.conf"
+    sls_file = tmp_path / "minion" / "files.sls"
+    sls_file.parent.mkdir()
+    sls_file.touch()
+    opts = {"cachedir": str(tmp_path / "cache"), "file_roots": {"base": [str(tmp_path)]}}
+    with patch.dict(salt_describe_file_runner.__opts__, opts):
+        with patch.object(
+            salt_describe_file_runner, "generate_files", return_value=str(sls_file)
+        ) as generate_mock:
+            for atime, mtime in ((1, 1), (2, 1), (3, 3)):
+                stats = {
+                    "user": "root",
+                    "group": "root",
+                    "mode": "0644",
+                    "size": 22,
+                    "atime": atime,
+                    "mtime": mtime,
+                }
+                file_info = {
+                    "minion": {path: {"contents": "nameserver 127.0.0.1\n", "stats": stats}}
+                }
+                execute_mock = MagicMock(return_value=file_info)
+                with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+                    assert salt_describe_file_runner.file(
+                        "minion", path, bulk=True, incremental=True
+                    ) == {"Generated SLS file locations": [str(sls_file)]}
+            # Only generated again when the file was changed
+            assert generate_mock.call_count == 2
+
+
+def _seek_read_mock(files, stats):
+    """
+    Return an execute mock that answers file.stats with stats
+    and file.seek_read from the contents in files
+    """
+
+    def _execute(tgt, fun, tgt_type="glob", arg=(), **kwargs):
+        if fun == "file.stats":
+            return stats
+        path, size, offset = arg
+        return {minion: files[minion][offset : offset + size] for minion in tgt}
+
+    return MagicMock(side_effect=_execute)
+
+
+def test_file_stream(tmp_path):
+    path = "/opt/app/app.bin"
+    files = {
+        "minion1": bytes(range(256)) * 3,
+        "minion2": b"\x00\xff" * 5,
+    }
+    stats = {
+        minion: {"user": "root", "group": "root", "mode": "0644", "size": len(contents)}
+        for minion, contents in files.items()
+    }
+    execute_mock = _seek_read_mock(files, stats)
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.object(salt_describe_file_runner, "generate_files") as generate_mock:
+            with patch.object(
+                salt_describe_file_runner,
+                "get_minion_state_file_root",
+                side_effect=lambda opts, minion, **kwargs: tmp_path / minion,
+            ):
+                assert "Generated SLS file locations" in salt_describe_file_runner.file(
+                    "*", path, stream=True, chunk_size=100, max_memory=100
+                )
+                assert generate_mock.call_count == 2
+
+    for minion, contents in files.items():
+        assert (tmp_path / minion / "files" / "opt" / "app" / "app.bin").read_bytes() == contents
+
+    seek_reads = [
+        call.args for call in execute_mock.call_args_list if call.args[1] == "file.seek_read"
+    ]
+    # max_memory only allows one minion's chunk at a time
+    assert all(len(tgt) == 1 for tgt, *_ in seek_reads)
+    assert len(seek_reads) == 8 + 1
+    assert "file.read" not in [call.args[1] for call in execute_mock.call_args_list]
+
+
+@pytest.mark.parametrize("dedup", [False, True])
+@pytest.mark.parametrize("name,target", [("archive", "fleet.tar"), ("sqlite", "fleet.db")])
+def test_file_stream_output(tmp_path, name, target, dedup):
+    """
+    The streamed files are written to the output backend like the generated states
+    """
+    path = "/opt/app/app.bin"
+    contents = bytes(range(256))
+    stats = {"minion": {"user": "root", "group": "root", "mode": "0644", "size": len(contents)}}
+    execute_mock = _seek_read_mock({"minion": contents}, stats)
+    file_root = tmp_path / "srv" / "salt"
+    target = tmp_path / target
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.dict(salt_describe_file_runner.__opts__, {"file_roots": {"base": [file_root]}}):
+            with describe_session() as session:
+                open_output(session, name, target)
+                assert "Generated SLS file locations" in salt_describe_file_runner.file(
+                    "minion", path, stream=True, dedup=dedup, chunk_size=100
+                )
+            close_output(session)
+    assert not file_root.exists()
+
+    files = {member: data for member, _, data in read_output(name, target)}
+    sources = [
+        source
+        for member, data in files.items()
+        if member.endswith(".sls")
+        for source in re.findall(r"salt://(\S+)", data.decode())
+    ]
+    assert len(sources) == 1
+    assert files[member_name(file_root / sources[0])] == contents
+
+
+def test_file_stream_read_error(tmp_path, caplog):
+    path = "/opt/app/app.bin"
+    stats = {"minion": {"user": "root", "group": "root", "mode": "0644", "size": 10}}
+    execute_mock = MagicMock(side_effect=[stats, {"minion": "ERROR: Permission denied"}])
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.object(salt_describe_file_runner, "generate_files") as generate_mock:
+            with patch.object(
+                salt_describe_file_runner,
+                "get_minion_state_file_root",
+                return_value=tmp_path / "minion",
+            ):
+                with caplog.at_level(logging.ERROR):
+                    salt_describe_file_runner.file("minion", path, stream=True)
+                    assert f"Could not read {path} on minion" in caplog.text
+                generate_mock.assert_not_called()
+    assert not (tmp_path / "minion" / "files" / "opt" / "app" / "app.bin").exists()
+
+
+def test_file_stream_interrupted(tmp_path):
+    """
+    A copy that is interrupted leaves the file it replaces as it was
+    """
+    path = "/opt/app/app.bin"
+    dest_file = tmp_path / "minion" / "files" / "opt" / "app" / "app.bin"
+    dest_file.parent.mkdir(parents=True)
+    dest_file.write_bytes(b"old contents")
+    stats = {"minion": {"user": "root", "group": "root", "mode": "0644", "size": 250}}
+    execute_mock = MagicMock(
+        side_effect=[stats, {"minion": b"\x00" * 100}, RuntimeError("The master went away")]
+    )
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.object(salt_describe_file_runner, "generate_files") as generate_mock:
+            with patch.object(
+                salt_describe_file_runner,
+                "get_minion_state_file_root",
+                return_value=tmp_path / "minion",
+            ):
+                with pytest.raises(RuntimeError):
+                    salt_describe_file_runner.file("minion", path, stream=True, chunk_size=100)
+            generate_mock.assert_not_called()
+    assert dest_file.read_bytes() == b"old contents"
+    # The temporary file is removed
+    assert list(dest_file.parent.iterdir()) == [dest_file]
+
+
+def test_file_stream_store_error(tmp_path):
+    path = "/opt/app/app.bin"
+    files = {"minion1": b"\x00" * 10, "minion2": b"\xff" * 250}
+    stats = {
+        minion: {"user": "root", "group": "root", "mode": "0644", "size": len(contents)}
+        for minion, contents in files.items()
+    }
+    execute_mock = _seek_read_mock(files, stats)
+    opts = {"file_roots": {"base": [tmp_path]}}
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.dict(salt_describe_file_runner.__opts__, opts):
+            with patch.object(salt_describe_file_runner, "generate_files") as generate_mock:
+                with patch.object(
+                    salt_describe_file_runner, "store_shared_file", return_value=False
+                ):
+                    assert (
+                        salt_describe_file_runner.file(
+                            "*", path, stream=True, dedup=True, chunk_size=100, profile=True
+                        )
+                        is False
+                    )
+                generate_mock.assert_not_called()
+    # The files of the group are closed and removed, and the profile is finished
+    assert not [f for f in (tmp_path / "describe_shared").rglob("*") if f.is_file()]
+    assert not is_profiling()
+
+
+@pytest.mark.parametrize("dedup", [False, True])
+def test_file_stream_capture(tmp_path, dedup):
+    """
+    Nothing is written, and no fingerprints are stored, while the generated files are captured
+    """
+    path = "/opt/app/app.bin"
+    files = {"minion": b"\x00\xff" * 5}
+    stats = {"minion": {"user": "root", "group": "root", "mode": "0644", "size": 10}}
+    execute_mock = _seek_read_mock(files, stats)
+    opts = {"file_roots": {"base": [str(tmp_path / "srv")]}, "cachedir": str(tmp_path / "cache")}
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.dict(salt_describe_file_runner.__opts__, opts):
+            with describe_session() as session:
+                session["capture"] = {}
+                assert "Generated SLS file locations" in salt_describe_file_runner.file(
+                    "minion", path, stream=True, dedup=dedup, incremental=True
+                )
+                captured = session.pop("capture")
+    assert [key[:2] for key in captured] == [("minion", "files")]
+    assert not list(tmp_path.iterdir())
+
+
+def test_file_bulk_no_match(caplog):
+    execute_mock = MagicMock(return_value={"minion": {}})
+    with patch.dict(salt_describe_file_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.object(salt_describe_file_runner, "generate_files") as generate_mock:
+            assert not salt_describe_file_runner.file("minion", "/etc/missing/*", bulk=True)
+            generate_mock.assert_not_called()
+            assert "None of the paths ['/etc/missing/*'] matched a file on minion" in caplog.text
+
+
 def test_file_permission_denied(tmp_path, minion_opts, caplog):
     if sys.platform.startswith("win32"):
         perm_denied_error_log = (
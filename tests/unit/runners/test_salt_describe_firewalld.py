@@ -9,6 +9,7 @@ from unittest.mock import patch
 
 import pytest
 import saltext.salt_describe.runners.salt_describe_firewalld as salt_describe_firewalld_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
 
 log = logging.getLogger(__name__)
@@ -62,12 +63,12 @@ def test_firewalld(firewalld_ret):
         salt_describe_firewalld_runner.__salt__,
         {"salt.execute": MagicMock(return_value=firewalld_ret)},
     ):
-        with patch.object(salt_describe_firewalld_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_firewalld_runner.firewalld(
                 "minion"
             )
             generate_mock.assert_called_with(
-                {}, "minion", firewalld_sls, sls_name="firewalld", config_system="salt"
+                {}, "minion", firewalld_sls, sls_name="firewalld", config_system="salt", dedup=False
             )
 
 
@@ -83,7 +84,7 @@ def test_firewalld_unavailable():
         salt_describe_firewalld_runner.__salt__,
         {"salt.execute": MagicMock(return_value=firewalld_ret)},
     ):
-        with patch.object(salt_describe_firewalld_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             ret = salt_describe_firewalld_runner.firewalld("minion")
 
 
@@ -9,6 +9,7 @@ from unittest.mock import patch
 
 import pytest
 import saltext.salt_describe.runners.salt_describe_host as salt_describe_host_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
 
 log = logging.getLogger(__name__)
@@ -59,10 +60,10 @@ def test_host():
     with patch.dict(
         salt_describe_host_runner.__salt__, {"salt.execute": MagicMock(return_value=host_list)}
     ):
-        with patch.object(salt_describe_host_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_host_runner.host("minion")
             generate_mock.assert_called_with(
-                {}, "minion", host_sls, sls_name="host", config_system="salt"
+                {}, "minion", host_sls, sls_name="host", config_system="salt", dedup=False
             )
 
 
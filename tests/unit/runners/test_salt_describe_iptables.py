@@ -9,6 +9,7 @@ from unittest.mock import patch
 
 import pytest
 import saltext.salt_describe.runners.salt_describe_iptables as salt_describe_iptables_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
 
 log = logging.getLogger(__name__)
@@ -92,12 +93,12 @@ def test_iptables(tmp_path):
         salt_describe_iptables_runner.__salt__,
         {"salt.execute": MagicMock(return_value=iptables_ret)},
     ):
-        with patch.object(salt_describe_iptables_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_iptables_runner.iptables(
                 "minion"
             )
             generate_mock.assert_called_with(
-                {}, "minion", iptables_sls, sls_name="iptables", config_system="salt"
+                {}, "minion", iptables_sls, sls_name="iptables", config_system="salt", dedup=False
             )
 
 
@@ -9,6 +9,7 @@ from unittest.mock import patch
 
 import pytest
 import saltext.salt_describe.runners.salt_describe_pip as salt_describe_pip_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
 
 log = logging.getLogger(__name__)
@@ -41,10 +42,10 @@ def test_pip():
     with patch.dict(
         salt_describe_pip_runner.__salt__, {"salt.execute": MagicMock(return_value=pip_list)}
     ):
-        with patch.object(salt_describe_pip_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_pip_runner.pip("minion")
             generate_mock.assert_called_with(
-                {}, "minion", expected_sls_write, sls_name="pip", config_system="salt"
+                {}, "minion", expected_sls_write, sls_name="pip", config_system="salt", dedup=False
             )
 
 
@@ -76,7 +77,7 @@ def test_pip_ansible():
     with patch.dict(
         salt_describe_pip_runner.__salt__, {"salt.execute": MagicMock(return_value=pip_list)}
     ):
-        with patch.object(salt_describe_pip_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in (
                 salt_describe_pip_runner.pip("minion", config_system="ansible", hosts=hosts)
             )
@@ -86,6 +87,7 @@ def test_pip_ansible():
                 expected_yml_write,
                 sls_name="pip",
                 config_system="ansible",
+                dedup=False,
             )
 
 
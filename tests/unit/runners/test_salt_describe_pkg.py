@@ -50,7 +50,7 @@ def test_pkg(minion_opts):
         with patch.object(salt_describe_pkg_runner, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_pkg_runner.pkg("minion")
             generate_mock.assert_called_with(
-                {}, "minion", pkg_sls, sls_name="pkg", config_system="salt"
+                {}, "minion", pkg_sls, sls_name="pkg", config_system="salt", dedup=False
             )
 
 
@@ -101,20 +101,20 @@ def test_pkg_ansible():
     ]
     pkg_yml = yaml.dump(pkg_yml_contents)
 
-    mock_minion_data = ({}, {"os_family": "RedHat"}, {})
+    mock_grains = {"minion": {"os_family": "RedHat"}}
 
     with patch.dict(
         salt_describe_pkg_runner.__salt__, {"salt.execute": MagicMock(return_value=pkg_list)}
     ):
-        with patch(
-            "salt.utils.minions.get_minion_data", MagicMock(return_value=mock_minion_data)
-        ) as minion_data_mock:
+        with patch.object(
+            salt_describe_pkg_runner, "get_grains", MagicMock(return_value=mock_grains)
+        ):
             with patch.object(salt_describe_pkg_runner, "generate_files") as generate_mock:
                 assert "Generated SLS file locations" in (
                     salt_describe_pkg_runner.pkg("minion", config_system="ansible", hosts=hosts)
                 )
                 generate_mock.assert_called_with(
-                    {}, "minion", pkg_yml, sls_name="pkg", config_system="ansible"
+                    {}, "minion", pkg_yml, sls_name="pkg", config_system="ansible", dedup=False
                 )
 
     hosts = "testgroup"
@@ -140,20 +140,20 @@ def test_pkg_ansible():
     ]
     pkg_yml = yaml.dump(pkg_yml_contents)
 
-    mock_minion_data = ({}, {"os_family": "Debian"}, {})
+    mock_grains = {"minion": {"os_family": "Debian"}}
 
     with patch.dict(
         salt_describe_pkg_runner.__salt__, {"salt.execute": MagicMock(return_value=pkg_list)}
     ):
-        with patch(
-            "salt.utils.minions.get_minion_data", MagicMock(return_value=mock_minion_data)
-        ) as minion_data_mock:
+        with patch.object(
+            salt_describe_pkg_runner, "get_grains", MagicMock(return_value=mock_grains)
+        ):
             with patch.object(salt_describe_pkg_runner, "generate_files") as generate_mock:
                 assert "Generated SLS file locations" in (
                     salt_describe_pkg_runner.pkg("minion", config_system="ansible", hosts=hosts)
                 )
                 generate_mock.assert_called_with(
-                    {}, "minion", pkg_yml, sls_name="pkg", config_system="ansible"
+                    {}, "minion", pkg_yml, sls_name="pkg", config_system="ansible", dedup=False
                 )
 
 
@@ -196,7 +196,7 @@ end
                 "minion", config_system="chef"
             )
             generate_mock.assert_called_with(
-                {}, "minion", pkg_rb_contents, sls_name="pkg", config_system="chef"
+                {}, "minion", pkg_rb_contents, sls_name="pkg", config_system="chef", dedup=False
             )
 
 
@@ -225,9 +225,10 @@ def test_pkg_ansible_permission_denied(minion_opts, caplog):
     with patch.dict(
         salt_describe_pkg_runner.__salt__, {"salt.execute": MagicMock(return_value=pkg_list)}
     ):
-        with patch.dict(salt_describe_pkg_runner.__opts__, minion_opts), patch(
-            "salt.utils.minions.get_minion_data",
-            MagicMock(return_value=(None, grains, None)),
+        with patch.dict(salt_describe_pkg_runner.__opts__, minion_opts), patch.object(
+            salt_describe_pkg_runner,
+            "get_grains",
+            MagicMock(return_value={"minion": grains}),
         ):
             with patch.object(PosixPath, "mkdir", side_effect=PermissionError), patch.object(
                 WindowsPath, "mkdir", side_effect=PermissionError
@@ -263,9 +264,10 @@ def test_pkg_chef_permission_denied(minion_opts, caplog):
     with patch.dict(
         salt_describe_pkg_runner.__salt__, {"salt.execute": MagicMock(return_value=pkg_list)}
     ):
-        with patch.dict(salt_describe_pkg_runner.__opts__, minion_opts), patch(
-            "salt.utils.minions.get_minion_data",
-            MagicMock(return_value=(None, grains, None)),
+        with patch.dict(salt_describe_pkg_runner.__opts__, minion_opts), patch.object(
+            salt_describe_pkg_runner,
+            "get_grains",
+            MagicMock(return_value={"minion": grains}),
         ):
             with patch.object(PosixPath, "mkdir", side_effect=PermissionError), patch.object(
                 WindowsPath, "mkdir", side_effect=PermissionError
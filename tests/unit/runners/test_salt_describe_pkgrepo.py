@@ -72,7 +72,7 @@ def test_pkgrepo_redhat():
         }
     }
 
-    mock_minion_data = ({}, {"os_family": "RedHat"}, {})
+    mock_grains = {"minion": {"os_family": "RedHat"}}
 
     redhat_sls_contents = {
         "appstream": {
@@ -126,16 +126,16 @@ def test_pkgrepo_redhat():
         salt_describe_pkgrepo_runner.__salt__,
         {"salt.execute": MagicMock(return_value=pkgrepo_list)},
     ):
-        with patch(
-            "salt.utils.minions.get_minion_data", MagicMock(return_value=mock_minion_data)
-        ) as minion_data_mock:
+        with patch.object(
+            salt_describe_pkgrepo_runner, "get_grains", MagicMock(return_value=mock_grains)
+        ) as grains_mock:
             with patch.object(salt_describe_pkgrepo_runner, "generate_files") as generate_mock:
                 assert "Generated SLS file locations" in salt_describe_pkgrepo_runner.pkgrepo(
                     "minion"
                 )
-                minion_data_mock.assert_called_with("minion", {})
+                grains_mock.assert_called_with({}, ["minion"], keys=["os_family"])
                 generate_mock.assert_called_with(
-                    {}, "minion", redhat_sls, sls_name="pkgrepo", config_system="salt"
+                    {}, "minion", redhat_sls, sls_name="pkgrepo", config_system="salt", dedup=False
                 )
 
 
@@ -347,7 +347,7 @@ def test_pkgrepo_debian():
         }
     }
 
-    mock_minion_data = ({}, {"os_family": "Debian"}, {})
+    mock_grains = {"minion": {"os_family": "Debian"}}
 
     debian_sls_contents = {
         "deb http://us.archive.ubuntu.com/ubuntu jammy main restricted": {
@@ -538,16 +538,16 @@ def test_pkgrepo_debian():
         salt_describe_pkgrepo_runner.__salt__,
         {"salt.execute": MagicMock(return_value=pkgrepo_list)},
     ):
-        with patch(
-            "salt.utils.minions.get_minion_data", MagicMock(return_value=mock_minion_data)
-        ) as minion_data_mock:
+        with patch.object(
+            salt_describe_pkgrepo_runner, "get_grains", MagicMock(return_value=mock_grains)
+        ) as grains_mock:
             with patch.object(salt_describe_pkgrepo_runner, "generate_files") as generate_mock:
                 assert "Generated SLS file locations" in salt_describe_pkgrepo_runner.pkgrepo(
                     "minion"
                 )
-                minion_data_mock.assert_called_with("minion", {})
+                grains_mock.assert_called_with({}, ["minion"], keys=["os_family"])
                 generate_mock.assert_called_with(
-                    {}, "minion", debian_sls, sls_name="pkgrepo", config_system="salt"
+                    {}, "minion", debian_sls, sls_name="pkgrepo", config_system="salt", dedup=False
                 )
 
 
@@ -599,15 +599,15 @@ def test_pkgrepo_permission_denied(minion_opts, caplog, perm_denied_error_log):
         }
     }
 
-    mock_minion_data = ({}, {"os_family": "RedHat"}, {})
+    mock_grains = {"minion": {"os_family": "RedHat"}}
 
     with patch.dict(
         salt_describe_pkgrepo_runner.__salt__,
         {"salt.execute": MagicMock(return_value=pkgrepo_list)},
     ):
-        with patch(
-            "salt.utils.minions.get_minion_data", MagicMock(return_value=mock_minion_data)
-        ) as minion_data_mock:
+        with patch.object(
+            salt_describe_pkgrepo_runner, "get_grains", MagicMock(return_value=mock_grains)
+        ) as grains_mock:
             with patch.dict(salt_describe_pkgrepo_runner.__opts__, minion_opts):
                 with patch.object(PosixPath, "mkdir", side_effect=PermissionError), patch.object(
                     WindowsPath, "mkdir", side_effect=PermissionError
@@ -0,0 +1,59 @@
+# Copyright 2024 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import logging
+from unittest.mock import call
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+import saltext.salt_describe.runners.salt_describe_ssh_known_hosts as salt_describe_ssh_known_hosts_runner
+import saltext.salt_describe.utils.aio as aio_util
+import yaml
+
+log = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def configure_loader_modules():
+    return {
+        salt_describe_ssh_known_hosts_runner: {
+            "__salt__": {"salt.execute": MagicMock()},
+            "__opts__": {},
+        },
+    }
+
+
+def test_ssh_known_hosts():
+    """
+    test describe.ssh_known_hosts, every minion's state only has its own keys
+    """
+    auth_keys = {
+        "minion-1": {"user": {"AAA": {"enc": "ssh-rsa", "options": []}}},
+        "minion-2": {"root": {"AAAAC": {"enc": "ssh-ed25519", "options": []}}},
+    }
+    expected = {
+        "minion-1": {"AAA": {"ssh_auth.present": [{"user": "user"}, {"enc": "ssh-rsa"}]}},
+        "minion-2": {"AAAAC": {"ssh_auth.present": [{"user": "root"}, {"enc": "ssh-ed25519"}]}},
+    }
+
+    with patch.dict(
+        salt_describe_ssh_known_hosts_runner.__salt__,
+        {"salt.execute": MagicMock(return_value=auth_keys)},
+    ):
+        with patch.object(aio_util, "generate_files") as generate_mock:
+            assert (
+                "Generated SLS file locations"
+                in salt_describe_ssh_known_hosts_runner.ssh_known_hosts("*")
+            )
+            assert generate_mock.call_args_list == [
+                call(
+                    {},
+                    minion,
+                    yaml.dump(state),
+                    sls_name="ssh_known_hosts",
+                    config_system="salt",
+                    dedup=False,
+                )
+                for minion, state in expected.items()
+            ]
@@ -11,6 +11,7 @@ from unittest.mock import patch
 
 import pytest
 import saltext.salt_describe.runners.salt_describe_sysctl as salt_describe_sysctl_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
 
 log = logging.getLogger(__name__)
@@ -42,12 +43,12 @@ def test_sysctl():
     with patch.dict(
         salt_describe_sysctl_runner.__salt__, {"salt.execute": MagicMock(return_value=sysctl_show)}
     ):
-        with patch.object(salt_describe_sysctl_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_sysctl_runner.sysctl(
                 "minion", ["vm.swappiness"]
             )
             generate_mock.assert_called_with(
-                {}, "minion", sysctl_sls, sls_name="sysctl", config_system="salt"
+                {}, "minion", sysctl_sls, sls_name="sysctl", config_system="salt", dedup=False
             )
 
 
@@ -9,6 +9,7 @@ from unittest.mock import patch
 
 import pytest
 import saltext.salt_describe.runners.salt_describe_timezone as salt_describe_timezone_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
 
 log = logging.getLogger(__name__)
@@ -37,12 +38,12 @@ def test_timezone():
         salt_describe_timezone_runner.__salt__,
         {"salt.execute": MagicMock(return_value=timezone_list)},
     ):
-        with patch.object(salt_describe_timezone_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_timezone_runner.timezone(
                 "minion"
             )
             generate_mock.assert_called_with(
-                {}, "minion", timezone_sls, sls_name="timezone", config_system="salt"
+                {}, "minion", timezone_sls, sls_name="timezone", config_system="salt", dedup=False
             )
 
 
@@ -67,3 +68,75 @@ def test_timezone_permission_denied(minion_opts, caplog, perm_denied_error_log):
                     ret = salt_describe_timezone_runner.timezone("minion")
                     assert not ret
                     assert perm_denied_error_log in caplog.text
+
+
+def test_timezone_incremental(tmp_path):
+    """
+    test describe.timezone only regenerates the changed minions
+    """
+    opts = {"cachedir": str(tmp_path / "cache"), "file_roots": {"base": [str(tmp_path)]}}
+    execute_mock = MagicMock(
+        side_effect=[
+            {"minion-1": "America/Los_Angeles", "minion-2": "UTC"},
+            {"minion-1": "America/Los_Angeles", "minion-2": "Europe/Berlin"},
+        ]
+    )
+    with patch.dict(salt_describe_timezone_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.dict(salt_describe_timezone_runner.__opts__, opts):
+            first = salt_describe_timezone_runner.timezone("*", incremental=True)
+            with patch.object(
+                aio_util,
+                "generate_files",
+                wraps=aio_util.generate_files,
+            ) as generate_mock:
+                second = salt_describe_timezone_runner.timezone("*", incremental=True)
+                generate_mock.assert_called_once()
+                assert generate_mock.call_args.args[1] == "minion-2"
+
+    assert first == second
+    assert yaml.safe_load((tmp_path / "minion-2" / "timezone.sls").read_text()) == {
+        "Europe/Berlin": {"timezone.system": []}
+    }
+
+
+def test_timezone_stream_returns():
+    """
+    test describe.timezone with stream_returns
+    """
+    with patch.object(
+        aio_util,
+        "execute",
+        MagicMock(return_value={"minion": "America/Los_Angeles"}),
+    ) as execute_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
+            assert "Generated SLS file locations" in salt_describe_timezone_runner.timezone(
+                "minion", stream_returns=True
+            )
+            generate_mock.assert_called_once()
+    execute_mock.assert_called_once_with(
+        salt_describe_timezone_runner.__salt__,
+        "minion",
+        "timezone.get_zone",
+        tgt_type="glob",
+        stream_returns=True,
+        opts={},
+        batch=None,
+        timeout=None,
+        gather_job_timeout=None,
+    )
+
+
+def test_timezone_profile(tmp_path):
+    """
+    test describe.timezone adds a profile to its output
+    """
+    opts = {"file_roots": {"base": [str(tmp_path)]}}
+    with patch.dict(
+        salt_describe_timezone_runner.__salt__,
+        {"salt.execute": MagicMock(return_value={"minion": "America/Los_Angeles"})},
+    ), patch.dict(salt_describe_timezone_runner.__opts__, opts):
+        ret = salt_describe_timezone_runner.timezone("minion", profile=True)
+    assert "Generated SLS file locations" in ret
+    assert ret["Profile"]["calls"] == 1
+    assert ret["Profile"]["bytes_written"] > 0
+    assert list(ret["Profile"]["minions"]) == ["minion"]
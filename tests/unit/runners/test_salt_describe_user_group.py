@@ -10,7 +10,9 @@ from unittest.mock import patch
 
 import pytest
 import saltext.salt_describe.runners.salt_describe_user as salt_describe_user_runner
+import saltext.salt_describe.utils.aio as aio_util
 import yaml
+from saltext.salt_describe.utils.profile import is_profiling
 
 log = logging.getLogger(__name__)
 
@@ -25,6 +27,24 @@ def configure_loader_modules():
     }
 
 
+def _user_info(user_getent, user_shadows, fileexists):
+    """
+    Build the return of the user info template from the
+    user.getent, shadow.info and file.directory_exists returns
+    """
+    return {
+        minion: [
+            {
+                "user": user,
+                "shadow": user_shadow[minion],
+                "homeexists": fileexists[minion],
+            }
+            for user, user_shadow in zip(users, user_shadows)
+        ]
+        for minion, users in user_getent.items()
+    }
+
+
 def test_group():
     group_getent = {
         "minion": [
@@ -53,10 +73,10 @@ def test_group():
     with patch.dict(
         salt_describe_user_runner.__salt__, {"salt.execute": MagicMock(return_value=group_getent)}
     ):
-        with patch.object(salt_describe_user_runner, "generate_files") as generate_mock:
+        with patch.object(aio_util, "generate_files") as generate_mock:
             assert "Generated SLS file locations" in salt_describe_user_runner.group("minion")
             generate_mock.assert_called_with(
-                {}, "minion", group_sls, sls_name="groups", config_system="salt"
+                {}, "minion", group_sls, sls_name="groups", config_system="salt", dedup=False
             )
 
 
@@ -128,7 +148,11 @@ def test_user():
 
     with patch.dict(
         salt_describe_user_runner.__salt__,
-        {"salt.execute": MagicMock(side_effect=[user_getent, user_shadow, fileexists])},
+        {
+            "salt.execute": MagicMock(
+                return_value=_user_info(user_getent, [user_shadow], fileexists)
+            )
+        },
     ):
         with patch.object(salt_describe_user_runner, "generate_files") as generate_files_mock:
             with patch.object(
@@ -143,6 +167,64 @@ def test_user():
                 )
 
 
+def test_user_multiple_minions():
+    """
+    Test describe.user gathers every minion's users in a single job
+    and generates a separate state and pillar for each minion
+    """
+    users = {}
+    for minion in ("minion1", "minion2"):
+        users[minion] = [
+            {
+                "user": {
+                    "name": f"{minion}-user",
+                    "uid": 1000,
+                    "gid": 1000,
+                    "groups": [],
+                    "home": f"/home/{minion}-user",
+                    "passwd": "x",
+                    "shell": "/bin/bash",
+                    "fullname": "",
+                    "homephone": "",
+                    "other": "",
+                    "roomnumber": "",
+                    "workphone": "",
+                },
+                "shadow": {
+                    "expire": -1,
+                    "inact": -1,
+                    "lstchg": 19103,
+                    "max": 99999,
+                    "min": 0,
+                    "name": f"{minion}-user",
+                    "passwd": f"{minion}-passwd",
+                    "warn": 7,
+                },
+                "homeexists": minion == "minion1",
+            }
+        ]
+
+    execute_mock = MagicMock(return_value=users)
+    with patch.dict(salt_describe_user_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.object(salt_describe_user_runner, "generate_files") as generate_files_mock:
+            with patch.object(
+                salt_describe_user_runner, "generate_pillars"
+            ) as generate_pillars_mock:
+                assert "Generated SLS file locations" in salt_describe_user_runner.user("minion*")
+                execute_mock.assert_called_once()
+                assert generate_files_mock.call_count == 2
+                for call, minion in zip(generate_files_mock.call_args_list, users):
+                    state = yaml.safe_load(call.args[2])
+                    assert list(state) == [f"user-{minion}-user"]
+                    assert {"createhome": minion == "minion1"} in state[f"user-{minion}-user"][
+                        "user.present"
+                    ]
+                for call, minion in zip(generate_pillars_mock.call_args_list, users):
+                    assert yaml.safe_load(call.args[2]) == {
+                        "users": {f"{minion}-user": f"{minion}-passwd"}
+                    }
+
+
 def test_user_minimum_maximum_uid():
     user_getent = {
         "minion": [
@@ -265,15 +347,9 @@ def test_user_minimum_maximum_uid():
         salt_describe_user_runner.__salt__,
         {
             "salt.execute": MagicMock(
-                side_effect=[
-                    user_getent,
-                    user_shadow,
-                    fileexists,
-                    user_shadow2,
-                    fileexists,
-                    user_shadow3,
-                    fileexists,
-                ]
+                return_value=_user_info(
+                    user_getent, [user_shadow, user_shadow2, user_shadow3], fileexists
+                )
             )
         },
     ):
@@ -292,6 +368,18 @@ def test_user_minimum_maximum_uid():
                 )
 
 
+def test_group_error():
+    """
+    test describe.group when group.getent fails, which finishes the profile
+    """
+    execute_mock = MagicMock(return_value={"minion": "ERROR: group.getent is not available"})
+    with patch.dict(salt_describe_user_runner.__salt__, {"salt.execute": execute_mock}):
+        with patch.object(aio_util, "generate_files") as generate_mock:
+            assert salt_describe_user_runner.group("minion", profile=True) is False
+            generate_mock.assert_not_called()
+    assert not is_profiling()
+
+
 def test_group_permission_denied(minion_opts, caplog, perm_denied_error_log):
     group_getent = {
         "minion": [
@@ -354,7 +442,11 @@ def test_user_permission_denied(minion_opts, caplog, perm_denied_error_log):
 
     with patch.dict(
         salt_describe_user_runner.__salt__,
-        {"salt.execute": MagicMock(side_effect=[user_getent, user_shadow, fileexists])},
+        {
+            "salt.execute": MagicMock(
+                return_value=_user_info(user_getent, [user_shadow], fileexists)
+            )
+        },
     ):
         with patch.dict(salt_describe_user_runner.__opts__, minion_opts):
             with patch.object(PosixPath, "mkdir", side_effect=PermissionError), patch.object(
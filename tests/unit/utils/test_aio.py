@@ -0,0 +1,169 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import asyncio
+import contextvars
+import time
+import types
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import saltext.salt_describe.utils.aio as aio_util
+import yaml
+from salt.loader.context import LoaderContext
+from saltext.salt_describe.utils.init import StreamedReturns
+
+
+def _parse(minion, zone):
+    if not zone:
+        return None
+    return yaml.dump({zone: {"timezone.system": []}})
+
+
+def _generate_files(opts, minion, state, **kwargs):
+    # The first minion takes the longest to write
+    time.sleep(0.05 if minion == "minion-1" else 0)
+    return f"/srv/salt/{minion}/timezone.sls"
+
+
+def test_describe_minions():
+    execute_mock = MagicMock(
+        return_value={"minion-1": "UTC", "minion-2": "", "minion-3": "Europe/Berlin"}
+    )
+    with patch.object(aio_util, "generate_files", side_effect=_generate_files) as generate_mock:
+        sls_files = aio_util.run(
+            aio_util.describe_minions(
+                {},
+                {"salt.execute": execute_mock},
+                "timezone",
+                "*",
+                "timezone.get_zone",
+                _parse,
+                "timezone",
+            )
+        )
+    # Returned in the order of the minions, not the order the files were written in
+    assert sls_files == ["/srv/salt/minion-1/timezone.sls", "/srv/salt/minion-3/timezone.sls"]
+    execute_mock.assert_called_once_with("*", "timezone.get_zone", tgt_type="glob")
+    generate_mock.assert_any_call(
+        {},
+        "minion-3",
+        "Europe/Berlin:\n  timezone.system: []\n",
+        sls_name="timezone",
+        config_system="salt",
+        dedup=False,
+    )
+    assert generate_mock.call_count == 2
+
+
+def test_describe_minions_stream_returns():
+    returns = StreamedReturns(
+        iter(
+            [
+                ("minion-1", "UTC"),
+                ("minion-2", "'timezone.get_zone' is not available."),
+                ("minion-3", "Europe/Berlin"),
+            ]
+        ),
+        "*",
+    )
+    with patch.object(aio_util, "execute", return_value=returns), patch.object(
+        aio_util, "generate_files", side_effect=_generate_files
+    ):
+        sls_files = aio_util.run(
+            aio_util.describe_minions(
+                {},
+                {},
+                "timezone",
+                "*",
+                "timezone.get_zone",
+                _parse,
+                "timezone",
+                stream_returns=True,
+            )
+        )
+    assert sls_files == ["/srv/salt/minion-1/timezone.sls", "/srv/salt/minion-3/timezone.sls"]
+
+
+def test_describe_error():
+    execute_mock = MagicMock(return_value={"minion": "'timezone.get_zone' is not available."})
+    with patch.object(aio_util, "generate_files") as generate_mock:
+        assert not aio_util.describe(
+            {},
+            {"salt.execute": execute_mock},
+            "timezone",
+            "*",
+            "timezone.get_zone",
+            _parse,
+            "timezone",
+        )
+    generate_mock.assert_not_called()
+
+
+def test_describe_profile(tmp_path):
+    opts = {"file_roots": {"base": [str(tmp_path)]}}
+    execute_mock = MagicMock(return_value={"minion": "UTC"})
+    ret = aio_util.describe(
+        opts,
+        {"salt.execute": execute_mock},
+        "timezone",
+        "*",
+        "timezone.get_zone",
+        _parse,
+        "timezone",
+        profile=True,
+    )
+    assert ret["Generated SLS file locations"] == [str(tmp_path / "minion" / "timezone.sls")]
+    assert ret["Profile"]["calls"] == 1
+    assert ret["Profile"]["minions"]["minion"]["bytes_written"] > 0
+    assert ret["Profile"]["minions"]["minion"]["write"] > 0
+
+
+def test_run_in_running_loop():
+    async def _describe():
+        return aio_util.run(asyncio.sleep(0, result="done"))
+
+    assert asyncio.run(_describe()) == "done"
+
+
+def test_describe_loader_context(tmp_path):
+    """
+    The loader's __salt__ and __opts__ resolve on the executor's threads
+    """
+    loader_ctxvar = contextvars.ContextVar("loader_ctxvar")
+    loader_context = LoaderContext(loader_ctxvar)
+    loader = types.SimpleNamespace(
+        pack_self="__loader__",
+        pack={
+            "__opts__": {"file_roots": {"base": [str(tmp_path)]}},
+            "__salt__": {"salt.execute": MagicMock(return_value={"minion": "UTC"})},
+        },
+    )
+    token = loader_ctxvar.set(loader)
+    try:
+        ret = aio_util.describe(
+            loader_context.named_context("__opts__"),
+            loader_context.named_context("__salt__"),
+            "timezone",
+            "*",
+            "timezone.get_zone",
+            _parse,
+            "timezone",
+        )
+
+        async def _describe():
+            # With a running loop the coroutine is run on a thread of its own
+            return aio_util.describe(
+                loader_context.named_context("__opts__"),
+                loader_context.named_context("__salt__"),
+                "timezone",
+                "*",
+                "timezone.get_zone",
+                _parse,
+                "timezone",
+            )
+
+        assert asyncio.run(_describe()) == ret
+    finally:
+        loader_ctxvar.reset(token)
+    assert ret["Generated SLS file locations"] == [str(tmp_path / "minion" / "timezone.sls")]
@@ -0,0 +1,286 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import json
+import sqlite3
+import subprocess
+import tarfile
+
+import pytest
+import saltext.salt_describe.utils.backends as backends
+import saltext.salt_describe.utils.backends.archive as archive_backend
+import saltext.salt_describe.utils.salt_describe as salt_describe_util
+from saltext.salt_describe.utils.backends.index import member_name
+from saltext.salt_describe.utils.output import list_dir
+from saltext.salt_describe.utils.output import write_file
+from saltext.salt_describe.utils.session import describe_session
+
+
+def _describe(tmp_path, name, target, contents="{}", earlier=False):
+    file_root = tmp_path / "srv" / "salt"
+    opts = {"file_roots": {"base": [str(file_root)]}}
+    with describe_session() as session:
+        backends.open_output(session, name, target)
+        for minion in ("minion-1", "minion-2"):
+            for sls_name in ("pkg", "service"):
+                salt_describe_util.generate_files(
+                    opts, minion, f"{sls_name}: {contents}\n", sls_name
+                )
+        # Writing the same contents again does not write them to the backend again
+        assert write_file(file_root / "minion-1" / "pkg.sls", f"pkg: {contents}\n") is False
+        # The init.sls of an earlier run is listed before this run writes it
+        expected = {"pkg.sls", "service.sls", *(["init.sls"] if earlier else [])}
+        assert list_dir(file_root / "minion-1") == expected
+    return file_root, backends.close_output(session)
+
+
+@pytest.mark.parametrize(
+    "name,target",
+    [
+        ("archive", "fleet.tar"),
+        ("archive", "fleet.tar.gz"),
+        ("archive", "fleet.zip"),
+        ("git", "fleet.git"),
+        ("sqlite", "fleet.db"),
+    ],
+)
+def test_output(tmp_path, name, target):
+    target = tmp_path / target
+    file_root, info = _describe(tmp_path, name, target)
+    assert info["backend"] == name
+    assert info["path"] == str(target)
+    assert info["files"] == 6
+    # Nothing is written to the file root
+    assert not file_root.exists()
+
+    files = {name: data for name, _, data in backends.read_output(name, target)}
+    init_sls = member_name(file_root / "minion-2" / "init.sls")
+    assert files[init_sls] == b"include:\n- minion-2.pkg\n- minion-2.service\n"
+    assert files[member_name(file_root / "minion-1" / "service.sls")] == b"service: {}\n"
+    assert len(files) == 6
+
+
+def test_unknown_output():
+    with describe_session() as session, pytest.raises(ValueError):
+        backends.open_output(session, "s3", "bucket")
+    assert backends.close_output(session) is None
+
+
+def test_read_archive_mismatch(tmp_path):
+    archive_path = tmp_path / "fleet.tar"
+    with describe_session() as session:
+        backends.open_output(session, "archive", archive_path)
+        write_file(tmp_path / "minion" / "pkg.sls", "pkg: {}\n")
+        manifest = backends.get_output()["handle"]["files"]
+        next(iter(manifest.values()))["sha256"] = "0" * 64
+    backends.close_output(session)
+
+    with tarfile.open(archive_path) as tar:
+        assert tar.getnames()[-1] == archive_backend.MANIFEST
+        assert json.load(tar.extractfile(archive_backend.MANIFEST))["version"] == 1
+    with pytest.raises(ValueError):
+        list(backends.read_output("archive", archive_path))
+
+
+def test_git_commit_per_run(tmp_path):
+    repo = tmp_path / "fleet.git"
+    file_root, first = _describe(tmp_path, "git", repo)
+    _, second = _describe(tmp_path, "git", repo, contents="{installed: true}", earlier=True)
+    assert first["commit"] != second["commit"]
+
+    log = subprocess.run(
+        ["git", f"--git-dir={repo}", "log", "--format=%H %P"],
+        check=True,
+        stdout=subprocess.PIPE,
+    )
+    # One commit per run, the second one on top of the first one
+    assert [line.split() for line in log.stdout.decode().splitlines()] == [
+        [second["commit"], first["commit"]],
+        [first["commit"]],
+    ]
+    files = {name: data for name, _, data in backends.read_output("git", repo)}
+    assert files[member_name(file_root / "minion-2" / "pkg.sls")] == b"pkg: {installed: true}\n"
+    assert len(files) == 6
+
+
+def test_git_nothing_written(tmp_path):
+    repo = tmp_path / "fleet.git"
+    with describe_session() as session:
+        backends.open_output(session, "git", repo)
+    info = backends.close_output(session)
+    assert info == {"backend": "git", "path": str(repo), "files": 0, "commit": None}
+
+
+def test_sqlite_runs(tmp_path):
+    database = tmp_path / "fleet.db"
+    file_root, first = _describe(tmp_path, "sqlite", database)
+    _, second = _describe(tmp_path, "sqlite", database, contents="{installed: true}", earlier=True)
+    assert second["run"] == first["run"] + 1
+
+    # The latest version of every file is read
+    files = {name: data for name, _, data in backends.read_output("sqlite", database)}
+    assert files[member_name(file_root / "minion-2" / "pkg.sls")] == b"pkg: {installed: true}\n"
+    assert len(files) == 6
+
+    # Every run is kept, and the same contents are only stored once
+    conn = sqlite3.connect(str(database))
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM files").fetchone() == (12,)
+        assert conn.execute("SELECT COUNT(*) FROM blobs").fetchone() == (6,)
+    finally:
+        conn.close()
+
+
+def test_sqlite_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(backends.read_output("sqlite", tmp_path / "fleet.db"))
+
+
+def _git_log(repo, *args):
+    log = subprocess.run(
+        ["git", f"--git-dir={repo}", "log", "--format=%H", *args],
+        check=True,
+        stdout=subprocess.PIPE,
+    )
+    return log.stdout.decode().split()
+
+
+def test_gitfs(tmp_path):
+    repo = tmp_path / "states.git"
+    file_root = tmp_path / "srv" / "salt"
+    opts = {
+        "file_roots": {"base": [str(file_root)]},
+        "pillar_roots": {"base": [str(tmp_path / "srv" / "pillar")]},
+    }
+    with describe_session() as session:
+        backends.open_output(session, "gitfs", repo, root=file_root)
+        salt_describe_util.generate_files(opts, "minion", "pkg: {}\n", "pkg")
+        # Sorted after the minion directory by git
+        write_file(file_root / "minion.sls", "include:\n- minion\n")
+        salt_describe_util.generate_pillars(opts, "minion", "users: {}\n", "users")
+    info = backends.close_output(session)
+    assert info["files"] == 3
+    assert _git_log(repo) == [info["commit"]]
+    subprocess.run(["git", f"--git-dir={repo}", "fsck", "--strict"], check=True)
+
+    # The states are relative to the file root, and the pillars are not committed
+    files = {name: data for name, _, data in backends.read_output("gitfs", repo)}
+    assert files == {
+        "minion.sls": b"include:\n- minion\n",
+        "minion/init.sls": b"include:\n- minion.pkg\n",
+        "minion/pkg.sls": b"pkg: {}\n",
+    }
+    assert not file_root.exists()
+    assert (tmp_path / "srv" / "pillar" / "minion" / "users.sls").read_text() == "users: {}\n"
+
+    # The init.sls includes the states of the last commit
+    with describe_session() as session:
+        backends.open_output(session, "gitfs", repo, root=file_root)
+        salt_describe_util.generate_files(opts, "minion", "service: {}\n", "service")
+    second = backends.close_output(session)
+    assert _git_log(repo) == [second["commit"], info["commit"]]
+    files = {name: data for name, _, data in backends.read_output("gitfs", repo)}
+    assert files["minion/init.sls"] == b"include:\n- minion.pkg\n- minion.service\n"
+    assert len(files) == 4
+
+    # Nothing changed, so nothing is committed
+    with describe_session() as session:
+        backends.open_output(session, "gitfs", repo, root=file_root)
+        salt_describe_util.generate_files(opts, "minion", "pkg: {}\n", "pkg")
+    assert backends.close_output(session)["commit"] is None
+    assert len(_git_log(repo)) == 2
+
+
+def test_gitfs_branch(tmp_path):
+    repo = tmp_path / "states.git"
+    file_root = tmp_path / "srv" / "salt"
+    for branch in ("describe", "describe", "review"):
+        with describe_session() as session:
+            backends.open_output(session, "gitfs", repo, root=file_root, branch=branch)
+            write_file(file_root / branch / "pkg.sls", "pkg: {}\n")
+        backends.close_output(session)
+    assert len(_git_log(repo, "describe")) == 1
+    # A new branch starts without a parent
+    assert len(_git_log(repo, "review")) == 1
+
+    files = {name: data for name, _, data in backends.read_output("gitfs", repo, branch="review")}
+    assert files == {"review/pkg.sls": b"pkg: {}\n"}
+    # HEAD points to a branch without commits
+    with pytest.raises(subprocess.CalledProcessError):
+        list(backends.read_output("gitfs", repo))
+
+
+@pytest.mark.parametrize("name,target", [("git", "fleet.git"), ("sqlite", "fleet.db")])
+def test_output_earlier_runs(tmp_path, name, target):
+    """
+    The init.sls includes the states written by earlier runs
+    """
+    target = tmp_path / target
+    file_root = tmp_path / "srv" / "salt"
+    opts = {"file_roots": {"base": [str(file_root)]}}
+    for sls_name in ("pkg", "service"):
+        with describe_session() as session:
+            backends.open_output(session, name, target)
+            salt_describe_util.generate_files(opts, "minion", f"{sls_name}: {{}}\n", sls_name)
+        backends.close_output(session)
+
+    files = {name: data for name, _, data in backends.read_output(name, target)}
+    init_sls = member_name(file_root / "minion" / "init.sls")
+    assert files[init_sls] == b"include:\n- minion.pkg\n- minion.service\n"
+
+
+def test_archive_extracted_files(tmp_path):
+    """
+    The init.sls includes the states already in the directory the archive is extracted to
+    """
+    archive_path = tmp_path / "fleet.tar"
+    file_root = tmp_path / "srv" / "salt"
+    (file_root / "minion").mkdir(parents=True)
+    (file_root / "minion" / "pkg.sls").write_text("pkg: {}\n")
+    opts = {"file_roots": {"base": [str(file_root)]}}
+    with describe_session() as session:
+        backends.open_output(session, "archive", archive_path)
+        salt_describe_util.generate_files(opts, "minion", "service: {}\n", "service")
+    backends.close_output(session)
+
+    files = {name: data for name, _, data in backends.read_output("archive", archive_path)}
+    init_sls = member_name(file_root / "minion" / "init.sls")
+    assert files[init_sls] == b"include:\n- minion.pkg\n- minion.service\n"
+
+
+@pytest.mark.parametrize(
+    "name,target",
+    [
+        ("archive", "fleet.tar"),
+        ("git", "fleet.git"),
+        ("gitfs", "states.git"),
+        ("sqlite", "fleet.db"),
+    ],
+)
+def test_abort_output(tmp_path, name, target):
+    target = tmp_path / target
+    options = {"root": tmp_path} if name == "gitfs" else {}
+    with describe_session() as session:
+        handle = backends.open_output(session, name, target, **options)["handle"]
+        write_file(tmp_path / "minion" / "pkg.sls", "pkg: {}\n")
+        backends.abort_output(session)
+    assert backends.get_output() is None
+    assert backends.close_output(session) is None
+
+    if name == "archive":
+        assert not target.exists()
+    elif name == "sqlite":
+        conn = sqlite3.connect(str(target))
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM runs").fetchone() == (0,)
+        finally:
+            conn.close()
+    else:
+        if name == "git":
+            assert handle["process"].returncode is not None
+        head = subprocess.run(
+            ["git", f"--git-dir={target}", "rev-parse", "--verify", "--quiet", "HEAD"],
+            check=False,
+            stdout=subprocess.PIPE,
+        )
+        assert not head.stdout
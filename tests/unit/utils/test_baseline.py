@@ -0,0 +1,91 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+from saltext.salt_describe.utils.baseline import factor_states
+from saltext.salt_describe.utils.baseline import group_similar
+from saltext.salt_describe.utils.baseline import merge_baseline
+
+
+def test_factor_states():
+    states = {
+        "minion-1": {
+            "sshd": {"service.running": [{"enable": True}]},
+            "chronyd": {"service.running": [{"enable": True}]},
+            "nginx": {"service.running": [{"enable": True}]},
+        },
+        "minion-2": {
+            "sshd": {"service.running": [{"enable": True}]},
+            "chronyd": {"service.dead": [{"enable": False}]},
+        },
+    }
+    baseline, deltas = factor_states(states)
+    assert baseline == {"sshd": {"service.running": [{"enable": True}]}}
+    assert deltas == {
+        "minion-1": {
+            "chronyd": {"service.running": [{"enable": True}]},
+            "nginx": {"service.running": [{"enable": True}]},
+        },
+        "minion-2": {"chronyd": {"service.dead": [{"enable": False}]}},
+    }
+    for minion, delta in deltas.items():
+        assert merge_baseline(delta, baseline) == states[minion]
+
+
+def test_factor_states_list_arg():
+    states = {
+        "minion-1": {
+            "installed_packages": {"pkg.installed": [{"pkgs": [{"bash": "5.1"}, {"vim": "9.0"}]}]}
+        },
+        "minion-2": {
+            "installed_packages": {
+                "pkg.installed": [{"pkgs": [{"bash": "5.1"}, {"nginx": "1.24"}, {"vim": "9.1"}]}]
+            }
+        },
+        "minion-3": {"installed_packages": {"pkg.installed": [{"pkgs": [{"bash": "5.1"}]}]}},
+    }
+    baseline, deltas = factor_states(states)
+    assert baseline == {
+        "installed_packages_baseline": {"pkg.installed": [{"pkgs": [{"bash": "5.1"}]}]}
+    }
+    assert deltas == {
+        "minion-1": {"installed_packages": {"pkg.installed": [{"pkgs": [{"vim": "9.0"}]}]}},
+        "minion-2": {
+            "installed_packages": {"pkg.installed": [{"pkgs": [{"nginx": "1.24"}, {"vim": "9.1"}]}]}
+        },
+        "minion-3": {},
+    }
+    for minion, delta in deltas.items():
+        assert merge_baseline(delta, baseline) == states[minion]
+
+
+def test_factor_states_nothing_in_common():
+    states = {
+        "minion-1": {"Europe/Berlin": {"timezone.system": []}},
+        "minion-2": {"UTC": {"timezone.system": []}},
+    }
+    assert factor_states(states) == ({}, states)
+
+
+def test_group_similar():
+    def pkgs(*names):
+        return {
+            "installed_packages": {"pkg.installed": [{"pkgs": [{name: "1.0"} for name in names]}]}
+        }
+
+    states = {
+        "web-1": pkgs("bash", "nginx", "openssl"),
+        "db-1": pkgs("bash", "postgresql", "openssl"),
+        # Only the versions differ from web-1
+        "web-2": {
+            "installed_packages": {
+                "pkg.installed": [
+                    {"pkgs": [{"bash": "5.1"}, {"nginx": "1.24"}, {"openssl": "3.0"}]}
+                ]
+            }
+        },
+        "db-2": pkgs("bash", "postgresql", "openssl", "pgbouncer"),
+    }
+    assert group_similar(states, 0.7) == [["web-1", "web-2"], ["db-1", "db-2"]]
+    assert group_similar(states, 0.4) == [["web-1", "db-1", "web-2", "db-2"]]
+    assert group_similar(states, 1) == [["web-1", "web-2"], ["db-1"], ["db-2"]]
+    assert group_similar({}, 0.5) == []
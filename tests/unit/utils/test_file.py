@@ -0,0 +1,32 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import pytest
+import saltext.salt_describe.utils.file as file_util
+
+
+@pytest.mark.parametrize(
+    "path,spec",
+    [
+        ("/etc/hosts", {"path": "/etc/hosts", "find": None}),
+        ("/etc/nginx", {"path": "/etc/nginx", "find": None}),
+        ("/etc/nginx/**", {"path": "/etc/nginx", "find": {}}),
+        ("/etc/ssh/*_config", {"path": "/etc/ssh", "find": {"maxdepth": 1, "name": "*_config"}}),
+        ("/etc/nginx/**/*.conf", {"path": "/etc/nginx", "find": {"name": "*.conf"}}),
+        ("/etc/*/nginx.conf", None),
+    ],
+)
+def test_file_spec(path, spec):
+    assert file_util._file_spec(path) == spec
+
+
+def test_file_info_kwarg():
+    kwarg = file_util.file_info_kwarg(["/etc/hosts", "/etc/*/nginx.conf", "/etc/nginx/**"])
+    assert kwarg["string"] == file_util.FILE_INFO_TEMPLATE
+    assert kwarg["default_renderer"] == "jinja|json"
+    assert kwarg["specs"] == [
+        {"path": "/etc/hosts", "find": None},
+        {"path": "/etc/nginx", "find": {}},
+    ]
+    assert kwarg["contents"] is True
+    assert file_util.file_info_kwarg(["/etc/hosts"], contents=False)["contents"] is False
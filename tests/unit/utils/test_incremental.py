@@ -0,0 +1,53 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import saltext.salt_describe.utils.incremental as incremental_util
+from saltext.salt_describe.utils.backends import close_output
+from saltext.salt_describe.utils.backends import open_output
+from saltext.salt_describe.utils.session import describe_session
+
+
+def test_incremental(tmp_path):
+    opts = {"cachedir": str(tmp_path / "cache")}
+    sls_file = tmp_path / "minion.sls"
+    sls_file.touch()
+
+    assert incremental_util.load_fingerprints(opts, "pkg") is None
+    assert incremental_util.unchanged(None, "minion", {"vim": "9.0"}) is None
+    assert incremental_util.record(None, "minion", str(sls_file)) == str(sls_file)
+
+    fingerprints = incremental_util.load_fingerprints(opts, "pkg", True, config_system="salt")
+    assert incremental_util.unchanged(fingerprints, "minion", {"vim": "9.0"}) is None
+    incremental_util.record(fingerprints, "minion", str(sls_file))
+    incremental_util.save_fingerprints(fingerprints)
+    assert incremental_util.get_fingerprint_db(opts).is_file()
+
+    fingerprints = incremental_util.load_fingerprints(
+        opts, "pkg", True, config_system="salt", __pub_jid="20231017000000000000"
+    )
+    assert incremental_util.unchanged(fingerprints, "minion", {"vim": "9.0"}) == str(sls_file)
+    assert incremental_util.unchanged(fingerprints, "minion", {"vim": "9.1"}) is None
+    assert incremental_util.unchanged(fingerprints, "other", {"vim": "9.0"}) is None
+
+    # The options and the describe function are part of the fingerprint
+    fingerprints = incremental_util.load_fingerprints(opts, "pkg", True, config_system="ansible")
+    assert incremental_util.unchanged(fingerprints, "minion", {"vim": "9.0"}) is None
+    fingerprints = incremental_util.load_fingerprints(opts, "pip", True, config_system="salt")
+    assert incremental_util.unchanged(fingerprints, "minion", {"vim": "9.0"}) is None
+
+    # A removed SLS file is generated again
+    sls_file.unlink()
+    fingerprints = incremental_util.load_fingerprints(opts, "pkg", True, config_system="salt")
+    assert incremental_util.unchanged(fingerprints, "minion", {"vim": "9.0"}) is None
+
+
+def test_incremental_output(tmp_path):
+    """
+    Every SLS file is generated when the files are written to an output backend
+    """
+    opts = {"cachedir": str(tmp_path / "cache")}
+    with describe_session() as session:
+        open_output(session, "archive", tmp_path / "fleet.tar")
+        assert incremental_util.load_fingerprints(opts, "pkg", True) is None
+    close_output(session)
+    assert not incremental_util.get_fingerprint_db(opts).exists()
@@ -7,6 +7,7 @@ from unittest.mock import patch
 import pytest
 import saltext.salt_describe.utils.init as describe_util
 import yaml
+from saltext.salt_describe.utils.session import describe_session
 
 
 @pytest.mark.parametrize(
@@ -123,3 +124,239 @@ def test_parse_salt_multiple_ret(caplog, ret, exp_ret):
         for _tgt in tgts:
             if _ret[_tgt] == ret:
                 assert _ret[_tgt] in caplog.text
+
+
+def test_execute():
+    """
+    Test execute when nothing was collected
+    """
+    ret = {"minion": {"pkg1": "1.0"}}
+    salt_funcs = {"salt.execute": MagicMock(return_value=ret)}
+    assert describe_util.execute(salt_funcs, "minion", "pkg.list_pkgs") == ret
+    salt_funcs["salt.execute"].assert_called_with("minion", "pkg.list_pkgs", tgt_type="glob")
+
+    assert describe_util.execute(salt_funcs, "minion", "cron.ls", arg=["root"]) == ret
+    salt_funcs["salt.execute"].assert_called_with(
+        "minion", "cron.ls", tgt_type="glob", arg=["root"]
+    )
+
+
+def test_collect():
+    """
+    Test collect sends a single compound job and that execute
+    returns each function's slice from it
+    """
+    compound_ret = {
+        "minion1": {
+            "pkg.list_pkgs": {"pkg1": "1.0"},
+            "cron.ls": {"crons": []},
+            "pip.freeze": ["salt==3006.0"],
+        },
+        "minion2": {
+            "pkg.list_pkgs": {"pkg2": "2.0"},
+            "cron.ls": "'cron.ls' is not available.",
+            "pip.freeze": [],
+        },
+    }
+    salt_funcs = {"salt.execute": MagicMock(return_value=compound_ret)}
+    jobs = [
+        ("pkg.list_pkgs", None, None),
+        ("cron.ls", ["root"], None),
+        ("pip.freeze", None, {"bin_env": "/opt/venv"}),
+        ("pkg.list_pkgs", None, None),
+    ]
+    with describe_session():
+        assert describe_util.collect(salt_funcs, "minion*", jobs) is True
+        salt_funcs["salt.execute"].assert_called_once_with(
+            "minion*",
+            ["pkg.list_pkgs", "cron.ls", "pip.freeze"],
+            arg=[[], ["root"], [{"bin_env": "/opt/venv", "__kwarg__": True}]],
+            tgt_type="glob",
+        )
+
+        assert describe_util.execute(salt_funcs, "minion*", "pkg.list_pkgs") == {
+            "minion1": {"pkg1": "1.0"},
+            "minion2": {"pkg2": "2.0"},
+        }
+        assert describe_util.execute(salt_funcs, "minion*", "cron.ls", arg=["root"]) == {
+            "minion1": {"crons": []},
+            "minion2": "'cron.ls' is not available.",
+        }
+        assert describe_util.execute(
+            salt_funcs, "minion*", "pip.freeze", kwarg={"bin_env": "/opt/venv"}
+        ) == {"minion1": ["salt==3006.0"], "minion2": []}
+        assert salt_funcs["salt.execute"].call_count == 1
+
+        # A different argument was not collected
+        describe_util.execute(salt_funcs, "minion*", "cron.ls", arg=["salt"])
+        assert salt_funcs["salt.execute"].call_count == 2
+
+    # Collected returns do not outlive the session
+    describe_util.execute(salt_funcs, "minion*", "pkg.list_pkgs")
+    assert salt_funcs["salt.execute"].call_count == 3
+
+
+def test_collect_repeated_function():
+    """
+    A function called with different arguments is collected in another job
+    """
+    returns = {
+        "minion": {
+            "slsutil.renderer": "users",
+            "pkg.list_pkgs": {"pkg1": "1.0"},
+        },
+    }
+    salt_funcs = {
+        "salt.execute": MagicMock(
+            side_effect=[returns, {"minion": {"slsutil.renderer": "files"}}],
+        )
+    }
+    jobs = [
+        ("slsutil.renderer", None, {"string": "users"}),
+        ("pkg.list_pkgs", None, None),
+        ("slsutil.renderer", None, {"string": "files"}),
+        ("slsutil.renderer", None, {"string": "users"}),
+    ]
+    with describe_session():
+        assert describe_util.collect(salt_funcs, "minion", jobs) is True
+        assert salt_funcs["salt.execute"].call_count == 2
+        salt_funcs["salt.execute"].assert_called_with(
+            "minion",
+            ["slsutil.renderer"],
+            arg=[[{"string": "files", "__kwarg__": True}]],
+            tgt_type="glob",
+        )
+        for string in ("users", "files"):
+            assert describe_util.execute(
+                salt_funcs, "minion", "slsutil.renderer", kwarg={"string": string}
+            ) == {"minion": string}
+        assert salt_funcs["salt.execute"].call_count == 2
+
+
+def test_collect_no_session(caplog):
+    salt_funcs = {"salt.execute": MagicMock()}
+    assert describe_util.collect(salt_funcs, "minion", [("pkg.list_pkgs", None, None)]) is False
+    salt_funcs["salt.execute"].assert_not_called()
+    assert "Cannot collect returns outside of a describe session" in caplog.text
+
+
+def test_get_grains():
+    cached_grains = {
+        "minion-1": {"os_family": "RedHat", "id": "minion-1"},
+        "minion-2": {"os_family": "Debian", "id": "minion-2"},
+    }
+    cache_mock = MagicMock()
+    cache_mock.fetch.side_effect = lambda bank, minion: cached_grains.get(minion)
+    opts = {"minion_data_cache": True}
+    with patch("salt.cache.factory", MagicMock(return_value=cache_mock)):
+        assert describe_util.get_grains(opts, ["minion-1"], keys=["os_family"]) == {
+            "minion-1": {"os_family": "RedHat"}
+        }
+        with describe_session():
+            for _ in range(2):
+                assert describe_util.get_grains(
+                    opts, ["minion-1", "minion-2", "minion-3"], keys=["os_family"]
+                ) == {
+                    "minion-1": {"os_family": "RedHat"},
+                    "minion-2": {"os_family": "Debian"},
+                    "minion-3": {},
+                }
+            # Every minion was only read from the cache once in the session, the
+            # missing minion-3 from both cache layouts
+            assert cache_mock.fetch.call_count == 1 + 4
+            assert describe_util.get_grains(opts, ["minion-2"]) == {
+                "minion-2": cached_grains["minion-2"]
+            }
+            assert describe_util.get_grains(opts, ["minion-2"], keys=["id"]) == {
+                "minion-2": {"id": "minion-2"}
+            }
+            assert cache_mock.fetch.call_count == 1 + 4 + 1
+
+
+def test_get_grains_minions_bank():
+    """
+    Before Salt 3008 the grains are in the minion's minions/<id> bank
+    """
+    cached_data = {
+        "minions/minion-1": {"data": {"grains": {"os_family": "RedHat"}, "pillar": {}}},
+    }
+    cache_mock = MagicMock()
+    cache_mock.fetch.side_effect = lambda bank, key: cached_data.get(bank, {}).get(key)
+    opts = {"minion_data_cache": True}
+    with patch("salt.cache.factory", MagicMock(return_value=cache_mock)):
+        assert describe_util.get_grains(opts, ["minion-1", "minion-2"], keys=["os_family"]) == {
+            "minion-1": {"os_family": "RedHat"},
+            "minion-2": {},
+        }
+    cache_mock.fetch.assert_any_call("grains", "minion-1")
+    cache_mock.fetch.assert_any_call("minions/minion-1", "data")
+
+
+def test_get_grains_no_cache(caplog):
+    with patch("salt.cache.factory") as factory_mock:
+        assert describe_util.get_grains({}, ["minion"], keys=["os_family"]) == {"minion": {}}
+        factory_mock.assert_not_called()
+    assert "The minion data cache is disabled" in caplog.text
+
+
+def test_execute_stream_returns():
+    """
+    Test execute hands out the returns one minion at a time
+    with stream_returns and skips the minions that errored
+    """
+    returns = [
+        {"minion-1": {"ret": {"pkg1": "1.0"}, "retcode": 0}},
+        {"minion-2": {"ret": "'pkg.list_pkgs' is not available.", "retcode": 1}},
+        {"minion-3": {"ret": {"pkg3": "3.0"}, "retcode": 0}},
+    ]
+    client_mock = MagicMock()
+    client_mock.__enter__.return_value.cmd_iter.return_value = iter(returns)
+    salt_funcs = {"salt.execute": MagicMock()}
+    opts = {"conf_file": "/etc/salt/master", "timeout": 5}
+    with patch("salt.client.get_local_client", MagicMock(return_value=client_mock)):
+        ret = describe_util.execute(
+            salt_funcs, "minion*", "pkg.list_pkgs", stream_returns=True, opts=opts
+        )
+        assert describe_util.parse_salt_ret(ret=ret, tgt="minion*") is True
+        seen = {}
+        for minion in ret:
+            assert minion in ret
+            seen[minion] = ret[minion]
+        assert seen == {"minion-1": {"pkg1": "1.0"}, "minion-3": {"pkg3": "3.0"}}
+    salt_funcs["salt.execute"].assert_not_called()
+    client_mock.__enter__.return_value.cmd_iter.assert_called_once_with(
+        "minion*", "pkg.list_pkgs", arg=(), timeout=5, tgt_type="glob", kwarg=None
+    )
+
+
+def test_execute_job_options():
+    """
+    Test execute passes the timeouts on to salt.execute
+    and runs batched jobs with the local client
+    """
+    ret = {"minion-1": {"pkg1": "1.0"}, "minion-2": {"pkg2": "2.0"}}
+    salt_funcs = {"salt.execute": MagicMock(return_value=ret)}
+    assert (
+        describe_util.execute(
+            salt_funcs, "minion*", "pkg.list_pkgs", timeout=30, gather_job_timeout=15
+        )
+        == ret
+    )
+    salt_funcs["salt.execute"].assert_called_with(
+        "minion*", "pkg.list_pkgs", tgt_type="glob", timeout=30, gather_job_timeout=15
+    )
+
+    client_mock = MagicMock()
+    client_mock.__enter__.return_value.cmd_batch.return_value = iter(
+        [{"minion-1": {"pkg1": "1.0"}}, {"minion-2": {"pkg2": "2.0"}}]
+    )
+    opts = {"conf_file": "/etc/salt/master", "timeout": 5}
+    with patch("salt.client.get_local_client", MagicMock(return_value=client_mock)):
+        assert (
+            describe_util.execute(salt_funcs, "minion*", "pkg.list_pkgs", batch="10%", opts=opts)
+            == ret
+        )
+    assert salt_funcs["salt.execute"].call_count == 1
+    client_mock.__enter__.return_value.cmd_batch.assert_called_once_with(
+        "minion*", "pkg.list_pkgs", arg=(), tgt_type="glob", kwarg=None, batch="10%", timeout=5
+    )
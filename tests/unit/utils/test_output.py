@@ -0,0 +1,145 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import collections
+import os
+import stat
+from pathlib import PosixPath
+from unittest.mock import patch
+
+import pytest
+import saltext.salt_describe.utils.output as output_util
+import yaml
+from saltext.salt_describe.utils.profile import finish_profile
+from saltext.salt_describe.utils.profile import start_profile
+from saltext.salt_describe.utils.session import describe_session
+from saltext.salt_describe.utils.session import get_session
+
+
+def test_write_file(tmp_path):
+    path = tmp_path / "file.sls"
+    assert output_util.write_file(path, "contents") is True
+    assert path.read_text() == "contents"
+    assert list(tmp_path.iterdir()) == [path]
+
+    with patch("os.replace") as replace_mock:
+        assert output_util.write_file(path, "contents") is False
+        replace_mock.assert_not_called()
+    assert list(tmp_path.iterdir()) == [path]
+
+    assert output_util.write_file(path, b"\x00new contents") is True
+    assert path.read_bytes() == b"\x00new contents"
+
+
+def test_write_file_mode(tmp_path):
+    umask = os.umask(0o027)
+    try:
+        new_file = tmp_path / "new.sls"
+        assert output_util.write_file(new_file, "contents") is True
+        assert stat.S_IMODE(new_file.stat().st_mode) == 0o640
+
+        # The mode of the file that is replaced is kept
+        existing_file = tmp_path / "existing.sls"
+        existing_file.write_text("old contents")
+        existing_file.chmod(0o600)
+        assert output_util.write_file(existing_file, "new contents") is True
+        assert stat.S_IMODE(existing_file.stat().st_mode) == 0o600
+
+        assert output_util.write_file(new_file, "new contents", mode=0o600) is True
+        assert stat.S_IMODE(new_file.stat().st_mode) == 0o600
+    finally:
+        os.umask(umask)
+
+
+def test_write_file_error(tmp_path):
+    path = tmp_path / "file.sls"
+    path.write_text("old contents")
+    with patch("os.replace", side_effect=OSError):
+        with pytest.raises(OSError):
+            output_util.write_file(path, "new contents")
+    assert path.read_text() == "old contents"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_dump_yaml():
+    data = {"b": [{"name": "vim", "version": "9.0"}], "a": {"pkg.installed": []}}
+    assert output_util.dump_yaml(data) == yaml.dump(data)
+    assert output_util.dump_yaml(collections.OrderedDict(reversed(data.items()))) == yaml.dump(data)
+
+
+def test_writer_pool(tmp_path):
+    with describe_session() as session:
+        output_util.start_writer(session, workers=2)
+        for num in range(20):
+            minion_root = tmp_path / f"minion-{num % 4}"
+            output_util.make_dirs(minion_root)
+            assert output_util.write_file(minion_root / f"state-{num}.sls", f"{num}\n") is True
+        # The writes are handed to the pool, which creates the directories
+        output_util.write_file(tmp_path / "minion-0" / "state-0.sls", "0\n")
+        summary = output_util.flush_writer(session)
+        assert output_util.get_writer() is None
+    assert summary == {
+        "written": 20,
+        "unchanged": 1,
+        "bytes_written": sum(len(f"{num}\n") for num in range(20)),
+        "failed": {},
+    }
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"minion-{num}" for num in range(4)]
+    assert (tmp_path / "minion-3" / "state-7.sls").read_text() == "7\n"
+
+
+def test_writer_pool_profile(tmp_path):
+    """
+    The bytes written on the writer pool's threads are added to the profile
+    """
+    start_profile({}, "pkg", True)
+    with describe_session() as session:
+        output_util.start_writer(session, workers=2)
+        for minion in ("minion-1", "minion-2"):
+            output_util.write_file(tmp_path / minion / "pkg.sls", "pkg: {}\n")
+        output_util.flush_writer(session)
+    assert finish_profile("pkg")["bytes_written"] == 2 * len("pkg: {}\n")
+
+
+def test_writer_pool_error(tmp_path, caplog):
+    (tmp_path / "minion").write_text("not a directory")
+    with describe_session() as session:
+        output_util.start_writer(session)
+        output_util.write_file(tmp_path / "minion" / "pkg.sls", "pkg\n")
+        output_util.write_file(tmp_path / "other" / "pkg.sls", "pkg\n")
+        summary = output_util.flush_writer(session)
+    assert summary["written"] == 1
+    assert list(summary["failed"]) == [str(tmp_path / "minion" / "pkg.sls")]
+    assert "1 of 2 files could not be written" in caplog.text
+    assert output_util.flush_writer({}) is None
+
+
+def test_make_dirs(tmp_path):
+    path = tmp_path / "minion" / "files"
+    with describe_session():
+        output_util.make_dirs(path)
+        with patch.object(PosixPath, "mkdir") as mkdir_mock:
+            output_util.make_dirs(path)
+            output_util.make_dirs(tmp_path / "minion")
+            mkdir_mock.assert_not_called()
+            output_util.start_writer(get_session())
+            output_util.make_dirs(tmp_path / "other")
+            mkdir_mock.assert_not_called()
+            output_util.make_dirs(tmp_path / "other", lazy=False)
+            mkdir_mock.assert_called_once()
+            output_util.flush_writer(get_session())
+    assert path.is_dir()
+
+
+def test_list_dir(tmp_path):
+    (tmp_path / "pkg.sls").touch()
+    assert output_util.list_dir(tmp_path / "missing") == set()
+    with describe_session():
+        assert output_util.list_dir(tmp_path) == {"pkg.sls"}
+        output_util.write_file(tmp_path / "service.sls", "{}")
+        with patch.object(PosixPath, "iterdir") as iterdir_mock:
+            assert output_util.list_dir(tmp_path) == {"pkg.sls", "service.sls"}
+            iterdir_mock.assert_not_called()
+    # Outside of a session the directory is listed again
+    (tmp_path / "user.sls").touch()
+    assert output_util.list_dir(tmp_path) == {"pkg.sls", "service.sls", "user.sls"}
@@ -0,0 +1,102 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+from saltext.salt_describe.utils.output import dump_yaml
+from saltext.salt_describe.utils.output import write_file
+from saltext.salt_describe.utils.profile import add_profile
+from saltext.salt_describe.utils.profile import call_profiled
+from saltext.salt_describe.utils.profile import count
+from saltext.salt_describe.utils.profile import finish_profile
+from saltext.salt_describe.utils.profile import is_profiling
+from saltext.salt_describe.utils.profile import phase
+from saltext.salt_describe.utils.profile import profile_minions
+from saltext.salt_describe.utils.profile import profiled
+from saltext.salt_describe.utils.profile import start_profile
+
+
+def test_profile_disabled():
+    assert start_profile({}, "pkg") is None
+    with phase("collect"):
+        count("calls")
+    assert list(profile_minions(["minion"])) == ["minion"]
+    assert finish_profile("pkg") is None
+
+
+def test_profile(tmp_path):
+    start_profile({}, "pkg", True)
+    with phase("collect"):
+        count("calls")
+    for minion in profile_minions(["minion-1", "minion-2"]):
+        state = dump_yaml({minion: {"pkg.installed": []}})
+        write_file(tmp_path / f"{minion}.sls", state)
+    # Writing unchanged files does not add to the bytes written
+    write_file(tmp_path / "minion-1.sls", dump_yaml({"minion-1": {"pkg.installed": []}}))
+
+    profile = finish_profile("pkg")
+    assert profile["calls"] == 1
+    assert profile["bytes_written"] == 2 * len("minion-1:\n  pkg.installed: []\n")
+    assert set(profile["minions"]) == {"minion-1", "minion-2"}
+    for stats in profile["minions"].values():
+        assert stats["bytes_written"] == len("minion-1:\n  pkg.installed: []\n")
+        assert stats["calls"] == 0
+        assert stats["serialize"] > 0
+    for key in ("collect", "parse", "serialize", "write"):
+        assert profile[key] >= 0
+    assert profile["total"] >= profile["collect"] + profile["serialize"]
+    # The profile is finished
+    assert finish_profile("pkg") is None
+
+
+def test_profile_nested():
+    start_profile({}, "user", True)
+    start_profile({}, "group", True)
+    count("calls")
+    assert finish_profile("group")["calls"] == 1
+    count("calls")
+    assert finish_profile("user")["calls"] == 1
+
+
+def test_profile_other_thread(tmp_path):
+    start_profile({}, "pkg", True)
+    ret, data = call_profiled(write_file, tmp_path / "minion.sls", "minion: {}\n")
+    assert ret is True
+    assert data["bytes_written"] == len("minion: {}\n")
+    add_profile(data, minion="minion")
+
+    profile = finish_profile("pkg")
+    assert profile["bytes_written"] == len("minion: {}\n")
+    assert profile["minions"]["minion"]["bytes_written"] == len("minion: {}\n")
+
+
+def test_profiled():
+    @profiled
+    def pkg(fail=False):
+        start_profile({}, "pkg", True)
+        if fail:
+            raise RuntimeError("The master went away")
+        # Returns without ret_info finishing the profile
+        return False
+
+    assert pkg() is False
+    assert not is_profiling()
+    with pytest.raises(RuntimeError):
+        pkg(fail=True)
+    assert not is_profiling()
+
+
+def test_profile_event():
+    event_mock = MagicMock()
+    opts = {"sock_dir": "/var/run/salt/master"}
+    with patch(
+        "salt.utils.event.get_master_event", MagicMock(return_value=event_mock)
+    ) as get_event_mock:
+        start_profile(opts, "pkg", "event")
+        profile = finish_profile("pkg")
+    get_event_mock.assert_called_once_with(opts, "/var/run/salt/master", listen=False)
+    event_mock.__enter__.return_value.fire_event.assert_called_once_with(
+        profile, "salt/describe/pkg/profile"
+    )
@@ -1,11 +1,14 @@
 # Copyright 2023 VMware, Inc.
 # SPDX-License-Identifier: Apache-2.0
 #
+import hashlib
+import pathlib
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import saltext.salt_describe.utils.salt_describe as salt_describe_util
 import yaml
+from saltext.salt_describe.utils.session import describe_session
 
 
 def test_get_state_file_root(tmp_path):
@@ -43,6 +46,60 @@ def test_get_minion_pillar_file_root(tmp_path):
         )
 
 
+def test_generate_shared_file(tmp_path):
+    opts = {"file_roots": {"base": [tmp_path]}}
+    contents = "nameserver 127.0.0.1\n"
+    digest = hashlib.sha256(contents.encode()).hexdigest()
+    shared_file = tmp_path / "describe_shared" / "files" / digest[:2] / digest
+
+    source = salt_describe_util.generate_shared_file(opts, contents)
+    assert source == f"salt://describe_shared/files/{digest[:2]}/{digest}"
+    assert shared_file.read_text() == contents
+
+    with patch("salt.utils.files.fopen") as open_mock:
+        assert salt_describe_util.generate_shared_file(opts, contents) == source
+        open_mock.assert_not_called()
+
+
+def test_generate_files_dedup(tmp_path):
+    opts = {"file_roots": {"base": [tmp_path]}}
+    state = yaml.dump({"America/Los_Angeles": {"timezone.system": []}})
+    digest = hashlib.sha256(state.encode()).hexdigest()
+
+    for minion in ("minion-1", "minion-2"):
+        sls_file = salt_describe_util.generate_files(
+            opts, minion, state, sls_name="timezone", dedup=True
+        )
+        assert sls_file == tmp_path / minion / "timezone.sls"
+        assert yaml.safe_load(sls_file.read_text()) == {"include": [f"describe_shared.{digest}"]}
+        assert yaml.safe_load((tmp_path / minion / "init.sls").read_text()) == {
+            "include": [f"{minion}.timezone"]
+        }
+
+    assert list((tmp_path / "describe_shared").iterdir()) == [
+        tmp_path / "describe_shared" / f"{digest}.sls"
+    ]
+    assert (tmp_path / "describe_shared" / f"{digest}.sls").read_text() == state
+
+
+def test_store_shared_file(tmp_path):
+    opts = {"file_roots": {"base": [tmp_path]}}
+    contents = b"\x00\x01\x02"
+    digest = hashlib.sha256(contents).hexdigest()
+    source = f"salt://describe_shared/files/{digest[:2]}/{digest}"
+
+    for _ in range(2):
+        fp_, temp_file = salt_describe_util.open_shared_file(opts)
+        with fp_:
+            fp_.write(contents)
+        assert salt_describe_util.store_shared_file(opts, temp_file, digest) == source
+        assert not temp_file.exists()
+
+    shared_files = [f for f in (tmp_path / "describe_shared").rglob("*") if f.is_file()]
+    assert shared_files == [tmp_path / "describe_shared" / "files" / digest[:2] / digest]
+    assert shared_files[0].read_bytes() == contents
+
+
 def test_generate_files(tmp_path):
     state_contents = {
         "salt://testfile": {
@@ -66,6 +123,66 @@ def test_generate_files(tmp_path):
             init_mock.assert_called_with({}, "minion", env="prod")
 
 
+def test_generate_files_unchanged(tmp_path):
+    state = yaml.dump({"/etc/hosts": {"file.managed": {"source": "salt://minion/files/hosts"}}})
+    minion_state_root = tmp_path / "prod" / "minion"
+    minion_state_root.mkdir(parents=True)
+    (minion_state_root / "file.sls").write_text(state)
+    (minion_state_root / "init.sls").write_text(yaml.dump({"include": ["minion.file"]}))
+    with patch.object(
+        salt_describe_util, "get_minion_state_file_root", return_value=minion_state_root
+    ):
+        with patch.object(salt_describe_util, "generate_init", MagicMock()) as init_mock:
+            assert (
+                salt_describe_util.generate_files({}, "minion", state, sls_name="file", env="prod")
+                == minion_state_root / "file.sls"
+            )
+            init_mock.assert_not_called()
+
+
+def test_generate_files_session(tmp_path):
+    minion_state_root = tmp_path / "prod" / "minion"
+    with patch.object(
+        salt_describe_util, "get_minion_state_file_root", return_value=minion_state_root
+    ):
+        with patch.object(
+            salt_describe_util, "generate_init", wraps=salt_describe_util.generate_init
+        ) as init_mock:
+            with describe_session():
+                for sls_name in ("pkg", "service"):
+                    salt_describe_util.generate_files(
+                        {}, "minion", "{}", sls_name=sls_name, env="prod"
+                    )
+                init_mock.assert_not_called()
+            init_mock.assert_called_once_with({}, "minion", env="prod")
+    assert yaml.safe_load((minion_state_root / "init.sls").read_text()) == {
+        "include": ["minion.pkg", "minion.service"]
+    }
+
+
+def test_generate_files_session_fs_cache(tmp_path):
+    minion_state_root = tmp_path / "prod" / "minion"
+    minion_state_root.parent.mkdir()
+    mkdir = pathlib.Path.mkdir
+    iterdir = pathlib.Path.iterdir
+    with patch.object(
+        salt_describe_util, "get_minion_state_file_root", return_value=minion_state_root
+    ), patch.object(
+        pathlib.PosixPath, "mkdir", autospec=True, side_effect=mkdir
+    ) as mkdir_mock, patch.object(
+        pathlib.PosixPath, "iterdir", autospec=True, side_effect=iterdir
+    ) as iterdir_mock:
+        with describe_session():
+            for sls_name in ("pkg", "service", "pkg"):
+                salt_describe_util.generate_files({}, "minion", "{}", sls_name=sls_name, env="prod")
+    # The minion's directory is created once and listed once, for its init.sls
+    assert mkdir_mock.call_count == 1
+    assert iterdir_mock.call_count == 1
+    assert yaml.safe_load((minion_state_root / "init.sls").read_text()) == {
+        "include": ["minion.pkg", "minion.service"]
+    }
+
+
 def test_generate_init(tmp_path):
     minion_state_root = tmp_path / "prod" / "minion"
     expected_init = {
@@ -101,6 +218,8 @@ def test_generate_pillars(tmp_path):
             pillar_file = minion_pillar_root / "users.sls"
             assert pillar_file.exists()
             assert yaml.safe_load(pillar_file.read_text()) == pillar_contents
+            # Only the master may read the pillars
+            assert pillar_file.stat().st_mode & 0o777 == 0o600
             init_mock.assert_called_with({}, "minion", env="prod")
 
 
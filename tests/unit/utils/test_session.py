@@ -0,0 +1,71 @@
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: Apache-2.0
+#
+import concurrent.futures
+import contextvars
+import threading
+from unittest.mock import MagicMock
+
+from saltext.salt_describe.utils.session import defer
+from saltext.salt_describe.utils.session import describe_session
+from saltext.salt_describe.utils.session import get_session
+
+
+def test_describe_session():
+    assert get_session() is None
+    with describe_session() as session:
+        assert get_session() is session
+        # A nested session joins the outer one
+        with describe_session() as nested:
+            assert nested is session
+        assert get_session() is session
+    assert get_session() is None
+
+
+def test_defer():
+    func = MagicMock()
+    assert defer("key", func) is False
+
+    with describe_session():
+        for arg in range(3):
+            assert defer("key", func, arg, kwarg=arg) is True
+        defer("other", func, "other")
+        func.assert_not_called()
+
+    assert func.call_count == 2
+    func.assert_any_call(2, kwarg=2)
+    func.assert_any_call("other")
+
+
+def test_defer_error(caplog):
+    func = MagicMock()
+    with describe_session():
+        defer("failing", MagicMock(side_effect=RuntimeError))
+        defer("key", func)
+    func.assert_called_once()
+    assert "Deferred call failing failed" in caplog.text
+
+
+def test_describe_session_threads():
+    """
+    Sessions opened on different threads, like two runner calls through
+    salt-api, are separate, and a copy of the context joins the session
+    """
+    opened = threading.Barrier(2)
+
+    def _describe():
+        with describe_session() as session:
+            # Both sessions are open at the same time
+            opened.wait(timeout=10)
+            assert get_session() is session
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                assert executor.submit(get_session).result() is None
+                joined = executor.submit(contextvars.copy_context().run, get_session)
+                assert joined.result() is session
+            return session
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(_describe) for _ in range(2)]
+        first, second = [future.result() for future in futures]
+    assert first is not second
+    assert get_session() is None